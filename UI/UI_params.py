@@ -3,13 +3,14 @@ import os.path
 
 SIMULATION_DEMAND_INPUT_PATH = r"data/simulation_demand_input"
 if os.path.isdir(SIMULATION_DEMAND_INPUT_PATH):
-    demand_files = os.listdir(SIMULATION_DEMAND_INPUT_PATH)
+    demand_files = [file for file in os.listdir(SIMULATION_DEMAND_INPUT_PATH) if file.endswith('.csv')]
 else:
     logging.error("Could Not Found: " + os.getcwd() + "/" + SIMULATION_DEMAND_INPUT_PATH)
 
 SIMULATION_PRODUCTION_PROFILE_PATH = r"data/simulation_production_profile"
 if os.path.isdir(SIMULATION_PRODUCTION_PROFILE_PATH):
-    production_profile_files = os.listdir(SIMULATION_PRODUCTION_PROFILE_PATH)
+    production_profile_files = [file for file in os.listdir(SIMULATION_PRODUCTION_PROFILE_PATH)
+                                if file.endswith('.csv')]
 else:
     logging.error("Could Not Found: " + os.getcwd() + "/" + SIMULATION_PRODUCTION_PROFILE_PATH)
 
@@ -20,6 +21,23 @@ if not os.path.isdir(ASSETS_FOLDER):
 MADOR_LOGO = r"MadorLogo.png"
 TALPIOT_LOGO = r"TalpiotLogo.png"
 
+# processes used by the find optimum page to simulate the combinations, shared by the optimisations running together
+NUM_SIMULATION_WORKERS = os.cpu_count() or 1
+# optimisations of the find optimum page running together and waiting or running (see optimum_jobs)
+MAX_RUNNING_OPTIMUM_JOBS = 2
+MAX_PENDING_OPTIMUM_JOBS = 8
+# simulations of the annual simulation page kept on the server for the zoom of their graph and their download, the
+# least recently used of all the sessions is forgotten
+MAX_KEPT_ANNUAL_SIMULATIONS = 16
+
+# search modes of the find optimum page, the adaptive search stops at the resolution of the grid
+GRID_SEARCH = "Grid"
+ADAPTIVE_SEARCH = "Adaptive"
+SEARCH_MODES = [GRID_SEARCH, ADAPTIVE_SEARCH]
+# tolerances of the adaptive search when the grid has a single point
+DEFAULT_SOLAR_PANEL_POWER_TOLERANCE_KW = 100
+DEFAULT_NUM_BATTERIES_TOLERANCE = 0.1
+
 YEARLY_SIMULATION_PAGE = '/'
 FIND_OPTIMUM_PAGE = '/find_optimum'
 SIMULATION_PARAMS_PAGE = "/simulation_params"
@@ -0,0 +1,26 @@
+import dash_bootstrap_components as dbc
+from dash import html
+
+from hourly_simulation.timing import StageTimings
+
+
+def get_timing_panel(timings: StageTimings):
+    """
+    :param timings: StageTimings of a run
+    :return: dbc.Card of the seconds, calls and share of every stage of the run and of the rest of its time. The stages
+        of the worker processes of a search are summed, so they may add up to more than the wall time.
+    """
+    stages = timings.as_dict()
+    wall_seconds = timings.wall_seconds
+    staged_seconds = sum(seconds for seconds, _ in stages.values())
+    stages["Other"] = (max(wall_seconds - staged_seconds, 0.0), None)
+    total_seconds = max(wall_seconds, staged_seconds, 1e-9)
+    rows = [html.Tr([html.Td(stage_name),
+                     html.Td("{:,.0f} ms".format(seconds * 1000), style={"text-align": "right"}),
+                     html.Td("" if calls is None else "{:,} calls".format(calls), style={"text-align": "right"}),
+                     html.Td("{:.0%}".format(seconds / total_seconds), style={"text-align": "right"})])
+            for stage_name, (seconds, calls) in stages.items()]
+    return dbc.Card(dbc.CardBody([
+        html.H6("Run Time: {:,.2f} s".format(wall_seconds)),
+        dbc.Table(html.Tbody(rows), size="sm", borderless=True),
+    ]))
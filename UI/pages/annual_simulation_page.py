@@ -1,22 +1,36 @@
+import collections
 import os.path
-import traceback
+import threading
+import uuid
 from datetime import datetime
+from typing import Optional, Tuple
 
 import dash_bootstrap_components as dbc
 import pandas as pd
-from dash import dcc, html, Input, State, Output, callback
+from dash import dcc, html, Input, State, Output, callback, callback_context, no_update
 
 from UI.UI_params import *
-from df_objects.df_objects import DemandDf, ProductionDf
-from hourly_simulation.parameters import Params, get_simulation_parameters, PARAMS_PATH
+from UI.components.timing_panel import get_timing_panel
+from df_objects.df_objects import ProductionDf
+from hourly_simulation import timing
+from hourly_simulation.invariants import check_electricity_use
+from hourly_simulation.parameters import get_params
 from hourly_simulation.predict_demand import predict_demand_in_year
-from hourly_simulation.shift_day_in_year import shift_day_of_year
+from hourly_simulation.profile_store import load_demand, load_production
 from hourly_simulation.simulation import get_usage_profile, get_solar_production_profile, calculate_cost
 from hourly_simulation.strategies import use_strategies
-from output_graphs import yearly_graph_fig
-from tests.sanity_checks import test_simulation
+from output_graphs import YearlySeries, yearly_graph_gl_fig, get_relayout_hours, RESOLUTION_HOURS
 
-last_simulation_results = None
+# the simulations of all the sessions by their id (see the annual_simulation store of the layout), by recent use:
+# (YearlySeries of the yearly graph drawn again for every zoom, pd.DataFrame of the results to download)
+__simulations = collections.OrderedDict()
+__simulations_lock = threading.Lock()
+# keys of the annual_simulation store: the id of the simulation of the session and the visible hours of its yearly
+# graph, None for the whole year
+SIMULATION_ID = 'simulation_id'
+HOUR_RANGE = 'hour_range'
+# the resolution of the yearly graph chosen by the length of its visible range (see get_resolution)
+AUTOMATIC_RESOLUTION = 'Automatic'
 price_formating = lambda p: "Yearly Calculated Price: {:,} ₪".format(round(p / 1000) * 1000)
 format_price_description = lambda args: [
     html.H3("Total Cost: {:,} ₪".format(round(args[0]))),
@@ -69,6 +83,13 @@ def get_layout():
             ]),
         ]),
         html.Br(),
+        html.Table([
+            html.Tr([
+                html.Td("Graph Resolution: "),
+                html.Td(dcc.Dropdown([AUTOMATIC_RESOLUTION] + list(RESOLUTION_HOURS), AUTOMATIC_RESOLUTION,
+                                     id='graph_resolution', clearable=False))]),
+        ]),
+        dcc.Store(id='annual_simulation'),
         dcc.Loading(
             id="loading",
             type="default",
@@ -91,15 +112,55 @@ def get_layout():
             ]
         ),
         html.Br(),
-        html.Div(id="yearly_price"),
+        dbc.Row([
+            dbc.Col(html.Div(id="yearly_price")),
+            dbc.Col(html.Div(id="annual_timings")),
+        ]),
     ])
 
 
+def save_simulation(yearly_series: YearlySeries, results: pd.DataFrame) -> str:
+    """
+    Keeps a simulation for the later callbacks of its session, forgets the least recently used beyond
+    MAX_KEPT_ANNUAL_SIMULATIONS
+
+    :param yearly_series: YearlySeries of the yearly graph
+    :param results: pd.DataFrame of the results to download
+    :return: str id of the simulation
+    """
+    simulation_id = uuid.uuid4().hex
+    with __simulations_lock:
+        __simulations[simulation_id] = yearly_series, results
+        while len(__simulations) > MAX_KEPT_ANNUAL_SIMULATIONS:
+            __simulations.popitem(last=False)
+    return simulation_id
+
+
+def get_simulation(stored: Optional[dict]) -> Optional[Tuple[YearlySeries, pd.DataFrame]]:
+    """
+    :param stored: dictionary of the annual_simulation store of a session
+    :return: Tuple of the YearlySeries and the results of the simulation of the session, None if it did not run a
+        simulation or the simulation was forgotten
+    """
+    if not stored:
+        return None
+    with __simulations_lock:
+        simulation = __simulations.get(stored[SIMULATION_ID])
+        if simulation is not None:
+            __simulations.move_to_end(stored[SIMULATION_ID])
+        return simulation
+
+
 @callback(
     Output(component_id='yearly_graph', component_property='figure'),
     Output(component_id="parameters_alert_annual", component_property="is_open"),
     Output(component_id="yearly_price", component_property="children"),
+    Output(component_id="annual_timings", component_property="children"),
+    Output(component_id='annual_simulation', component_property='data'),
     Input(component_id='run_simulation_button', component_property="n_clicks"),
+    Input(component_id='yearly_graph', component_property='relayoutData'),
+    Input(component_id='graph_resolution', component_property='value'),
+    State(component_id='annual_simulation', component_property='data'),
     State(component_id='number_batteries', component_property='value'),
     State(component_id='solar_panel_power_mw', component_property='value'),
     State(component_id='year_to_simulate', component_property='value'),
@@ -107,64 +168,82 @@ def get_layout():
     State(component_id='place_to_research', component_property='value'),
     State(component_id='production_profile', component_property='value'),
 )
-def run_simulation(n_clicks, num_batteries, solar_panel_power_mw, simulated_year, chosen_strategy, place_to_research,
-                   production_profile):
-    global last_simulation_results
+def run_simulation(n_clicks, relayout_data, graph_resolution, stored, num_batteries, solar_panel_power_mw,
+                   simulated_year, chosen_strategy, place_to_research, production_profile):
+    """
+    Runs the annual simulation on a click, and draws the visible range of the yearly graph again when it is zoomed or
+    its resolution is changed (one callback, as an output of Dash 2.3 belongs to a single callback). The simulation
+    is kept on the server by its id in the annual_simulation store of the session (see save_simulation).
+    """
+    triggered = [trigger['prop_id'] for trigger in callback_context.triggered]
+    resolution = None if graph_resolution == AUTOMATIC_RESOLUTION else graph_resolution
+    if 'yearly_graph.relayoutData' in triggered or 'graph_resolution.value' in triggered:
+        simulation = get_simulation(stored)
+        if simulation is None:
+            return no_update, no_update, no_update, no_update, no_update
+        yearly_series, _ = simulation
+        if 'yearly_graph.relayoutData' in triggered:
+            hour_range = get_relayout_hours(relayout_data, yearly_series)
+            if hour_range is None:
+                return no_update, no_update, no_update, no_update, no_update
+            stored = dict(stored, **{HOUR_RANGE: [int(hour) for hour in hour_range]})
+        hour_range = tuple(stored[HOUR_RANGE]) if stored[HOUR_RANGE] is not None else None
+        return yearly_graph_gl_fig(yearly_series, hour_range, resolution), no_update, no_update, no_update, stored
     if n_clicks == 0:
-        return {}, False, ""
+        return {}, False, "", "", no_update
     try:
         solar_panel_power_kw = float(solar_panel_power_mw) * 1000
         num_batteries = float(num_batteries)
         simulated_year = int(simulated_year)
     except:
-        return {}, True, ""
+        return {}, True, "", "", no_update
     if not place_to_research or not chosen_strategy or not production_profile or solar_panel_power_kw < 0 or \
             num_batteries < 0 or simulated_year < 0:
-        return {}, True, ""
-    params = Params(**get_simulation_parameters(PARAMS_PATH))
-    current_demand = DemandDf(pd.read_csv(os.path.join(SIMULATION_DEMAND_INPUT_PATH, place_to_research), index_col=0))
-    normalised_production = ProductionDf(
-        pd.read_csv(os.path.join(SIMULATION_PRODUCTION_PROFILE_PATH, production_profile), index_col=0))
-    normalised_production.df[normalised_production.SolarProduction] /= normalised_production.df[
-        normalised_production.SolarProduction].max()
-    electricity_use = get_usage_profile(demand=current_demand,
-                                        normalised_production=normalised_production,
-                                        params=params,
-                                        solar_panel_power_kw=solar_panel_power_kw,
-                                        num_batteries=num_batteries,
-                                        strategy=use_strategies[chosen_strategy],
-                                        simulated_year=simulated_year)
-    demand = predict_demand_in_year(current_demand, params, simulated_year)
-    try:
-        test_simulation(electricity_use=electricity_use, demand=demand, production=get_solar_production_profile(
-            normalised_production, solar_panel_power_kw, params), params=params, num_batteries=num_batteries)
-    except AssertionError as e:
-        logging.warning(traceback.format_exc())
-    for_download = electricity_use.df.copy()
-    for_download["Demand"] = shift_day_of_year(demand.df[demand.Demand].to_numpy(), demand.YearOfDemand)
-    for_download[normalised_production.SolarProduction] = get_solar_production_profile(
-        normalised_production, solar_panel_power_kw, params).df[ProductionDf.SolarProduction]
-    last_simulation_results = for_download
-    scenario_price, description = calculate_cost(electricity_use=electricity_use,
-                                                 params=params,
-                                                 battery_capacity=params.BATTERY_CAPACITY * num_batteries,
-                                                 solar_panel_power_kw=solar_panel_power_kw, return_description=True)
-    return yearly_graph_fig(electricity_use.df,
-                            params.BATTERY_CAPACITY * num_batteries * params.BATTERY_EFFECTIVE_SIZE, demand,
-                            num_hours_to_sum=1,
-                            demand_year=demand.YearOfDemand), False, format_price_description(description)
+        return {}, True, "", "", no_update
+    with timing.collect() as timings, timing.profile_run("annual_simulation"):
+        params = get_params()
+        current_demand = load_demand(os.path.join(SIMULATION_DEMAND_INPUT_PATH, place_to_research))
+        normalised_production = load_production(os.path.join(SIMULATION_PRODUCTION_PROFILE_PATH, production_profile))
+        electricity_use = get_usage_profile(demand=current_demand,
+                                            normalised_production=normalised_production,
+                                            params=params,
+                                            solar_panel_power_kw=solar_panel_power_kw,
+                                            num_batteries=num_batteries,
+                                            strategy=use_strategies[chosen_strategy],
+                                            simulated_year=simulated_year)
+        demand = predict_demand_in_year(current_demand, params, simulated_year)
+        production = get_solar_production_profile(normalised_production, solar_panel_power_kw, params)
+        check_electricity_use(electricity_use.values, demand.get_values(), production.get_values(),
+                              num_batteries * params.BATTERY_CAPACITY * params.BATTERY_EFFECTIVE_SIZE,
+                              num_batteries * params.CHARGE_POWER, params.MAX_SELLING_POWER)
+        for_download = electricity_use.df.copy()
+        for_download["Demand"] = demand.df[demand.Demand].to_numpy()
+        for_download[normalised_production.SolarProduction] = production.df[ProductionDf.SolarProduction]
+        scenario_price, description = calculate_cost(electricity_use=electricity_use,
+                                                     params=params,
+                                                     battery_capacity=params.BATTERY_CAPACITY * num_batteries,
+                                                     solar_panel_power_kw=solar_panel_power_kw,
+                                                     demand_year=demand.YearOfDemand, return_description=True)
+        yearly_series = YearlySeries(electricity_use.df,
+                                     params.BATTERY_CAPACITY * num_batteries * params.BATTERY_EFFECTIVE_SIZE,
+                                     demand, simulated_year)
+        figure = yearly_graph_gl_fig(yearly_series, resolution=resolution)
+    stored = {SIMULATION_ID: save_simulation(yearly_series, for_download), HOUR_RANGE: None}
+    return figure, False, format_price_description(description), get_timing_panel(timings), stored
 
 
 @callback(
     Output("download-results-csv", "data"),
     Output("download_csv_none_error", "is_open"),
     Input("download_results_btn", "n_clicks"),
+    State("annual_simulation", "data"),
     prevent_initial_call=True,
 )
-def download_results_callback(n_clicks):
-    global last_simulation_results
-    if last_simulation_results is not None:
-        return dcc.send_data_frame(last_simulation_results.to_csv,
+def download_results_callback(n_clicks, stored):
+    simulation = get_simulation(stored)
+    if simulation is not None:
+        _, results = simulation
+        return dcc.send_data_frame(results.to_csv,
                                    "simulation_results_" + str(datetime.now().strftime("%H-%M-%S")) + ".csv"), False
     else:
         return None, True
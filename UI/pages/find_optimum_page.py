@@ -1,16 +1,19 @@
 import traceback
-from multiprocessing.pool import ThreadPool
 
 import dash_bootstrap_components as dbc
 import numpy as np
-import pandas as pd
-from dash import dcc, html, Input, State, Output, callback
+from dash import dcc, html, Input, State, Output, callback, callback_context, no_update
 
 from UI.UI_params import *
-from df_objects.df_objects import DemandDf, ProductionDf, SimulationResults
-from hourly_simulation.parameters import Params, get_simulation_parameters, PARAMS_PATH
+from UI.components.timing_panel import get_timing_panel
+from df_objects.df_objects import SimulationResults
+from hourly_simulation import timing
+from hourly_simulation.parameters import Params, get_params
+from hourly_simulation.profile_store import load_demand, load_production
 from hourly_simulation.strategies import use_strategies
 from output_graphs import simulation_graph
+from scenario_evaluator.optimum_jobs import OptimumJobQueue, JobQueueFull, DONE
+from scenario_evaluator.optimum_search import search_optimum
 from scenario_evaluator.run_senarios import run_scenarios
 
 block_red = {"color": "red", 'display': 'block'}
@@ -19,7 +22,10 @@ display_none = {'display': 'none'}
 output_text = lambda s1, s2, s3, s4: [html.P("Solar Panels: {:,} Mw".format(s1 / 1000)),
                                       html.P("{:,} Batteries: Capacity: {:,} Mwh, Max Charge Power: {:,} Mw".format(
                                           s2, s3 / 1000, s4 / 1000))]
-progress_bar = [0]
+# the drawn results of a job are its final results
+FINAL_RESULTS = -1
+# optimisations of all the users, run in their own threads so the callbacks only submit and poll them
+optimum_jobs = OptimumJobQueue(max_running=MAX_RUNNING_OPTIMUM_JOBS, max_pending=MAX_PENDING_OPTIMUM_JOBS)
 
 
 def get_layout():
@@ -57,6 +63,9 @@ def get_layout():
                         html.Tr([
                             html.Td("Use Strategy: "),
                             html.Td(dcc.Dropdown(list(use_strategies.keys()), id='use_strategy'))]),
+                        html.Tr([
+                            html.Td("Search: "),
+                            html.Td(dcc.Dropdown(SEARCH_MODES, GRID_SEARCH, id='search_mode'))]),
                     ])),
                     html.Td(html.Table([
                         html.Tr([
@@ -88,34 +97,90 @@ def get_layout():
                 ])
             ]),
             dbc.Button(id='run_simulation_button', children='Run Simulation', n_clicks=0),
+            dbc.Button(id='cancel_simulation_button', children='Cancel', n_clicks=0, color="secondary",
+                       style={"margin-left": "1rem"}),
         ]),
         html.Br(),
+        # the job of this page (see optimum_jobs) and [job, number of results or FINAL_RESULTS] of the drawn results
+        dcc.Store(id='optimum_job_id'),
+        dcc.Store(id='shown_optimum_results'),
         dcc.Interval(id='clock', interval=500, n_intervals=0, max_intervals=-1),
         dbc.Progress(value=0, id="progress_bar"),
+        html.H6("", id="optimum_job_status"),
         dcc.Graph(id='optimal_graph'),
         html.H6("", id="reached_limits", style={"color": "red"}),
-        html.H3("", id="best_combination"),
+        dbc.Row([
+            dbc.Col(html.H3("", id="best_combination")),
+            dbc.Col(html.Div(id="optimum_timings")),
+        ]),
     ])
 
 
 @callback(
-    [Output("progress_bar", "value"),
-     Output("progress_bar", "label")],
-    [Input("clock", "n_intervals")])
-def progress_bar_update(n):
-    global progress_bar
-    progress = int(progress_bar[-1] * 100)
-    return (progress, f"{progress} %" if progress >= 5 else "",)
-
-
-@callback(
+    Output("progress_bar", "value"),
+    Output("progress_bar", "label"),
+    Output("optimum_job_status", "children"),
     Output(component_id='optimal_graph', component_property='figure'),
     Output(component_id='best_combination', component_property="children"),
     Output(component_id='reached_limits', component_property="children"),
     Output(component_id='reached_limits', component_property="style"),
+    Output("shown_optimum_results", "data"),
+    Output("optimum_timings", "children"),
+    Input("clock", "n_intervals"),
+    State("optimum_job_id", "data"),
+    State("shown_optimum_results", "data"))
+def optimum_job_update(n, job_id, shown):
+    """
+    Polls the job of the page every tick of the clock. The graph is redrawn when new combinations are done, with the
+    best combination so far and the time of the stages of the job, and once more with the final results when the job
+    is done.
+    """
+    job = optimum_jobs.get_job(job_id)
+    if job is None:
+        return 0, "", "", no_update, no_update, no_update, no_update, no_update, no_update
+    progress = int(job.progress.fraction_done * 100)
+    progress_label = f"{progress} %" if progress >= 5 else ""
+    status = job.state if job.error is None else f"{job.state}: {job.error}"
+    params = job.params
+    if job.state == DONE:
+        if shown == [job_id, FINAL_RESULTS]:
+            return 100, "100 %", status, no_update, no_update, no_update, no_update, no_update, no_update
+        simulation_results, best_combination, in_bounds = job.result
+        with timing.add_stages_to(job.timings):
+            figure = simulation_graph(simulation_results=simulation_results)
+        return 100, "100 %", status, figure, \
+               format_combination(best_combination, params), \
+               in_bounds[1], block_red if in_bounds[0] else block_green, [job_id, FINAL_RESULTS], \
+               get_timing_panel(job.timings)
+    partial_results, best_combination, num_results = job.get_partial_results()
+    if partial_results is None or shown == [job_id, num_results]:
+        return progress, progress_label, status, no_update, no_update, no_update, no_update, no_update, no_update
+    with timing.add_stages_to(job.timings):
+        figure = simulation_graph(simulation_results=partial_results)
+    return progress, progress_label, status, figure, \
+           [html.P(f"Best of {num_results} combinations so far:")] + format_combination(best_combination, params), \
+           "", display_none, [job_id, num_results], get_timing_panel(job.timings)
+
+
+def format_combination(combination, params: Params):
+    """
+    :param combination: pd.Series of SimulationResults ['PowerSolar', 'NumBatteries', 'Cost']
+    :param params: namedtuple simulation params of the combination
+    :return: List of html.P describing the combination
+    """
+    return output_text(round(combination[SimulationResults.PowerSolar]),
+                       round(combination[SimulationResults.NumBatteries], 2),
+                       round(combination[SimulationResults.NumBatteries] * params.BATTERY_CAPACITY),
+                       round(combination[SimulationResults.NumBatteries] * params.CHARGE_POWER))
+
+
+@callback(
+    Output("optimum_job_id", "data"),
     Output(component_id='parameters_unfilled_optimum', component_property="is_open"),
     Output(component_id='parameters_error_optimum', component_property="is_open"),
+    Output(component_id='parameters_error_optimum', component_property="children"),
     Input(component_id='run_simulation_button', component_property="n_clicks"),
+    Input(component_id='cancel_simulation_button', component_property="n_clicks"),
     State(component_id='number_batteries_min_range', component_property='value'),
     State(component_id='number_batteries_max_range', component_property='value'),
     State(component_id='number_batteries_num_range', component_property='value'),
@@ -126,53 +191,69 @@ def progress_bar_update(n):
     State(component_id='use_strategy', component_property='value'),
     State(component_id='place_to_research', component_property='value'),
     State(component_id='production_profile', component_property='value'),
+    State(component_id='search_mode', component_property='value'),
+    State("optimum_job_id", "data"),
 
 )
-def run_optimal_simulation(n_clicks, n_batteries_min, n_batteries_max, n_batteries_num, pv_power_min, pv_power_max,
-                           pv_power_num, simulated_year, chosen_strategy, place_to_research, production_profile):
-    global progress_bar
-    progress_bar = [0]
+def run_optimal_simulation(n_clicks, n_cancel_clicks, n_batteries_min, n_batteries_max, n_batteries_num, pv_power_min,
+                           pv_power_max, pv_power_num, simulated_year, chosen_strategy, place_to_research,
+                           production_profile, search_mode, previous_job_id):
+    """
+    Submits the optimisation to the job queue or cancels it, the results are drawn by optimum_job_update
+    """
+    if any(trigger['prop_id'].startswith('cancel_simulation_button') for trigger in callback_context.triggered):
+        optimum_jobs.cancel(previous_job_id)
+        return no_update, False, False, no_update
     if n_clicks == 0:
-        return {}, "", "", {}, False, False
+        return no_update, False, False, no_update
     try:
         if float(pv_power_min) < 0 or float(pv_power_max) < 0 or int(pv_power_num) < 0 or \
                 float(n_batteries_min) < 0 or float(n_batteries_max) < 0 or int(n_batteries_num) < 0:
-            return {}, "", "", {}, True, False
-        solar_panel_power_it_mw = np.linspace(float(pv_power_min), float(pv_power_max), int(pv_power_num))
+            return no_update, True, False, no_update
         solar_panel_power_it_kw = np.linspace(float(pv_power_min) * 1000, float(pv_power_max) * 1000, int(pv_power_num))
         num_batteries_it = np.linspace(float(n_batteries_min), float(n_batteries_max), int(n_batteries_num))
         simulated_year = int(simulated_year)
         if not place_to_research or not chosen_strategy or not production_profile or simulated_year < 0:
-            return {}, "", "", {}, True, False
-        demand = DemandDf(pd.read_csv(os.path.join(SIMULATION_DEMAND_INPUT_PATH, place_to_research), index_col=0))
-        normalised_production = ProductionDf(
-            pd.read_csv(os.path.join(SIMULATION_PRODUCTION_PROFILE_PATH, production_profile), index_col=0))
-        normalised_production.df[normalised_production.SolarProduction] /= normalised_production.df[
-            normalised_production.SolarProduction].max()
-        wanted_simulation_params = Params(**get_simulation_parameters(PARAMS_PATH))
+            return no_update, True, False, no_update
+        demand = load_demand(os.path.join(SIMULATION_DEMAND_INPUT_PATH, place_to_research))
+        normalised_production = load_production(os.path.join(SIMULATION_PRODUCTION_PROFILE_PATH, production_profile))
+        wanted_simulation_params = get_params()
     except Exception as e:
         logging.error(traceback.format_exc())
-        return {}, "", "", {}, False, True
+        return no_update, False, True, "Parameters Error"
 
     arguments = {'demand': demand,
-                 'single_panel_production': normalised_production,
+                 'normalised_production': normalised_production,
                  'simulated_year': simulated_year,
-                 'solar_panel_power_it_kw': solar_panel_power_it_kw,
-                 'num_batteries_it': num_batteries_it,
                  'strategy': use_strategies[chosen_strategy],
                  'params': wanted_simulation_params,
-                 'progress_bar': progress_bar}
-
-    pool = ThreadPool(processes=1)
-    async_result = pool.apply_async(run_scenarios, tuple(arguments.values()))  # tuple of args for foo
-    simulation_results, best_combination, in_bounds = async_result.get()
-    return simulation_graph(simulation_results=simulation_results,
-                            solar_panel_power_it=solar_panel_power_it_mw,
-                            num_batteries_it=num_batteries_it), \
-           output_text(round(best_combination[SimulationResults.PowerSolar]),
-                       round(best_combination[SimulationResults.NumBatteries], 2),
-                       round(best_combination[SimulationResults.NumBatteries] *
-                             wanted_simulation_params.BATTERY_CAPACITY),
-                       round(best_combination[SimulationResults.NumBatteries] *
-                             wanted_simulation_params.CHARGE_POWER)), \
-           in_bounds[1], block_red if in_bounds[0] else block_green, False, False
+                 'num_workers': max(1, NUM_SIMULATION_WORKERS // MAX_RUNNING_OPTIMUM_JOBS)}
+    if search_mode == ADAPTIVE_SEARCH:
+        run_search = search_optimum
+        arguments.update(solar_panel_power_range_kw=(solar_panel_power_it_kw[0], solar_panel_power_it_kw[-1]),
+                         num_batteries_range=(num_batteries_it[0], num_batteries_it[-1]),
+                         solar_panel_power_tolerance_kw=get_grid_step(solar_panel_power_it_kw) or
+                         DEFAULT_SOLAR_PANEL_POWER_TOLERANCE_KW,
+                         num_batteries_tolerance=get_grid_step(num_batteries_it) or DEFAULT_NUM_BATTERIES_TOLERANCE)
+    else:
+        run_search = run_scenarios
+        arguments.update(solar_panel_power_it_kw=solar_panel_power_it_kw, num_batteries_it=num_batteries_it)
+
+    # a new run of the page replaces its previous one
+    optimum_jobs.cancel(previous_job_id)
+    try:
+        job_id = optimum_jobs.submit(run_search, arguments)
+    except JobQueueFull as e:
+        logging.warning(str(e))
+        return no_update, False, True, f"Too many optimisations are running, try again later ({e})"
+    return job_id, False, False, no_update
+
+
+def get_grid_step(grid: np.ndarray) -> float:
+    """
+    Step between the points of a linspace grid, the resolution of the adaptive search
+
+    :param grid: np.ndarray linspace grid
+    :return: float step, 0 for a grid of a single point
+    """
+    return float(grid[1] - grid[0]) if len(grid) > 1 else 0.
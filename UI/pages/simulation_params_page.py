@@ -5,7 +5,7 @@ import dash_bootstrap_components as dbc
 from dash import dcc, html, Input, State, Output, callback
 from dash.exceptions import PreventUpdate
 
-from hourly_simulation.parameters import get_simulation_parameters, PARAMS_PATH
+from hourly_simulation.parameters import get_simulation_parameters, get_data_path, PARAMS_PATH
 
 
 def get_layout():
@@ -44,7 +44,7 @@ def update_params(n_clicks, params_table):
                                for param in params_table}
         for key in params_with_units_kwh.keys():
             params_with_units_kwh[key] = (new_params_no_units[key], params_with_units_kwh[key][1])
-        with open(PARAMS_PATH, 'w', newline='\n') as csvfile:
+        with open(get_data_path(PARAMS_PATH), 'w', newline='\n') as csvfile:
             writer = csv.writer(csvfile, delimiter=',')
             for k, v in params_with_units_kwh.items():
                 writer.writerow([k, v[0], v[1]])
@@ -1,4 +1,5 @@
 import logging
+import multiprocessing
 import threading
 import time
 import webbrowser
@@ -27,6 +28,7 @@ def wait_bar():
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()  # the simulation workers of the executable are spawned (see run_senarios)
     logging.info("Starting Server")
     thread_wait_bat = threading.Thread(target=wait_bar)
     thread_wait_bat.start()
@@ -0,0 +1,72 @@
+"""
+Benchmark of the import time of the simulation core, the cost paid by every worker process and command line tool.
+Every module is imported in a new process started outside of the repository (so the data paths must not depend on
+the working directory), the modules of the UI (Dash, Plotly) must not be imported.
+
+usage (from the repository root): python -m benchmarks.import_time [--repeat N]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORE_MODULES = ['hourly_simulation.simulation', 'scenario_evaluator.run_senarios', 'scenario_evaluator.batch_sweep']
+# the modules of the UI, never imported by the simulation core
+UI_MODULES = ('dash', 'plotly', 'flask')
+# seconds an import of the core should take at most
+IMPORT_BUDGET_SECONDS = 1.0
+
+# runs in the new process: imports the module, then loads the parameters from the working directory outside the
+# repository
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter() - start
+from hourly_simulation.parameters import get_params
+get_params()
+print(json.dumps({{'seconds': imported, 'ui_modules': sorted({{name.split('.')[0] for name in sys.modules}} &
+                                                            set({ui_modules!r}))}}))
+"""
+
+
+def time_import(module: str, cwd: str) -> dict:
+    """
+    :param module: str name of the module to import
+    :param cwd: str working directory of the new process
+    :return: dictionary('seconds' -> float import time, 'ui_modules' -> List of the UI modules imported)
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT_DIR, env.get('PYTHONPATH')]))
+    completed = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT.format(module=module, ui_modules=UI_MODULES)],
+                               cwd=cwd, env=env, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='imports per module, the median is reported')
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'module':<36}{'median [ms]':>12}{'max [ms]':>10}  ui modules")
+    with tempfile.TemporaryDirectory() as cwd:
+        for module in CORE_MODULES:
+            results = [time_import(module, cwd) for _ in range(args.repeat)]
+            seconds = np.array([result['seconds'] for result in results])
+            ui_modules = sorted({name for result in results for name in result['ui_modules']})
+            print(f"{module:<36}{np.median(seconds) * 1000:>12.0f}{seconds.max() * 1000:>10.0f}  "
+                  f"{', '.join(ui_modules) or '-'}")
+            failed |= bool(ui_modules) or np.median(seconds) > IMPORT_BUDGET_SECONDS
+    if failed:
+        print(f"FAILED: an import took more than {IMPORT_BUDGET_SECONDS}s or imported the UI")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark of the preparation of the strategy inputs (demand of the simulated year and production of the panels) of one
+scenario year: the deep copies of the whole DataFrames against the scaled views (see ScaledInputDataFrameWrapper).
+Measures the time and the memory allocated (tracemalloc peak) per scenario year.
+
+usage (from the repository root): python -m benchmarks.input_copies [--repeat N]
+"""
+import argparse
+import copy
+import time
+import tracemalloc
+
+import numpy as np
+
+DEMAND_PATH = 'data/simulation_demand_input/consumption_data1.csv'
+PRODUCTION_PATH = 'data/simulation_production_profile/national_solar_production.csv'
+SOLAR_PANEL_POWER_KW = 6000
+SIMULATED_YEAR = 2030
+
+
+def deepcopy_inputs(demand, normalised_production, params):
+    """
+    The strategy inputs as they were prepared before the scaled views: a deep copy of every DataFrame wrapper and of
+    the arrays handed to the strategy
+    """
+    from hourly_simulation.simulation import get_average_effective_size
+
+    future_demand = copy.deepcopy(demand)
+    future_demand.df[future_demand.Demand] *= params.GROWTH_PER_YEAR ** (SIMULATED_YEAR - future_demand.YearOfDemand)
+    total_production = copy.deepcopy(normalised_production)
+    total_production.df[total_production.SolarProduction] *= get_average_effective_size(params) * SOLAR_PANEL_POWER_KW
+    demand_values = copy.deepcopy(future_demand.df[future_demand.Demand].to_numpy(dtype=np.float64))
+    production = copy.deepcopy(total_production.df[total_production.SolarProduction].to_numpy(dtype=np.float64))
+    return demand_values, production
+
+
+def scaled_view_inputs(demand, normalised_production, params):
+    """
+    The strategy inputs prepared by the simulation: scaled views materialised by get_values
+    """
+    from hourly_simulation.predict_demand import predict_demand_in_year
+    from hourly_simulation.simulation import get_solar_production_profile
+
+    future_demand = predict_demand_in_year(demand, params, SIMULATED_YEAR)
+    total_production = get_solar_production_profile(normalised_production, SOLAR_PANEL_POWER_KW, params)
+    return future_demand.get_values(), total_production.get_values()
+
+
+def measure(prepare, repeat: int, *args):
+    """
+    :return: Tuple(seconds per run, bytes allocated at the peak of a run)
+    """
+    prepare(*args)  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        prepare(*args)
+    seconds = (time.perf_counter() - start) / repeat
+    tracemalloc.start()
+    prepare(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=200, help='timed runs per implementation')
+    args = parser.parse_args()
+
+    from hourly_simulation.parameters import get_params
+    from hourly_simulation.profile_store import load_demand, load_production
+
+    params = get_params()
+    demand = load_demand(DEMAND_PATH)
+    normalised_production = load_production(PRODUCTION_PATH)
+    results = {name: measure(prepare, args.repeat, demand, normalised_production, params)
+               for name, prepare in (('deepcopy', deepcopy_inputs), ('scaled view', scaled_view_inputs))}
+    for old, new in zip(deepcopy_inputs(demand, normalised_production, params),
+                        scaled_view_inputs(demand, normalised_production, params)):
+        assert np.array_equal(old, new), "the scaled views differ from the deep copies"
+
+    print(f"{'inputs':<14}{'time [us]':>12}{'peak [KiB]':>12}")
+    for name, (seconds, peak) in results.items():
+        print(f"{name:<14}{seconds * 1e6:>12.1f}{peak / 1024:>12.1f}")
+    print(f"{'reduction':<14}{results['deepcopy'][0] / results['scaled view'][0]:>11.1f}x"
+          f"{results['deepcopy'][1] / results['scaled view'][1]:>11.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark of the strategies with the pure python kernels against the numba compiled kernels.
+Each backend runs in its own process (the backend is chosen at import time). The outputs are compared within
+EQUAL_TOLERANCE_KWH, as the selling strategy runs (days, 24) blocks without numba and an hourly loop with it.
+
+usage (from the repository root): python -m benchmarks.strategy_backends [--repeat N]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+DEMAND_PATH = 'data/simulation_demand_input/consumption_data1.csv'
+PRODUCTION_PATH = 'data/simulation_production_profile/national_solar_production.csv'
+SOLAR_PANEL_POWER_KW = 6000
+NUM_BATTERIES = 3
+SIMULATED_YEAR = 2020
+BACKENDS = {'python': '0', 'numba': '1'}
+# Kwh the outputs of the backends may differ by (their floating point sums are not in the same order)
+EQUAL_TOLERANCE_KWH = 1e-6
+
+
+def run_worker(output_path: str, repeat: int) -> None:
+    """
+    Times every strategy with the backend chosen by the environment, saves the results to output_path.
+
+    :param output_path: str path of the .npz file to save the ElectricityUseDf of every strategy
+    :param repeat: int number of timed runs per strategy
+    :return: None, prints json dictionary(strategy name -> seconds per run)
+    """
+    from df_objects.df_objects import DemandDf, ProductionDf
+    from hourly_simulation.parameters import get_params
+    from hourly_simulation.simulation import get_usage_profile, get_solar_production_profile
+    from hourly_simulation.strategies import use_strategies
+    from hourly_simulation.predict_demand import predict_demand_in_year
+
+    strategies = dict(use_strategies)
+    del strategies["Optimal Dispatch Strategy"]  # solved by HiGHS, no jit kernel
+    params = get_params()
+    demand = predict_demand_in_year(DemandDf(pd.read_csv(DEMAND_PATH, index_col=0)), params, SIMULATED_YEAR)
+    normalised_production = ProductionDf(pd.read_csv(PRODUCTION_PATH, index_col=0))
+    normalised_production.df[normalised_production.SolarProduction] /= normalised_production.df[
+        normalised_production.SolarProduction].max()
+    production = get_solar_production_profile(normalised_production, SOLAR_PANEL_POWER_KW, params)
+
+    timings, results = {}, {}
+    for name, strategy in strategies.items():
+        electricity_use = strategy(demand, production, params, NUM_BATTERIES, demand.YearOfDemand)  # warm up / compile
+        start = time.perf_counter()
+        for _ in range(repeat):
+            strategy(demand, production, params, NUM_BATTERIES, demand.YearOfDemand)
+        timings[name] = (time.perf_counter() - start) / repeat
+        results[name] = electricity_use.df.to_numpy(dtype=np.float64)
+    np.savez(output_path, **results)
+    print(json.dumps(timings))
+
+
+def run_backend(backend: str, output_path: str, repeat: int):
+    env = dict(os.environ)
+    env['THOUSAND_SUNS_JIT'] = BACKENDS[backend]
+    completed = subprocess.run([sys.executable, '-m', 'benchmarks.strategy_backends', '--worker', output_path,
+                                '--repeat', str(repeat)], env=env, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per strategy')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        run_worker(args.worker, args.repeat)
+        return
+
+    from hourly_simulation.jit import NUMBA_INSTALLED
+    backends = list(BACKENDS) if NUMBA_INSTALLED else ['python']
+    timings, outputs = {}, {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for backend in backends:
+            output_path = os.path.join(tmp_dir, backend + '.npz')
+            timings[backend] = run_backend(backend, output_path, args.repeat)
+            with np.load(output_path) as results:
+                outputs[backend] = {name: results[name] for name in results.files}
+
+    print(f"{'strategy':<28}" + ''.join(f"{backend + ' [ms]':>14}" for backend in backends) +
+          f"{'speedup':>10}{'equal':>11}")
+    for name in timings['python']:
+        row = f"{name:<28}" + ''.join(f"{timings[backend][name] * 1000:>14.2f}" for backend in backends)
+        if len(backends) > 1:
+            equal = np.allclose(outputs['python'][name], outputs['numba'][name], rtol=0, atol=EQUAL_TOLERANCE_KWH)
+            row += f"{timings['python'][name] / timings['numba'][name]:>9.1f}x{str(equal):>11}"
+        print(row)
+    if len(backends) == 1:
+        print("numba is not installed, only the python backend was measured")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""
+Benchmark suite of the simulation: every strategy of use_strategies and calculate_cost on every demand profile of
+data/simulation_demand_input with the national solar production, and a reference run_scenarios grid.
+Every case reports its wall time (the median and the minimum of the runs), the memory allocated at the peak of a run
+(tracemalloc, in a separate run) and the simulated hours per second, as json. The timed runs are rounds over all the
+cases, so the runs of a case are spread over the whole suite rather than over a moment of a noisy machine.
+With --baseline the results are compared to the json of an earlier run of the suite: a case slower (by the minimal
+time of its runs, the least noisy) or allocating more than the baseline by more than --tolerance is a regression, and
+the suite exits with status 1.
+
+usage (from the repository root): python -m benchmarks.suite [--output results.json] [--baseline baseline.json]
+    [--repeat N] [--tolerance 0.2] [--filter name]
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+DEMAND_PATTERN = 'data/simulation_demand_input/*.csv'
+PRODUCTION_PATH = 'data/simulation_production_profile/national_solar_production.csv'
+SOLAR_PANEL_POWER_KW = 6000
+NUM_BATTERIES = 3
+SIMULATED_YEAR = 2030
+# the reference grid search, solar panel power [kw] and number of batteries as [from, to, points]
+GRID_DEMAND_PATH = 'data/simulation_demand_input/consumption_data1.csv'
+GRID_STRATEGY = 'Selling Strategy'
+GRID_SOLAR_PANEL_POWER_KW = (0, 40000, 5)
+GRID_NUM_BATTERIES = (0, 10, 5)
+# a timed run calls a case until it took at least this long, so the fast cases are not timed below the timer noise
+MIN_RUN_SECONDS = 0.05
+# relative slowdown (or growth of the peak memory) over the baseline reported as a regression
+TOLERANCE = 0.2
+# the measures of a case compared to the baseline
+COMPARED_MEASURES = ('min_seconds', 'peak_memory_bytes')
+# timed runs per case
+REPEAT = 5
+
+
+def get_calls_per_run(run: Callable[[], None]) -> int:
+    """
+    Warms the case up (numba compilation, profile and cost caches) and counts the calls of a timed run on warm calls,
+    the first call is slower
+
+    :param run: function running the case once
+    :return: int number of calls of the case that take at least MIN_RUN_SECONDS
+    """
+    run()
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < MIN_RUN_SECONDS:
+        run()
+        calls += 1
+    return calls
+
+
+def time_run(run: Callable[[], None], calls: int) -> float:
+    """
+    :param run: function running the case once
+    :param calls: int number of calls of the timed run
+    :return: float seconds of a call of the case
+    """
+    start = time.perf_counter()
+    for _ in range(calls):
+        run()
+    return (time.perf_counter() - start) / calls
+
+
+def get_peak_memory(run: Callable[[], None]) -> int:
+    """
+    :param run: function running the case once
+    :return: int bytes allocated at the peak of a call of the case
+    """
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def get_cases() -> List[Tuple[str, Callable[[], None], int]]:
+    """
+    :return: List of (name of the case, function running it once, hours it simulates)
+    """
+    from hourly_simulation.parameters import get_params
+    from hourly_simulation.predict_demand import predict_demand_in_year
+    from hourly_simulation.profile_store import load_demand, load_production
+    from hourly_simulation.simulation import get_solar_production_profile, calculate_cost
+    from hourly_simulation.strategies import use_strategies
+    from scenario_evaluator import lifetime_cost_cache
+    from scenario_evaluator.run_senarios import run_scenarios
+
+    params = get_params()
+    normalised_production = load_production(PRODUCTION_PATH)
+    production = get_solar_production_profile(normalised_production, SOLAR_PANEL_POWER_KW, params)
+    hours = len(production.df.index)
+    cases = []
+    for demand_path in sorted(glob.glob(DEMAND_PATTERN)):
+        profile = os.path.splitext(os.path.basename(demand_path))[0]
+        demand = predict_demand_in_year(load_demand(demand_path), params, SIMULATED_YEAR)
+        for name, strategy in use_strategies.items():
+            cases.append((f"strategy/{name}/{profile}",
+                          lambda strategy=strategy, demand=demand: strategy(demand, production, params, NUM_BATTERIES,
+                                                                            demand.YearOfDemand), hours))
+        electricity_use = use_strategies['Greedy Strategy'](demand, production, params, NUM_BATTERIES,
+                                                            demand.YearOfDemand)
+        cases.append((f"calculate_cost/{profile}",
+                      lambda electricity_use=electricity_use, demand=demand: calculate_cost(
+                          electricity_use, params, params.BATTERY_CAPACITY * NUM_BATTERIES, SOLAR_PANEL_POWER_KW,
+                          demand.YearOfDemand), hours))
+
+    grid_demand = load_demand(GRID_DEMAND_PATH)
+
+    def run_grid():
+        lifetime_cost_cache.clear()  # every run simulates the whole grid
+        run_scenarios(demand=grid_demand, normalised_production=normalised_production, simulated_year=SIMULATED_YEAR,
+                      solar_panel_power_it_kw=np.linspace(*GRID_SOLAR_PANEL_POWER_KW),
+                      num_batteries_it=np.linspace(*GRID_NUM_BATTERIES), strategy=use_strategies[GRID_STRATEGY],
+                      params=params, progress_bar=[], num_workers=1)
+
+    # the hours of the lifetimes of all the combinations, most of the years are interpolated (see lifetime_cost)
+    grid_hours = GRID_SOLAR_PANEL_POWER_KW[2] * GRID_NUM_BATTERIES[2] * int(params.YEARS_TO_SIMULATE) * hours
+    cases.append((f"run_scenarios/{GRID_STRATEGY}/{GRID_SOLAR_PANEL_POWER_KW[2]}x{GRID_NUM_BATTERIES[2]}", run_grid,
+                  grid_hours))
+    return cases
+
+
+def run_suite(repeat: int, name_filter: str = '') -> Dict:
+    """
+    :param repeat: int number of timed runs per case
+    :param name_filter: str only the cases whose name contains it are run
+    :return: dictionary of the results: 'metadata' and 'cases' (name of the case -> dictionary of its measures)
+    """
+    from hourly_simulation.jit import get_backend
+    from hourly_simulation.usage_cache import USAGE_CACHE_ENV_VAR
+
+    os.environ.pop(USAGE_CACHE_ENV_VAR, None)  # the strategies and grid are timed without the disk cache
+    cases = [(name, run, hours, get_calls_per_run(run)) for name, run, hours in get_cases() if name_filter in name]
+    seconds = {name: [] for name, _, _, _ in cases}
+    for _ in range(repeat):
+        for name, run, _, calls in cases:
+            seconds[name].append(time_run(run, calls))
+    results = {}
+    for name, run, hours, calls in cases:
+        measures = {'seconds': statistics.median(seconds[name]), 'min_seconds': min(seconds[name]),
+                    'peak_memory_bytes': get_peak_memory(run), 'calls_per_run': calls}
+        measures['simulated_hours_per_second'] = hours / measures['seconds']
+        results[name] = measures
+        print(f"{name:<58}{measures['seconds'] * 1000:>12.2f} ms{measures['peak_memory_bytes'] / 2 ** 20:>10.1f} MiB"
+              f"{measures['simulated_hours_per_second']:>16,.0f} h/s", file=sys.stderr, flush=True)
+    return {'metadata': {'created': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+                         'numpy': np.__version__, 'platform': platform.platform(), 'backend': get_backend(),
+                         'repeat': repeat},
+            'cases': results}
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float = TOLERANCE) -> List[str]:
+    """
+    :param results: dictionary of the results of run_suite
+    :param baseline: dictionary of the results of an earlier run_suite
+    :param tolerance: float relative growth of a measure reported as a regression
+    :return: List of the names of the cases that regressed, their measures are printed
+    """
+    regressions = []
+    print(f"{'case':<58}" + ''.join(f"{measure + ' ratio':>26}" for measure in COMPARED_MEASURES))
+    for name, measures in results['cases'].items():
+        if name not in baseline['cases']:
+            print(f"{name:<58}{'not in the baseline':>26}")
+            continue
+        ratios = [measures[measure] / max(baseline['cases'][name][measure], 1e-12) for measure in COMPARED_MEASURES]
+        regressed = any(ratio > 1 + tolerance for ratio in ratios)
+        print(f"{name:<58}" + ''.join(f"{ratio:>26.2f}" for ratio in ratios) + ("  REGRESSION" if regressed else ""))
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help='json file of the results, printed to stdout if not given')
+    parser.add_argument('--baseline', help='json file of earlier results, the regressions fail the suite')
+    parser.add_argument('--repeat', type=int, default=REPEAT, help='timed runs per case')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='relative growth of the time or memory of a case reported as a regression')
+    parser.add_argument('--filter', default='', help='only run the cases whose name contains it')
+    args = parser.parse_args()
+
+    results = run_suite(args.repeat, args.filter)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print(f"FAILED: {len(regressions)} cases regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,7 @@
+import copy
 import logging
 
+import numpy as np
 import pandas as pd
 
 
@@ -7,6 +9,7 @@ class DataFrameWrapper:
     """
     DataFrameWrapper Object that hold data frames, isn't used directly, but inherited.
     """
+    __slots__ = ()  # subclasses without __slots__ keep their attributes in __dict__
 
     def __init__(self, df: pd.DataFrame):
         self.df = df
@@ -16,12 +19,62 @@ class InputDataFrameWrapper(DataFrameWrapper):
     """
     InputDataFrameWrapper object that hold "simulation input" pd.DataFrames all with 'HourOfYear' column
     """
+    __slots__ = ()
     HourOfYear = 'HourOfYear'
 
     def __init__(self, df: pd.DataFrame):
         DataFrameWrapper.__init__(self, df)
 
 
+class ScaledInputDataFrameWrapper(InputDataFrameWrapper):
+    """
+    ScaledInputDataFrameWrapper object that hold "simulation input" pd.DataFrames with a values column that can be
+    scaled without copying. A scaled view shares the pd.DataFrame of its base and keeps the scale factor, the scaled
+    pd.DataFrame is only materialised when .df is used. Isn't used directly, but inherited.
+    """
+    ValuesColumn = None
+
+    def __init__(self, df: pd.DataFrame):
+        self._scale = None  # None when self._df is owned, the scale of the shared self._df otherwise
+        InputDataFrameWrapper.__init__(self, df)
+
+    @property
+    def df(self) -> pd.DataFrame:
+        if self._scale is not None:  # materialise the view into an owned pd.DataFrame
+            df = self._df.copy()
+            df[self.ValuesColumn] = df[self.ValuesColumn] * self._scale
+            self._df, self._scale = df, None
+        return self._df
+
+    @df.setter
+    def df(self, df: pd.DataFrame):
+        self._df, self._scale = df, None
+
+    def scaled(self, factor: float):
+        """
+        :param factor: float factor of the values column
+        :return: view of the same type with the values column multiplied by factor, without copying the pd.DataFrame
+        """
+        view = copy.copy(self)
+        view._scale = factor if self._scale is None else self._scale * factor
+        return view
+
+    def get_hour_of_year(self) -> pd.Series:
+        """
+        :return: pd.Series the (never scaled) HourOfYear column, without materialising a view
+        """
+        return self._df[self.HourOfYear]
+
+    def get_values(self) -> np.ndarray:
+        """
+        :return: np.ndarray new float64 array of the (scaled) values column, free to overwrite
+        """
+        values = self._df[self.ValuesColumn].to_numpy(dtype=np.float64)
+        if self._scale is None:
+            return values.copy()
+        return values * self._scale
+
+
 class SimulationResults(DataFrameWrapper):
     """
     SimulationResults object that hold pd.DataFrame of 'Find Optimum' simulation results
@@ -36,8 +89,11 @@ class SimulationResults(DataFrameWrapper):
 
 class ElectricityUseDf(InputDataFrameWrapper):
     """
-    ElectricityUseDf object that hold pd.DataFrame of  the results of the use strategy
+    ElectricityUseDf object that hold the results of the use strategy as one contiguous float64 np.ndarray
+    (len(COLUMNS), hours) with a row per column. The pd.DataFrame is only built when .df is used (UI, csv download),
+    it is a read only copy, changes are made to the rows (see get_column).
     """
+    __slots__ = ('values', '_df')
     GasUsage = 'GasUsage'
     GasStored = 'GasStored'
     SolarUsage = 'SolarUsage'
@@ -57,18 +113,47 @@ class ElectricityUseDf(InputDataFrameWrapper):
                SolarSold,
                StoredSold]
 
-    def __init__(self, df: pd.DataFrame):
-        InputDataFrameWrapper.__init__(self, df)
-
-
-class DemandDf(InputDataFrameWrapper):
+    def __init__(self, data):
+        """
+        :param data: np.ndarray(len(COLUMNS), hours) with a row per column, or pd.DataFrame with the COLUMNS
+        """
+        if isinstance(data, pd.DataFrame):
+            InputDataFrameWrapper.__init__(self, data)
+        else:
+            self.values = np.ascontiguousarray(data, dtype=np.float64)
+            self._df = None
+
+    @property
+    def df(self) -> pd.DataFrame:
+        if self._df is None:
+            df = pd.DataFrame(self.values.T, columns=ElectricityUseDf.COLUMNS)
+            df[ElectricityUseDf.HourOfYear] = df[ElectricityUseDf.HourOfYear].astype(np.int64)
+            self._df = df
+        return self._df
+
+    @df.setter
+    def df(self, df: pd.DataFrame):
+        self.values = np.ascontiguousarray(df[ElectricityUseDf.COLUMNS].to_numpy(dtype=np.float64).T)
+        self._df = None
+
+    def get_column(self, column: str) -> np.ndarray:
+        """
+        :param column: str name of a column in COLUMNS
+        :return: np.ndarray row of the column (a view, writing to it changes the electricity use)
+        """
+        self._df = None
+        return self.values[ElectricityUseDf.COLUMNS.index(column)]
+
+
+class DemandDf(ScaledInputDataFrameWrapper):
     """
     DemandDf object that hold pd.DataFrame of the electricity comsumption demand
     """
     Demand = 'Demand'
+    ValuesColumn = Demand
 
     def __init__(self, df: pd.DataFrame):
-        InputDataFrameWrapper.__init__(self, df)
+        ScaledInputDataFrameWrapper.__init__(self, df)
         try:
             self.YearOfDemand = int(df.columns[1])
         except Exception:
@@ -77,14 +162,15 @@ class DemandDf(InputDataFrameWrapper):
         self.Demand = DemandDf.Demand
 
 
-class ProductionDf(InputDataFrameWrapper):
+class ProductionDf(ScaledInputDataFrameWrapper):
     """
     ProductionDf object that hold pd.DataFrame of the PV solar production
     """
     SolarProduction = 'SolarProduction'
+    ValuesColumn = SolarProduction
 
     def __init__(self, df: pd.DataFrame):
-        InputDataFrameWrapper.__init__(self, df)
+        ScaledInputDataFrameWrapper.__init__(self, df)
 
 
 class CostElectricityDf(InputDataFrameWrapper):
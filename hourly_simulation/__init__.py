@@ -1,2 +0,0 @@
-import hourly_simulation.strategies
-from hourly_simulation import parameters
@@ -0,0 +1,148 @@
+import functools
+
+import numpy as np
+import numpy_financial as npf
+
+from hourly_simulation.parameters import Params
+from hourly_simulation.tariff_calendar import TariffCalendar, get_tariff_calendar
+from hourly_simulation.strategies.columns import HOUR_OF_YEAR, GAS_USAGE, GAS_STORED, SOLAR_SOLD, \
+    STORED_SOLD
+
+# columns of the electricity costs of a scenario (see CostEvaluator.price_blocks)
+ELECTRICITY_BOUGHT = 0
+ELECTRICITY_SOLD = 1
+# units of the facility of a scenario (see CostEvaluator.facility_coefficients)
+SOLAR_PANEL_KW = 0
+BATTERY_KWH = 1
+# number of evaluators kept, one per (Params, tariff calendar)
+MAX_COST_EVALUATORS = 16
+
+
+class CostEvaluator:
+    """
+    Evaluates the yearly cost of electricity uses for one Params and tariff calendar. The buy and sell prices of the
+    calendar are arranged by the rows of the electricity use once, adjacent rows with the same kind of price are
+    flattened together, so the electricity cost of many scenarios is a matrix product per block of rows
+    (GasUsage + GasStored, SolarSold + StoredSold).
+    The facility costs (capex, opex, financing) are linear in the solar panel power and the battery capacity, their
+    coefficients per unit are computed once.
+    """
+
+    def __init__(self, params: Params, tariff: TariffCalendar):
+        """
+        :param params: namedtuple simulation params
+        :param tariff: TariffCalendar buying and selling prices per Kwh of every hour of the demand year
+        """
+        self.params = params
+        self.hour_of_year = tariff.hour_of_year
+        priced_rows = {GAS_USAGE: (ELECTRICITY_BOUGHT, tariff.buy_price),
+                       GAS_STORED: (ELECTRICITY_BOUGHT, tariff.buy_price / params.BATTERY_EFFICIENCY),
+                       SOLAR_SOLD: (ELECTRICITY_SOLD, tariff.sell_price),
+                       STORED_SOLD: (ELECTRICITY_SOLD, tariff.sell_price)}
+        # List of (first row, last row + 1, electricity cost column, (rows, hours) prices) of the electricity use
+        self.price_blocks = []
+        for row in sorted(priced_rows):
+            column, prices = priced_rows[row]
+            if self.price_blocks and self.price_blocks[-1][1] == row and self.price_blocks[-1][2] == column:
+                first_row, _, _, block_prices = self.price_blocks[-1]
+                self.price_blocks[-1] = first_row, row + 1, column, np.vstack([block_prices, prices])
+            else:
+                self.price_blocks.append((row, row + 1, column, prices[np.newaxis, :]))
+        # (facility costs, [per solar panel kw, per battery kwh]) in the order of the cost description
+        self.facility_coefficients = np.stack(get_facility_costs(params, battery_capacity=np.array([0., 1.]),
+                                                                 solar_panel_power_kw=np.array([1., 0.])))
+
+    def evaluate(self, electricity_use: np.ndarray, battery_capacity, solar_panel_power_kw,
+                 return_description=False):
+        """
+        Yearly cost of a single electricity use or of a stacked batch of electricity uses
+
+        :param electricity_use: np.ndarray([scenarios,] len(ElectricityUseDf.COLUMNS), hours) electricity use
+        :param battery_capacity: float or np.ndarray(scenarios) capacity of batteries in Kwh
+        :param solar_panel_power_kw: float or np.ndarray(scenarios) power of panel Kwh
+        :param return_description: bool return the breakdown of the cost as well
+        :return: total cost (float, or np.ndarray(scenarios) for a batch), and if return_description a Tuple of (total
+            cost, electricity bought, PV capex, battery capex, battery replacement, PV opex, battery opex, capital
+            expenses, entrepreneur profit, electricity sold income)
+        """
+        is_batch = electricity_use.ndim == 3
+        uses = electricity_use.reshape((-1,) + electricity_use.shape[-2:])
+        electricity_costs = self.electricity_costs(uses)
+        units = np.zeros((len(uses), 2))
+        units[:, SOLAR_PANEL_KW] = solar_panel_power_kw
+        units[:, BATTERY_KWH] = battery_capacity
+        facility_costs = units @ self.facility_coefficients.T
+        total_cost = electricity_costs[:, ELECTRICITY_BOUGHT] - electricity_costs[:, ELECTRICITY_SOLD] + \
+            facility_costs.sum(axis=1)
+        if not is_batch:
+            total_cost, electricity_costs, facility_costs = total_cost[0], electricity_costs[0], facility_costs[0]
+        if return_description:
+            return total_cost, (total_cost, electricity_costs[..., ELECTRICITY_BOUGHT],
+                                *np.moveaxis(facility_costs, -1, 0), electricity_costs[..., ELECTRICITY_SOLD])
+        return total_cost
+
+    def electricity_costs(self, electricity_use: np.ndarray) -> np.ndarray:
+        """
+        Cost of the electricity bought and income of the electricity sold, without the facility costs
+
+        :param electricity_use: np.ndarray([scenarios,] len(ElectricityUseDf.COLUMNS), hours) electricity use
+        :return: np.ndarray([scenarios,] 2) of the ELECTRICITY_BOUGHT and ELECTRICITY_SOLD columns
+        """
+        uses = electricity_use.reshape((-1,) + electricity_use.shape[-2:])
+        # prices of the hours which are not in the electricity use are zeroed
+        hours_paid_in_year = None if np.array_equal(uses[0, HOUR_OF_YEAR], self.hour_of_year) else \
+            self.hour_of_year == uses[0, HOUR_OF_YEAR]
+        electricity_costs = np.zeros((len(uses), 2))
+        for first_row, last_row, column, prices in self.price_blocks:
+            if hours_paid_in_year is not None:
+                prices = prices * hours_paid_in_year
+            electricity_costs[:, column] += uses[:, first_row: last_row].reshape(len(uses), -1) @ prices.ravel()
+        return electricity_costs.reshape(electricity_use.shape[:-2] + (2,))
+
+
+def get_cost_evaluator(params: Params, demand_year: int) -> CostEvaluator:
+    """
+    :param params: namedtuple simulation params
+    :param demand_year: int year of the demand of the electricity uses (see TariffCalendar)
+    :return: CostEvaluator of the params and the demand year, created once per params and tariff calendar (a new
+        calendar when the tariffs are modified, see get_tariff_calendar)
+    """
+    return __get_cost_evaluator(params, get_tariff_calendar(demand_year))
+
+
+@functools.lru_cache(maxsize=MAX_COST_EVALUATORS)
+def __get_cost_evaluator(params: Params, tariff: TariffCalendar) -> CostEvaluator:
+    return CostEvaluator(params, tariff)
+
+
+def get_facility_costs(params: Params, battery_capacity, solar_panel_power_kw):
+    """
+    Yearly costs of the facility, works on a single scenario or on arrays of scenarios
+
+    :param params: namedtuple simulation params
+    :param battery_capacity: capacity of batteries in Kwh
+    :param solar_panel_power_kw: power of panel Kwh
+    :return: Tuple of (PV capex, battery capex, battery replacement, PV opex, battery opex, capital expenses,
+        entrepreneur profit)
+    """
+    # calculate PV opex and capex
+    total_solar_opex = solar_panel_power_kw * params.PV_OPEX
+    total_solar_capex = solar_panel_power_kw * params.PV_CAPEX / params.FACILITY_LIFE_SPAN
+    # calculate batteries opex and capex
+    total_battery_opex = battery_capacity * params.BATTERY_OPEX
+    total_battery_capex = battery_capacity * params.BATTERY_CAPEX / params.FACILITY_LIFE_SPAN
+    total_init_capex = total_battery_capex + total_solar_capex
+    # battery_replacement_cost
+    future_battery_capex = params.BATTERY_ADDED_FOR_REPLACEMENT * battery_capacity * params.BATTERY_FUTURE_CAPEX / \
+        params.FACILITY_LIFE_SPAN
+    # capital expenses due to loans
+    total_loan = total_init_capex * params.FACILITY_LIFE_SPAN * params.LOAN_SIZE
+    capital_expenses = (-1 * npf.pmt(rate=params.LOAN_INTEREST_RATE, nper=params.LOAN_LENGTH,
+                                     pv=total_loan) * params.LOAN_LENGTH - total_loan) / params.FACILITY_LIFE_SPAN
+    # entrepreneur profit
+    total_equity = total_init_capex * params.FACILITY_LIFE_SPAN * (1 - params.LOAN_SIZE)
+    entrepreneur_profit = (-1 * npf.pmt(rate=params.ENTREPRENEUR_PROFIT, nper=params.FACILITY_LIFE_SPAN,
+                                        pv=total_equity) * params.FACILITY_LIFE_SPAN - total_equity) / \
+        params.FACILITY_LIFE_SPAN
+    return total_solar_capex, total_battery_capex, future_battery_capex, total_solar_opex, total_battery_opex, \
+        capital_expenses, entrepreneur_profit
@@ -0,0 +1,135 @@
+import logging
+import os
+from typing import Dict, Iterator
+
+import numpy as np
+
+from hourly_simulation.parameters import Params
+from hourly_simulation.timing import timed, CHECK_INVARIANTS
+from hourly_simulation.strategies.columns import GAS_USAGE, GAS_STORED, SOLAR_USAGE, STORED_USAGE, SOLAR_STORED, \
+    SOLAR_LOST, SOLAR_SOLD, STORED_SOLD
+
+# the invariants every simulated electricity use holds, in the order of get_excess
+NEGATIVE_USE = 'negative use'
+DEMAND_NOT_REACHED = 'demand not reached'
+PRODUCTION_NOT_USED = 'production not accounted for'
+CHARGE_POWER_PASSED = 'charge power passed'
+DISCHARGE_POWER_PASSED = 'discharge power passed'
+CHARGE_AND_DISCHARGE = 'charged and discharged in the same hour'
+BATTERY_BELOW_EMPTY = 'battery below empty'
+BATTERY_CAPACITY_PASSED = 'battery capacity passed'
+SELLING_LIMIT_PASSED = 'selling limit passed'
+INVARIANTS = (NEGATIVE_USE, DEMAND_NOT_REACHED, PRODUCTION_NOT_USED, CHARGE_POWER_PASSED, DISCHARGE_POWER_PASSED,
+              CHARGE_AND_DISCHARGE, BATTERY_BELOW_EMPTY, BATTERY_CAPACITY_PASSED, SELLING_LIMIT_PASSED)
+# first violating hour of an invariant that holds
+NO_VIOLATION = -1
+# Kwh tolerated over every limit to account for computational errors
+EPSILON = 0.05
+# set THOUSAND_SUNS_CHECK_INVARIANTS=0 to skip the checks of the grid searches, =strict to fail them on a violation
+CHECK_INVARIANTS_ENV_VAR = 'THOUSAND_SUNS_CHECK_INVARIANTS'
+STRICT = 'strict'
+
+
+class InvariantViolation(AssertionError):
+    """
+    A simulated electricity use breaks an invariant, an AssertionError like the failures of tests/sanity_checks.py
+    """
+
+
+def get_excess(electricity_use: np.ndarray, demand: np.ndarray, production: np.ndarray, battery_capacity,
+               battery_power, max_selling_power: float) -> Iterator[np.ndarray]:
+    """
+    How much every hour passes the limit of every invariant, the state of charge of the batteries is the cumulative sum
+    of the Kwh entering minus the Kwh leaving them
+
+    :param electricity_use: np.ndarray(..., len(ElectricityUseDf.COLUMNS), hours) electricity use of one or many
+        scenarios
+    :param demand: np.ndarray(..., hours) demand of every hour
+    :param production: np.ndarray(..., hours) solar production of every hour
+    :param battery_capacity: float or np.ndarray(...) capacity of the batteries of every scenario [Kwh]
+    :param battery_power: float or np.ndarray(...) charging/discharging power limit of every scenario [Kw]
+    :param max_selling_power: float selling power limit [Kw]
+    :return: np.ndarray(..., hours) Kwh over the limit of every invariant in the order of INVARIANTS, an invariant is
+        violated in the hours where it is above the tolerance
+    """
+    def row(index: int) -> np.ndarray:
+        return electricity_use[..., index, :]
+
+    battery_capacity = np.asarray(battery_capacity, dtype=np.float64)[..., np.newaxis]
+    battery_power = np.asarray(battery_power, dtype=np.float64)[..., np.newaxis]
+    charged = row(SOLAR_STORED) + row(GAS_STORED)
+    discharged = row(STORED_USAGE) + row(STORED_SOLD)
+    yield -electricity_use[..., GAS_USAGE:, :].min(axis=-2)
+    yield np.abs(row(SOLAR_USAGE) + row(GAS_USAGE) + row(STORED_USAGE) - demand)
+    yield np.abs(row(SOLAR_USAGE) + row(SOLAR_STORED) + row(SOLAR_LOST) + row(SOLAR_SOLD) - production)
+    yield charged - battery_power
+    yield discharged - battery_power
+    yield np.minimum(charged, discharged)
+    state_of_charge = np.cumsum(charged - discharged, axis=-1)
+    yield -state_of_charge
+    yield state_of_charge - battery_capacity
+    yield row(SOLAR_SOLD) + row(STORED_SOLD) - max_selling_power
+
+
+def get_first_violation(excess: np.ndarray, epsilon: float = EPSILON) -> np.ndarray:
+    """
+    :param excess: np.ndarray(..., hours) Kwh over the limit of an invariant (see get_excess)
+    :param epsilon: small number to account for computational errors
+    :return: np.ndarray(...) of int the first hour violating the invariant, NO_VIOLATION if it holds
+    """
+    violated = excess > epsilon
+    return np.where(violated.any(axis=-1), violated.argmax(axis=-1), NO_VIOLATION)
+
+
+@timed(CHECK_INVARIANTS)
+def check_electricity_use(electricity_use: np.ndarray, demand: np.ndarray, production: np.ndarray, battery_capacity,
+                          battery_power, max_selling_power: float, epsilon: float = EPSILON,
+                          strict: bool = False) -> Dict[str, int]:
+    """
+    Checks the invariants of one or many simulated electricity uses (see get_excess), logs a warning of every violated
+    invariant
+
+    :param epsilon: small number to account for computational errors
+    :param strict: bool raise InvariantViolation if an invariant is violated
+    :return: dictionary(violated invariant -> first violating hour, the earliest of all the scenarios)
+    """
+    violations, messages = {}, []
+    for invariant, excess in zip(INVARIANTS, get_excess(electricity_use, demand, production, battery_capacity,
+                                                        battery_power, max_selling_power)):
+        first_violations = get_first_violation(excess, epsilon).reshape(-1)
+        scenarios = np.flatnonzero(first_violations != NO_VIOLATION)
+        if not len(scenarios):
+            continue
+        scenario = scenarios[np.argmin(first_violations[scenarios])]
+        hour = int(first_violations[scenario])
+        violations[invariant] = hour
+        messages.append(f"{invariant} in hour {hour} by {excess.reshape(-1, excess.shape[-1])[scenario, hour]:.3f} "
+                        f"Kwh" + (f" ({len(scenarios)} of {len(first_violations)} scenarios, first in scenario "
+                                  f"{scenario})" if len(first_violations) > 1 else ""))
+    for message in messages:
+        logging.warning("invariant violated: " + message)
+    if strict and violations:
+        raise InvariantViolation("; ".join(messages))
+    return violations
+
+
+def check_batch(electricity_use: np.ndarray, demand: np.ndarray, production: np.ndarray, params: Params,
+                num_batteries: np.ndarray) -> Dict[str, int]:
+    """
+    Checks the electricity use of the scenarios of a grid search as CHECK_INVARIANTS_ENV_VAR is set: by default the
+    violations are logged, skipped with '0', raised with 'strict'
+
+    :param electricity_use: np.ndarray(scenarios, len(ElectricityUseDf.COLUMNS), hours) electricity use of every
+        scenario
+    :param demand: np.ndarray(hours) demand of every hour
+    :param production: np.ndarray(scenarios, hours) solar production of every scenario
+    :param params: namedtuple simulation params
+    :param num_batteries: np.ndarray(scenarios) number of batteries of every scenario
+    :return: dictionary(violated invariant -> first violating hour)
+    """
+    mode = os.environ.get(CHECK_INVARIANTS_ENV_VAR, '1')
+    if mode == '0':
+        return {}
+    return check_electricity_use(electricity_use, demand, production,
+                                 num_batteries * params.BATTERY_CAPACITY * params.BATTERY_EFFECTIVE_SIZE,
+                                 num_batteries * params.CHARGE_POWER, params.MAX_SELLING_POWER, strict=mode == STRICT)
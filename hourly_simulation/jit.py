@@ -0,0 +1,80 @@
+import functools
+import importlib.util
+import logging
+import os
+import threading
+
+NUMBA_INSTALLED = importlib.util.find_spec('numba') is not None
+# set THOUSAND_SUNS_JIT=0 to force the pure python kernels (e.g. for debugging or benchmarking)
+JIT_ENV_VAR = 'THOUSAND_SUNS_JIT'
+JIT_ENABLED = NUMBA_INSTALLED and os.environ.get(JIT_ENV_VAR, '1') != '0'
+
+if not NUMBA_INSTALLED:
+    logging.info("numba is not installed, running the simulation kernels in pure python")
+
+# every LazyKernel, numba is imported and they are compiled together when the first one is called
+__kernels = []
+__kernels_lock = threading.Lock()
+
+
+class LazyKernel:
+    """
+    A simulation kernel compiled with numba on its first call, so numba (slower to import than the rest of the
+    simulation) is only imported by the processes that run the kernels. The kernels calling each other are numba
+    functions, so on compilation every kernel is replaced by its numba dispatcher in the globals of the kernels.
+    """
+
+    def __init__(self, func):
+        """
+        :param func: function of the kernel
+        """
+        functools.update_wrapper(self, func)
+        self.py_func = func
+        self.dispatcher = None
+
+    def __call__(self, *args, **kwargs):
+        if self.dispatcher is None:
+            compile_kernels()
+        return self.dispatcher(*args, **kwargs)
+
+
+def jit(func):
+    """
+    Compiles a simulation kernel with numba if it is available, otherwise returns it untouched.
+    Kernels should only use numpy arrays, scalars and other jit kernels so both backends give identical results.
+
+    :param func: function to compile
+    :return: LazyKernel compiled to a numba dispatcher (cached on disk) on its first call, or the original function
+    """
+    if not JIT_ENABLED:
+        return func
+    kernel = LazyKernel(func)
+    with __kernels_lock:
+        __kernels.append(kernel)
+    return kernel
+
+
+def compile_kernels() -> None:
+    """
+    Imports numba and creates the dispatchers of the kernels that have none yet (numba compiles every dispatcher on
+    its first call), replacing the kernels in the globals of the kernels
+    """
+    with __kernels_lock:
+        if all(kernel.dispatcher is not None for kernel in __kernels):
+            return
+        import numba
+        for kernel in __kernels:
+            if kernel.dispatcher is None:
+                kernel.dispatcher = numba.njit(cache=True)(kernel.py_func)
+        for kernel in __kernels:
+            module_globals = kernel.py_func.__globals__
+            for name, value in list(module_globals.items()):
+                if isinstance(value, LazyKernel):
+                    module_globals[name] = value.dispatcher
+
+
+def get_backend() -> str:
+    """
+    :return: str name of the backend used for the simulation kernels
+    """
+    return 'numba' if JIT_ENABLED else 'python'
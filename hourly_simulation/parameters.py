@@ -1,14 +1,16 @@
 import csv
+import functools
+import os
 from collections import namedtuple
 from typing import Dict
 
-import pandas as pd
-
-from df_objects.df_objects import CostElectricityDf
-from hourly_simulation.shift_day_in_year import shift_day_of_year
+# the repository root, the data paths relative to it are found from any working directory (see get_data_path)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 # Non changing Params
 PARAMS_PATH = "data/parameters.csv"
+# number of parameter csv versions kept parsed (see get_params)
+MAX_CACHED_PARAMS = 8
 MW_TO_KW_DIVIDE = {
     "/mw": "/kw",
     "/Mw": "/Kw",
@@ -29,6 +31,16 @@ def mw_to_kw(value, unit, as_mw):
     return float(value)
 
 
+def get_data_path(path: str) -> str:
+    """
+    :param path: str path of a data file, absolute or relative to the working directory or to the repository root
+    :return: str the path if it is absolute or exists from the working directory, otherwise the path in ROOT_DIR
+    """
+    if os.path.isabs(path) or os.path.exists(path):
+        return path
+    return os.path.join(ROOT_DIR, path)
+
+
 def get_simulation_parameters(csv_path, with_units=False, as_mw=False) -> Dict:
     """
     Retrieves the parameters from csv_path as dictionary
@@ -38,7 +50,7 @@ def get_simulation_parameters(csv_path, with_units=False, as_mw=False) -> Dict:
     :return: if with_units: dictionary(str -> float). else: dictionary(str -> (float, str))
     """
     params = {}
-    with open(csv_path, newline='\n') as csvfile:
+    with open(get_data_path(csv_path), newline='\n') as csvfile:
         reader = csv.reader(csvfile, delimiter=',')
         for row in reader:
             if with_units:
@@ -48,19 +60,50 @@ def get_simulation_parameters(csv_path, with_units=False, as_mw=False) -> Dict:
     return params
 
 
-__simulation_params_dict = get_simulation_parameters(PARAMS_PATH)
-Params = namedtuple('Params', __simulation_params_dict.keys())
-simulation_params = Params(**__simulation_params_dict)
+# names of the parameters of the csv, so Params is defined without reading it (see get_params)
+PARAM_NAMES = ('GROWTH_PER_YEAR', 'BATTERY_CAPACITY', 'CHARGE_POWER', 'BATTERY_EFFICIENCY', 'BATTERY_OPEX',
+               'BATTERY_CAPEX', 'PV_OPEX', 'PV_CAPEX', 'FACILITY_LIFE_SPAN', 'YEARS_TO_SIMULATE', 'MAX_SELLING_POWER',
+               'PV_DEGRADATION', 'BATTERY_EFFECTIVE_SIZE', 'BATTERY_ADDED_FOR_REPLACEMENT', 'BATTERY_FUTURE_CAPEX',
+               'LOAN_SIZE', 'LOAN_INTEREST_RATE', 'LOAN_LENGTH', 'ENTREPRENEUR_PROFIT')
+Params = namedtuple('Params', PARAM_NAMES)
+
+
+def get_params(csv_path: str = PARAMS_PATH) -> Params:
+    """
+    Params of a parameters csv, parsed again only when the csv is modified (e.g. by the simulation params page)
+
+    :param csv_path: str path of the parameters csv
+    :return: namedtuple Params
+    """
+    path = os.path.abspath(get_data_path(csv_path))
+    stat = os.stat(path)
+    return __load_params(path, stat.st_mtime_ns, stat.st_size)
+
+
+@functools.lru_cache(maxsize=MAX_CACHED_PARAMS)
+def __load_params(path: str, mtime_ns: int, size: int) -> Params:
+    """
+    :return: namedtuple Params of the csv, cached by its modification time and size, raises ValueError if the
+        parameters of the csv are not PARAM_NAMES
+    """
+    params = get_simulation_parameters(path)
+    missing = [name for name in PARAM_NAMES if name not in params]
+    unknown = [name for name in params if name not in PARAM_NAMES]
+    if missing or unknown:
+        raise ValueError(f"The parameters of {path} do not match PARAM_NAMES of hourly_simulation/parameters.py"
+                         + (f", missing: {', '.join(missing)}" if missing else '')
+                         + (f", unknown: {', '.join(unknown)}" if unknown else ''))
+    return Params(**params)
+
+
+# parameters that change the electricity use of a simulated year, the others (capex, opex, loans, profit, years) only
+# change its cost. FACILITY_LIFE_SPAN sets the average production of the panels (see get_average_effective_size)
+PHYSICAL_PARAMS = ('CHARGE_POWER', 'BATTERY_CAPACITY', 'BATTERY_EFFICIENCY', 'BATTERY_EFFECTIVE_SIZE',
+                   'MAX_SELLING_POWER', 'GROWTH_PER_YEAR', 'PV_DEGRADATION', 'FACILITY_LIFE_SPAN')
 
-# Electricity
+# Electricity tariffs of a year (ILS per Kwh), aligned to the simulated demand by tariff_calendar.TariffCalendar
 
 ELECTRICITY_COST_PATH = 'data/electricity_cost_gaussian.csv'
-ELECTRICITY_COST_BINARY_PATH = 'data/shifted_electricity_cost_binary.csv'
+ELECTRICITY_COST_BINARY_PATH = 'data/electricity_cost_binary.csv'
 ELECTRICITY_SELLING_INCOME_PATH = 'data/electricity_sell_gaussian.csv'
-ELECTRICITY_COST = CostElectricityDf(pd.read_csv(ELECTRICITY_COST_PATH, index_col=0))
-ELECTRICITY_COST.df[ELECTRICITY_COST.Cost] = shift_day_of_year(ELECTRICITY_COST.df[ELECTRICITY_COST.Cost], ELECTRICITY_COST.YearOfCost)
-ELECTRICITY_SELLING_INCOME = CostElectricityDf(pd.read_csv(ELECTRICITY_SELLING_INCOME_PATH, index_col=0))  # ILS per Kw
-ELECTRICITY_SELLING_INCOME.df[ELECTRICITY_SELLING_INCOME.Cost] = shift_day_of_year(ELECTRICITY_SELLING_INCOME.df[ELECTRICITY_SELLING_INCOME.Cost], ELECTRICITY_SELLING_INCOME.YearOfCost)
-BINARY_SELLING_COST = CostElectricityDf(pd.read_csv(ELECTRICITY_COST_BINARY_PATH, index_col=0))
-BINARY_SELLING_COST.df[BINARY_SELLING_COST.Cost] = shift_day_of_year(BINARY_SELLING_COST.df[BINARY_SELLING_COST.Cost], BINARY_SELLING_COST.YearOfCost)
 
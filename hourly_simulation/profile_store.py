@@ -0,0 +1,156 @@
+import logging
+import os
+import threading
+from typing import Dict, Callable
+
+import numpy as np
+import pandas as pd
+
+from df_objects.df_objects import DemandDf, ProductionDf, CostElectricityDf, InputDataFrameWrapper
+from hourly_simulation.parameters import get_data_path
+from hourly_simulation.timing import timed, LOAD_PROFILES
+
+# the parsed profile is saved next to its csv with this suffix, and reused while the csv is not modified
+PROFILE_CACHE_SUFFIX = '.npz'
+# bump when the parsing or the cache format changes, invalidates the saved profiles
+PROFILE_CACHE_VERSION = 1
+
+# kinds of profiles, each parsed (normalised) differently
+DEMAND = 'demand'
+PRODUCTION = 'production'
+COST = 'cost'
+
+# arrays of a profile
+INDEX = 'index'
+HOUR_OF_YEAR = 'hour_of_year'
+VALUES = 'values'
+YEAR = 'year'
+
+# parsed profiles of the process: absolute csv path -> (kind, source signature, read-only arrays)
+__profiles = {}
+__profiles_lock = threading.Lock()
+
+
+@timed(LOAD_PROFILES)
+def load_demand(csv_path: str) -> DemandDf:
+    """
+    Demand profile of a csv, parsed once
+
+    :param csv_path: str path of a csv of pd.DataFrame(columns=['HourOfYear', '$(Year)'])
+    :return: DemandDf of pd.DataFrame(columns=['HourOfYear', 'Demand']), a new pd.DataFrame for every call
+    """
+    profile = get_profile(csv_path, DEMAND)
+    return DemandDf(__profile_df(profile, str(int(profile[YEAR]))))
+
+
+@timed(LOAD_PROFILES)
+def load_production(csv_path: str) -> ProductionDf:
+    """
+    Production profile of a csv normalised by its maximum, parsed once
+
+    :param csv_path: str path of a csv of pd.DataFrame(columns=['HourOfYear', 'SolarProduction'])
+    :return: ProductionDf of pd.DataFrame(columns=['HourOfYear', 'SolarProduction']) between 0 and 1, a new
+        pd.DataFrame for every call
+    """
+    return ProductionDf(__profile_df(get_profile(csv_path, PRODUCTION), ProductionDf.SolarProduction))
+
+
+def get_profile(csv_path: str, kind: str) -> Dict[str, np.ndarray]:
+    """
+    Read-only arrays of a parsed profile. A profile is parsed once per process, and once per modification of the csv
+    across processes (the parsed arrays are saved next to the csv, see PROFILE_CACHE_SUFFIX).
+
+    :param csv_path: str path of the csv (see get_data_path)
+    :param kind: str one of DEMAND, PRODUCTION, COST
+    :return: dictionary(INDEX, HOUR_OF_YEAR, VALUES, YEAR -> read-only np.ndarray)
+    """
+    path = os.path.abspath(get_data_path(csv_path))
+    key = (path, kind)
+    stat = os.stat(path)
+    signature = np.array([PROFILE_CACHE_VERSION, stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+    with __profiles_lock:
+        if key in __profiles and np.array_equal(__profiles[key][0], signature):
+            return __profiles[key][1]
+        profile = __load_cached_profile(path, kind, signature)
+        if profile is None:
+            profile = __parsers[kind](pd.read_csv(path, index_col=0))
+            __save_cached_profile(path, kind, signature, profile)
+        for array in profile.values():
+            array.setflags(write=False)
+        __profiles[key] = signature, profile
+        return profile
+
+
+def get_cache_path(csv_path: str, kind: str) -> str:
+    """
+    :param csv_path: str path of the csv
+    :param kind: str kind of the profile
+    :return: str path of the saved profile of the csv
+    """
+    return f"{os.path.splitext(csv_path)[0]}.{kind}{PROFILE_CACHE_SUFFIX}"
+
+
+def __load_cached_profile(path: str, kind: str, signature: np.ndarray):
+    """
+    :return: dictionary of the arrays saved for the csv, None if missing or saved from an other version of the csv
+    """
+    cache_path = get_cache_path(path, kind)
+    if not os.path.isfile(cache_path):
+        return None
+    try:
+        with np.load(cache_path, allow_pickle=False) as cached:
+            if not np.array_equal(cached['signature'], signature):
+                return None
+            return {name: cached[name] for name in (INDEX, HOUR_OF_YEAR, VALUES, YEAR)}
+    except (OSError, ValueError, KeyError):
+        logging.warning("Could not load the saved profile: " + cache_path)
+        return None
+
+
+def __save_cached_profile(path: str, kind: str, signature: np.ndarray, profile: Dict[str, np.ndarray]) -> None:
+    """
+    Saves the arrays of the profile next to the csv, a read-only data folder only logs a warning
+    """
+    cache_path = get_cache_path(path, kind)
+    temp_path = f"{cache_path}.{os.getpid()}.tmp{PROFILE_CACHE_SUFFIX}"
+    try:
+        np.savez(temp_path, signature=signature, **profile)
+        os.replace(temp_path, cache_path)  # atomic, other processes never see a partial file
+    except OSError:
+        logging.warning("Could not save the profile: " + cache_path)
+
+
+def __profile_df(profile: Dict[str, np.ndarray], values_column: str) -> pd.DataFrame:
+    """
+    :return: pd.DataFrame(columns=['HourOfYear', values_column]) of the profile arrays
+    """
+    return pd.DataFrame({InputDataFrameWrapper.HourOfYear: profile[HOUR_OF_YEAR], values_column: profile[VALUES]},
+                        index=pd.Index(profile[INDEX]))
+
+
+def __parse_demand(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    demand = DemandDf(df)
+    return __profile_arrays(demand.df, demand.df[demand.Demand].to_numpy(), demand.YearOfDemand)
+
+
+def __parse_production(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    production = ProductionDf(df)
+    solar_production = production.df[production.SolarProduction]
+    return __profile_arrays(production.df, (solar_production / solar_production.max()).to_numpy(), 0)
+
+
+def __parse_cost(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    cost = CostElectricityDf(df)
+    return __profile_arrays(cost.df, cost.df[cost.Cost].to_numpy(), cost.YearOfCost)
+
+
+def __profile_arrays(df: pd.DataFrame, values: np.ndarray, year: int) -> Dict[str, np.ndarray]:
+    return {INDEX: df.index.to_numpy(),
+            HOUR_OF_YEAR: df[InputDataFrameWrapper.HourOfYear].to_numpy(),
+            VALUES: np.ascontiguousarray(values),
+            YEAR: np.array(year, dtype=np.int64)}
+
+
+__parsers: Dict[str, Callable[[pd.DataFrame], Dict[str, np.ndarray]]] = {DEMAND: __parse_demand,
+                                                                         PRODUCTION: __parse_production,
+                                                                         COST: __parse_cost}
@@ -1,14 +1,18 @@
-import copy
 from typing import Callable
 
-import numpy_financial as npf
+import numpy as np
 
 from df_objects import ProductionDf
 from df_objects.df_objects import ElectricityUseDf, DemandDf
-from hourly_simulation.parameters import Params, ELECTRICITY_COST, ELECTRICITY_SELLING_INCOME
+from hourly_simulation import usage_cache, invariants, timing
+from hourly_simulation.cost_evaluator import get_cost_evaluator, ELECTRICITY_BOUGHT, ELECTRICITY_SOLD
+from hourly_simulation.parameters import Params
 from hourly_simulation.predict_demand import predict_demand_in_year
+from hourly_simulation.strategies import batch_strategies
+from hourly_simulation.strategies.columns import NUM_COLUMNS
 
 
+@timing.timed(timing.SOLAR_PRODUCTION)
 def get_solar_production_profile(normalised_production: ProductionDf, solar_panel_power_kw: float,
                                  params: Params) -> ProductionDf:
     """
@@ -18,81 +22,65 @@ def get_solar_production_profile(normalised_production: ProductionDf, solar_pane
         'SolarProduction'])
     :param solar_panel_power_kw: float max power of solar panels built [KW]
     :param params: namedtuple simulation params
-    :return: ProductionDf total production of solar panels pd.DataFrame(columns=['HourOfYear', 'SolarProduction'])
+    :return: ProductionDf scaled view (see ProductionDf.scaled) of the total production of solar panels
+        pd.DataFrame(columns=['HourOfYear', 'SolarProduction'])
     """
-    total_production = copy.deepcopy(normalised_production)
-    average_effective_size = (1 + (1 - params.PV_DEGRADATION) ** params.FACILITY_LIFE_SPAN) / 2
-    total_production.df[
-        total_production.SolarProduction] *= average_effective_size * solar_panel_power_kw  # production in Kw
-    return total_production
+    return normalised_production.scaled(get_average_effective_size(params) * solar_panel_power_kw)  # production in Kw
 
 
+def get_average_effective_size(params: Params) -> float:
+    """
+    Get the average effective size of the solar panels over the facility life span due to the PV degradation.
+
+    :param params: namedtuple simulation params
+    :return: float ratio of the average production to the production of new panels
+    """
+    return (1 + (1 - params.PV_DEGRADATION) ** params.FACILITY_LIFE_SPAN) / 2
+
+
+@timing.timed(timing.COST)
 def calculate_cost(electricity_use: ElectricityUseDf, params: Params, battery_capacity: float,
-                   solar_panel_power_kw: float,
+                   solar_panel_power_kw: float, demand_year: int,
                    return_description=False):  # -> Optional[float, Tuple[float, Tuple[Any]]]:
     """
-    Calculates the cost of  electricity_use
+    Calculates the cost of  electricity_use (see CostEvaluator)
 
     :param params: namedtuple simulation params
     :param solar_panel_power_kw: int power of panel Kwh
     :param battery_capacity: float capacity of batteries in Kwh
-    :param electricity_use: pd.DataFrame(columns=['HourOfYear', 'GasUsage', 'SolarUsage', 'StoredUsage', 'SolarStored',
-        'SolarLost'])
-    :return: float cost of the given electricity usage
-    """
-    # find relevant hours
-    hours_paid_in_year = ELECTRICITY_COST.df[ELECTRICITY_COST.HourOfYear] == electricity_use.df[
-        electricity_use.HourOfYear]
-    # extract gas buying price per hour
-    gas_cost_per_hour = ELECTRICITY_COST.df.loc[hours_paid_in_year, ELECTRICITY_COST.Cost]
-    # extract gas selling price cost per hour
-    selling_income_per_hour = ELECTRICITY_SELLING_INCOME.df.loc[hours_paid_in_year, ELECTRICITY_COST.Cost]
-    # calculate gas usage price
-    gas_usage_cost = electricity_use.df[electricity_use.GasUsage].to_numpy().dot(gas_cost_per_hour.to_numpy())
-    # calculate gas stored price
-    gas_stored_cost = electricity_use.df[electricity_use.GasStored].to_numpy().dot(gas_cost_per_hour.to_numpy())
-    total_gas_cost = gas_usage_cost + gas_stored_cost / params.BATTERY_EFFICIENCY
-    # calculate solar selling income
-    immediate_selling_income = electricity_use.df[electricity_use.SolarSold].to_numpy().dot(
-        selling_income_per_hour.to_numpy())
-    # calculate stored selling income
-    battery_selling_income = electricity_use.df[electricity_use.StoredSold].to_numpy().dot(
-        selling_income_per_hour.to_numpy())
-    total_selling_income = immediate_selling_income + battery_selling_income
-    # calculate PV opex and capex
-    total_solar_opex = solar_panel_power_kw * params.PV_OPEX
-    total_solar_capex = solar_panel_power_kw * params.PV_CAPEX / params.FACILITY_LIFE_SPAN
-    # calculate batteries opex and capex
-    total_battery_opex = battery_capacity * params.BATTERY_OPEX
-    total_battery_capex = battery_capacity * params.BATTERY_CAPEX / params.FACILITY_LIFE_SPAN
-    # sum opex and capex
-    total_init_capex = total_battery_capex + total_solar_capex
-    total_opex = total_solar_opex + total_battery_opex
-    # battery_replacement_cost
-    future_battery_capex = params.BATTERY_ADDED_FOR_REPLACEMENT * battery_capacity * params.BATTERY_FUTURE_CAPEX / params.FACILITY_LIFE_SPAN
-    # capital expenses due to loans
-    total_loan = total_init_capex * params.FACILITY_LIFE_SPAN * params.LOAN_SIZE
-    capital_expenses = (-1 * npf.pmt(rate=params.LOAN_INTEREST_RATE, nper=params.LOAN_LENGTH,
-                                     pv=total_loan) * params.LOAN_LENGTH - total_loan) / params.FACILITY_LIFE_SPAN
-    # entrepreneur profit
-    total_equity = total_init_capex * params.FACILITY_LIFE_SPAN * (1 - params.LOAN_SIZE)
-    entrepreneur_profit = (-1 * npf.pmt(rate=params.ENTREPRENEUR_PROFIT, nper=params.FACILITY_LIFE_SPAN,
-                                        pv=total_equity) * params.FACILITY_LIFE_SPAN - total_equity) / params.FACILITY_LIFE_SPAN
-    # sum the cost
-    total_cost = total_gas_cost + total_init_capex + total_opex + future_battery_capex - total_selling_income + \
-                 capital_expenses + entrepreneur_profit
-    if return_description:
-        return total_cost, ((total_cost, total_gas_cost, total_solar_capex, total_battery_capex,
-                             future_battery_capex, total_solar_opex, total_battery_opex,
-                             capital_expenses, entrepreneur_profit, total_selling_income,))
-    return total_cost
+    :param electricity_use: ElectricityUseDf of the rows ['HourOfYear', 'GasUsage', 'GasStored', 'SolarUsage',
+        'StoredUsage', 'SolarStored', 'SolarLost', 'SolarSold' , 'StoredSold']
+    :param demand_year: int year of the demand that was simulated, the tariffs are aligned to it (see TariffCalendar)
+    :return: float cost of the given electricity usage, and its description if return_description
+    """
+    return get_cost_evaluator(params, demand_year).evaluate(electricity_use.values, battery_capacity,
+                                                            solar_panel_power_kw, return_description)
+
+
+@timing.timed(timing.COST)
+def calculate_cost_batch(electricity_use: np.ndarray, params: Params, battery_capacity: np.ndarray,
+                         solar_panel_power_kw: np.ndarray, demand_year: int) -> np.ndarray:
+    """
+    Calculates the cost of the electricity use of many scenarios at once (see CostEvaluator)
+
+    :param electricity_use: np.ndarray(scenarios, len(ElectricityUseDf.COLUMNS), hours) electricity use of every
+        scenario
+    :param params: namedtuple simulation params
+    :param battery_capacity: np.ndarray(scenarios) capacity of batteries in Kwh
+    :param solar_panel_power_kw: np.ndarray(scenarios) power of panel Kwh
+    :param demand_year: int year of the demand that was simulated, the tariffs are aligned to it (see TariffCalendar)
+    :return: np.ndarray(scenarios) cost of the given electricity usage of every scenario
+    """
+    return get_cost_evaluator(params, demand_year).evaluate(electricity_use, battery_capacity, solar_panel_power_kw)
 
 
 def get_usage_profile(demand: DemandDf, normalised_production: ProductionDf, params: Params,
                       solar_panel_power_kw: float,
                       num_batteries: float, strategy: Callable, simulated_year: int):
     """
-    Simulate Usage Profile
+    Simulate Usage Profile, memoised by the usage cache (see usage_cache.get_key) so the same scenario is only
+    simulated once (for example the yearly graph and the cost of the annual page)
+
     :param demand: DemandDf of pd.DataFrame(columns=['HourOfYear', '$(Year)'])
     :param normalised_production: ProductionDf of pd.DataFrame(columns=['HourOfYear', 'SolarProduction'])
         between 0 and 1
@@ -102,15 +90,31 @@ def get_usage_profile(demand: DemandDf, normalised_production: ProductionDf, par
     :param num_batteries: float number of batteries
     :param strategy: function responsible for handling the cost
     :return: ElectricityUseDf pd.DataFrame(columns=['HourOfYear', 'GasUsage', 'GasStored', 'SolarUsage', 'StoredUsage',
-                'SolarStored', 'SolarLost', 'SolarSold' , 'StoredSold'])
+                'SolarStored', 'SolarLost', 'SolarSold' , 'StoredSold']), a new copy free to overwrite
+    """
+    key = usage_cache.get_key(demand=demand, normalised_production=normalised_production, params=params,
+                              solar_panel_power_kw=solar_panel_power_kw, num_batteries=num_batteries,
+                              strategy=strategy, simulated_year=simulated_year)
+    return usage_cache.get_electricity_use(key, lambda: __simulate_usage_profile(
+        demand=demand, normalised_production=normalised_production, params=params,
+        solar_panel_power_kw=solar_panel_power_kw, num_batteries=num_batteries, strategy=strategy,
+        simulated_year=simulated_year))
+
+
+def __simulate_usage_profile(demand: DemandDf, normalised_production: ProductionDf, params: Params,
+                             solar_panel_power_kw: float, num_batteries: float, strategy: Callable,
+                             simulated_year: int) -> ElectricityUseDf:
+    """
+    Simulate Usage Profile without the usage cache (see get_usage_profile)
     """
     future_demand = predict_demand_in_year(hourly_demand=demand, params=params,
                                            simulated_year=simulated_year)
     total_panel_production: ProductionDf = get_solar_production_profile(normalised_production=normalised_production,
                                                                         solar_panel_power_kw=solar_panel_power_kw,
                                                                         params=params)
-    electricity_use: ElectricityUseDf = strategy(future_demand, total_panel_production,
-                                                 params, num_batteries, future_demand.YearOfDemand)
+    with timing.stage(timing.STRATEGY):
+        electricity_use: ElectricityUseDf = strategy(future_demand, total_panel_production,
+                                                     params, num_batteries, future_demand.YearOfDemand)
     return electricity_use
 
 
@@ -136,4 +140,101 @@ def simulate_use(demand: DemandDf, normalised_production: ProductionDf, params:
     return calculate_cost(electricity_use=electricity_use,
                           params=params,
                           battery_capacity=params.BATTERY_CAPACITY * num_batteries,
-                          solar_panel_power_kw=solar_panel_power_kw)
+                          solar_panel_power_kw=solar_panel_power_kw,
+                          demand_year=demand.YearOfDemand)
+
+
+def get_usage_profile_batch(demand: DemandDf, normalised_production: ProductionDf, params: Params,
+                            solar_panel_power_kw: np.ndarray, num_batteries: np.ndarray, strategy: Callable,
+                            simulated_year: int) -> np.ndarray:
+    """
+    Simulate Usage Profile of many (solar panels, batteries) scenarios at once, using the batched implementation of the
+    strategy if it has one (see batch_strategies)
+
+    :param demand: DemandDf of pd.DataFrame(columns=['HourOfYear', '$(Year)'])
+    :param normalised_production: ProductionDf of pd.DataFrame(columns=['HourOfYear', 'SolarProduction'])
+        between 0 and 1
+    :param params: namedtuple simulation params
+    :param solar_panel_power_kw: np.ndarray(scenarios) power of solar panels Kwh
+    :param num_batteries: np.ndarray(scenarios) number of batteries
+    :param strategy: function responsible for handling the cost
+    :param simulated_year: year to simulate
+    :return: np.ndarray(scenarios, len(ElectricityUseDf.COLUMNS), hours) electricity use of every scenario, checked by
+        invariants.check_batch
+    """
+    solar_panel_power_kw = np.asarray(solar_panel_power_kw, dtype=np.float64)
+    num_batteries = np.asarray(num_batteries, dtype=np.float64)
+    future_demand = predict_demand_in_year(hourly_demand=demand, params=params, simulated_year=simulated_year)
+    normalised = normalised_production.get_values()
+    total_panel_production = normalised[np.newaxis, :] * (get_average_effective_size(params) *
+                                                          solar_panel_power_kw)[:, np.newaxis]
+    if strategy in batch_strategies:
+        with timing.stage(timing.STRATEGY):
+            electricity_use = batch_strategies[strategy](future_demand, total_panel_production, params,
+                                                         num_batteries, future_demand.YearOfDemand)
+    else:
+        # strategies without a batched implementation are simulated one scenario at a time, past the usage cache so
+        # the searches do not evict the scenarios of the pages
+        electricity_use = np.empty((len(solar_panel_power_kw), NUM_COLUMNS, len(normalised)))
+        for scenario, (power, batteries) in enumerate(zip(solar_panel_power_kw, num_batteries)):
+            electricity_use[scenario] = __simulate_usage_profile(demand=demand,
+                                                                 normalised_production=normalised_production,
+                                                                 params=params, solar_panel_power_kw=power,
+                                                                 num_batteries=batteries, strategy=strategy,
+                                                                 simulated_year=simulated_year).values
+    invariants.check_batch(electricity_use, future_demand.get_values(), total_panel_production, params,
+                           num_batteries)
+    return electricity_use
+
+
+def simulate_use_batch(demand: DemandDf, normalised_production: ProductionDf, params: Params,
+                       solar_panel_power_kw: np.ndarray, num_batteries: np.ndarray, strategy: Callable,
+                       simulated_year: int) -> np.ndarray:
+    """
+    simulate the usages of many (solar panels, batteries) scenarios at once.
+
+    :param demand: DemandDf of pd.DataFrame(columns=['HourOfYear', '$(Year)'])
+    :param normalised_production: ProductionDf of pd.DataFrame(columns=['HourOfYear', 'SolarProduction'])
+        between 0 and 1
+    :param params: namedtuple simulation params
+    :param solar_panel_power_kw: np.ndarray(scenarios) power of solar panels Kwh
+    :param num_batteries: np.ndarray(scenarios) number of batteries
+    :param strategy: function responsible for handling the cost
+    :param simulated_year: year to simulate
+    :return: np.ndarray(scenarios) total_cost of every scenario
+    """
+    electricity_use = get_usage_profile_batch(demand=demand, normalised_production=normalised_production,
+                                              params=params, solar_panel_power_kw=solar_panel_power_kw,
+                                              num_batteries=num_batteries, strategy=strategy,
+                                              simulated_year=simulated_year)
+    return calculate_cost_batch(electricity_use=electricity_use,
+                                params=params,
+                                battery_capacity=params.BATTERY_CAPACITY * np.asarray(num_batteries, dtype=np.float64),
+                                solar_panel_power_kw=solar_panel_power_kw,
+                                demand_year=demand.YearOfDemand)
+
+
+def simulate_electricity_cost_batch(demand: DemandDf, normalised_production: ProductionDf, params: Params,
+                                    solar_panel_power_kw: np.ndarray, num_batteries: np.ndarray, strategy: Callable,
+                                    simulated_year: int) -> np.ndarray:
+    """
+    simulate the usages of many (solar panels, batteries) scenarios at once, and price only their electricity: the
+    parts of the cost that depend on the simulated use, and not on the facility costs of simulate_use_batch.
+
+    :param demand: DemandDf of pd.DataFrame(columns=['HourOfYear', '$(Year)'])
+    :param normalised_production: ProductionDf of pd.DataFrame(columns=['HourOfYear', 'SolarProduction'])
+        between 0 and 1
+    :param params: namedtuple simulation params
+    :param solar_panel_power_kw: np.ndarray(scenarios) power of solar panels Kwh
+    :param num_batteries: np.ndarray(scenarios) number of batteries
+    :param strategy: function responsible for handling the cost
+    :param simulated_year: year to simulate
+    :return: np.ndarray(scenarios) cost of the electricity bought minus the income of the electricity sold
+    """
+    electricity_use = get_usage_profile_batch(demand=demand, normalised_production=normalised_production,
+                                              params=params, solar_panel_power_kw=solar_panel_power_kw,
+                                              num_batteries=num_batteries, strategy=strategy,
+                                              simulated_year=simulated_year)
+    with timing.stage(timing.COST):
+        electricity_costs = get_cost_evaluator(params, demand.YearOfDemand).electricity_costs(electricity_use)
+    return electricity_costs[:, ELECTRICITY_BOUGHT] - electricity_costs[:, ELECTRICITY_SOLD]
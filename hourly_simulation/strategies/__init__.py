@@ -1,7 +1,15 @@
-from hourly_simulation.strategies.greedy_strategy import greedy_use_strategy
-from hourly_simulation.strategies.selling_strategy import first_selling_strategy
+from hourly_simulation.strategies.greedy_strategy import greedy_use_strategy, greedy_use_strategy_batch
+from hourly_simulation.strategies.selling_strategy import first_selling_strategy, first_selling_strategy_batch
 from hourly_simulation.strategies.smart_storing import smart_storing_strategy
+from hourly_simulation.strategies.optimal_dispatch import optimal_dispatch_strategy
+from hourly_simulation.strategies.dp_dispatch import dp_dispatch_strategy
 
 use_strategies = {"Greedy Strategy": greedy_strategy.greedy_use_strategy,
-                  # "Smart Storing Strategy": smart_storing.smart_storing_strategy,
-                  "Selling Strategy": selling_strategy.first_selling_strategy}
+                  "Smart Storing Strategy": smart_storing.smart_storing_strategy,
+                  "Selling Strategy": selling_strategy.first_selling_strategy,
+                  "Optimal Dispatch Strategy": optimal_dispatch.optimal_dispatch_strategy,
+                  "DP Dispatch Strategy": dp_dispatch.dp_dispatch_strategy}
+
+# strategies that can simulate many (solar panels, batteries) scenarios at once
+batch_strategies = {greedy_strategy.greedy_use_strategy: greedy_strategy.greedy_use_strategy_batch,
+                    selling_strategy.first_selling_strategy: selling_strategy.first_selling_strategy_batch}
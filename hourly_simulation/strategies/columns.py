@@ -0,0 +1,13 @@
+from df_objects.df_objects import ElectricityUseDf
+
+# rows of the electricity use matrix (a row per ElectricityUseDf column), ordered as ElectricityUseDf.COLUMNS
+HOUR_OF_YEAR = ElectricityUseDf.COLUMNS.index(ElectricityUseDf.HourOfYear)
+GAS_USAGE = ElectricityUseDf.COLUMNS.index(ElectricityUseDf.GasUsage)
+GAS_STORED = ElectricityUseDf.COLUMNS.index(ElectricityUseDf.GasStored)
+SOLAR_USAGE = ElectricityUseDf.COLUMNS.index(ElectricityUseDf.SolarUsage)
+STORED_USAGE = ElectricityUseDf.COLUMNS.index(ElectricityUseDf.StoredUsage)
+SOLAR_STORED = ElectricityUseDf.COLUMNS.index(ElectricityUseDf.SolarStored)
+SOLAR_LOST = ElectricityUseDf.COLUMNS.index(ElectricityUseDf.SolarLost)
+SOLAR_SOLD = ElectricityUseDf.COLUMNS.index(ElectricityUseDf.SolarSold)
+STORED_SOLD = ElectricityUseDf.COLUMNS.index(ElectricityUseDf.StoredSold)
+NUM_COLUMNS = len(ElectricityUseDf.COLUMNS)
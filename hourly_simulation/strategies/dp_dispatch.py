@@ -0,0 +1,168 @@
+from typing import Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from df_objects.df_objects import DemandDf, ProductionDf, ElectricityUseDf
+from hourly_simulation.parameters import Params
+from hourly_simulation.strategies.columns import GAS_USAGE, GAS_STORED, SOLAR_USAGE, STORED_USAGE, SOLAR_STORED, \
+    SOLAR_LOST, SOLAR_SOLD, STORED_SOLD, NUM_COLUMNS, HOUR_OF_YEAR
+from hourly_simulation.tariff_calendar import TariffCalendar, get_tariff_calendar
+
+# number of levels of the state of charge grid (empty to full batteries), more levels are closer to the optimum and
+# slower (the time of an hour grows with levels * levels * power / capacity)
+SOC_LEVELS = 101
+# hours optimised together, None optimises the whole simulation at once. With rolling windows the dispatch of the first
+# COMMIT_HOURS is kept and the next window starts from its state of charge, bounding the memory of the policy to
+# window hours * SOC_LEVELS
+WINDOW_HOURS = None
+COMMIT_HOURS = 24
+# cost per Kwh moved in or out of the batteries, breaks the ties towards not cycling the batteries
+CYCLING_COST = 1e-6
+
+
+def dp_dispatch_strategy(demand: DemandDf, production: ProductionDf, params: Params, num_batteries: float,
+                         predict_demand_in_year: int, tariff: Optional[TariffCalendar] = None,
+                         soc_levels: int = SOC_LEVELS,
+                         window_hours: Optional[int] = WINDOW_HOURS,
+                         commit_hours: int = COMMIT_HOURS) -> ElectricityUseDf:
+    """
+    This is the implementation of the dynamic programming dispatch strategy - the change of the state of charge of the
+    batteries in every hour is chosen by backward induction over a grid of states of charge, minimizing the electricity
+    cost of the prices of calculate_cost. Given the change of an hour, the solar production is used for the demand
+    first, charges from the solar surplus before buying, discharges to the demand before selling and sells the rest
+    of the surplus up to the selling limit.
+    The whole grid is evaluated together every hour: the cost of an hour only depends on the change of the state of
+    charge, so the costs of all hours and changes are one broadcast table and every hour is a minimum over a sliding
+    window of the values of the next hour.
+
+    :param demand: DemandDf: pd.DataFrame(columns=['HourOfYear', 'Demand'])
+    :param production: ProductionDf: pd.DataFrame(columns=['HourOfYear', 'SolarProduction'])
+    :param params: named tuple of parameters from parameters.csv
+    :param num_batteries: float number of batteries to simulate
+    :param predict_demand_in_year: int year of the demand
+    :param tariff: TariffCalendar buying and selling prices of every hour, the calendar of predict_demand_in_year if
+        None
+    :param soc_levels: int number of levels of the state of charge grid, raised when a step of the grid is more than
+        the power of the batteries in an hour
+    :param window_hours: int hours optimised together, None for the whole simulation
+    :param commit_hours: int hours kept of every window (ignored without windows)
+    :return: ElectricityUseDf pd.DataFrame(columns=['HourOfYear', 'GasUsage', 'GasStored', 'SolarUsage', 'StoredUsage',
+                'SolarStored', 'SolarLost', 'SolarSold' , 'StoredSold'])
+    """
+    if tariff is None:
+        tariff = get_tariff_calendar(predict_demand_in_year)
+    demand_values = demand.get_values()
+    production = production.get_values()
+    buy_price, sell_price = tariff.buy_price, tariff.sell_price
+    if not len(demand_values) == len(production) == len(buy_price):
+        raise ValueError("The demand, production and prices should have the same hours")
+    if soc_levels < 2:
+        raise ValueError("The state of charge grid should have at least 2 levels")
+    battery_capacity = num_batteries * params.BATTERY_CAPACITY * params.BATTERY_EFFECTIVE_SIZE
+    battery_power = num_batteries * params.CHARGE_POWER
+    len_simulation = len(demand_values)
+    if window_hours is None:
+        window_hours = commit_hours = len_simulation
+    if not 0 < commit_hours <= window_hours:
+        raise ValueError("The committed hours should be positive and at most the window hours")
+
+    if battery_capacity > 0 and battery_power > 0:
+        # at least one step of the grid fits in the power of an hour, a coarser grid could never use the batteries
+        soc_levels = max(soc_levels, int(np.ceil(battery_capacity / battery_power - 1e-9)) + 1)
+        soc_step = battery_capacity / (soc_levels - 1)
+        max_steps = min(int(np.floor(battery_power / soc_step + 1e-9)), soc_levels - 1)  # steps of an hour
+    else:
+        soc_step, max_steps, soc_levels = 0.0, 0, 1
+    # the change of the state of charge of the columns of the cost table
+    steps = np.arange(-max_steps, max_steps + 1)
+
+    level = 0
+    soc_change = np.zeros(len_simulation)
+    for start in range(0, len_simulation, commit_hours):
+        window = slice(start, min(start + window_hours, len_simulation))
+        cost_table = __hour_costs(steps * soc_step, demand_values[window, np.newaxis],
+                                  production[window, np.newaxis], buy_price[window, np.newaxis],
+                                  sell_price[window, np.newaxis], float(params.MAX_SELLING_POWER),
+                                  float(params.BATTERY_EFFICIENCY))
+        policy = __backward_induction(cost_table, soc_levels, max_steps)
+        for hour in range(min(commit_hours, window.stop - start)):
+            step = policy[hour, level]
+            soc_change[start + hour] = step * soc_step
+            level += step
+
+    flows = __hour_flows(soc_change, demand_values, production, float(params.MAX_SELLING_POWER),
+                         float(params.BATTERY_EFFICIENCY))
+    hourly_use = np.zeros((NUM_COLUMNS, len_simulation))
+    for row, flow in zip((SOLAR_USAGE, SOLAR_STORED, GAS_STORED, STORED_USAGE, STORED_SOLD, GAS_USAGE, SOLAR_SOLD,
+                          SOLAR_LOST), flows):
+        hourly_use[row] = flow
+    hourly_use[HOUR_OF_YEAR] = demand.get_hour_of_year().to_numpy(dtype=np.float64)
+    return ElectricityUseDf(hourly_use)
+
+
+def __backward_induction(cost_table: np.ndarray, soc_levels: int, max_steps: int) -> np.ndarray:
+    """
+    Optimal change of the state of charge from every level of every hour, the value after the last hour is zero
+
+    :param cost_table: np.ndarray(hours, 2 * max_steps + 1) cost of every hour for every change of the state of charge
+        (-max_steps to max_steps levels), np.inf when not possible
+    :param soc_levels: int number of levels of the state of charge grid, raised when a step of the grid is more than
+        the power of the batteries in an hour
+    :param max_steps: int maximal change of levels in an hour
+    :return: np.ndarray(hours, soc_levels) of the change of levels of every hour and level
+    """
+    policy = np.empty((len(cost_table), soc_levels), dtype=np.int32)
+    padded_value = np.full(soc_levels + 2 * max_steps, np.inf)
+    padded_value[max_steps: max_steps + soc_levels] = 0.0
+    # windows[level, step] is the value of the next hour at level + step - max_steps
+    windows = sliding_window_view(padded_value, 2 * max_steps + 1)
+    for hour in range(len(cost_table) - 1, -1, -1):
+        total = windows + cost_table[hour]
+        best = np.argmin(total, axis=1)
+        policy[hour] = best - max_steps
+        padded_value[max_steps: max_steps + soc_levels] = total[np.arange(soc_levels), best]
+    return policy
+
+
+def __hour_costs(soc_change: np.ndarray, demand, production, buy_price, sell_price, max_selling_power: float,
+                 efficiency: float) -> np.ndarray:
+    """
+    Electricity cost of the hours for the changes of the state of charge, broadcast between them
+
+    :param soc_change: np array of the changes of the state of charge in Kwh (positive for charging)
+    :return: np array of the cost of every hour and change, np.inf for the changes that pass the selling limit
+    """
+    _, _, gas_stored, _, stored_sold, gas_usage, solar_sold, _ = __hour_flows(soc_change, demand, production,
+                                                                               max_selling_power, efficiency)
+    cost = buy_price * (gas_usage + gas_stored / efficiency) - sell_price * (solar_sold + stored_sold) + \
+        CYCLING_COST * np.abs(soc_change)
+    return np.where(stored_sold > max_selling_power, np.inf, cost)
+
+
+def __hour_flows(soc_change: np.ndarray, demand, production, max_selling_power: float, efficiency: float):
+    """
+    Electricity use of the hours for the changes of the state of charge, broadcast between them
+
+    :param soc_change: np array of the changes of the state of charge in Kwh (positive for charging)
+    :param demand: np array of the demand
+    :param production: np array of the solar production
+    :param max_selling_power: float maximum power to sell
+    :param efficiency: float ratio of (Kwh available to discharge / Kwh charged)
+    :return: Tuple of np arrays: 'SolarUsage', 'SolarStored', 'GasStored', 'StoredUsage', 'StoredSold', 'GasUsage',
+        'SolarSold', 'SolarLost'
+    """
+    charged = np.maximum(soc_change, 0)
+    discharged = np.maximum(-soc_change, 0)
+    solar_usage = np.minimum(production, demand)
+    needed_power = demand - solar_usage
+    surplus = production - solar_usage
+    solar_stored = np.minimum(charged, surplus * efficiency)
+    gas_stored = charged - solar_stored
+    stored_usage = np.minimum(discharged, needed_power)
+    stored_sold = discharged - stored_usage
+    gas_usage = needed_power - stored_usage
+    solar_sold = np.clip(np.minimum(surplus - solar_stored / efficiency, max_selling_power - stored_sold), 0, None)
+    # the surplus that was not sold or stored, including the losses of storing it
+    solar_lost = np.maximum(surplus - solar_stored - solar_sold, 0)
+    return solar_usage, solar_stored, gas_stored, stored_usage, stored_sold, gas_usage, solar_sold, solar_lost
@@ -1,11 +1,10 @@
-import copy
-
 import numpy as np
-import pandas as pd
 
 from df_objects.df_objects import DemandDf, ProductionDf, ElectricityUseDf
+from hourly_simulation.jit import jit
 from hourly_simulation.parameters import Params
-from hourly_simulation.shift_day_in_year import shift_day_of_year
+from hourly_simulation.strategies.columns import GAS_USAGE, SOLAR_USAGE, STORED_USAGE, SOLAR_STORED, SOLAR_LOST, \
+    NUM_COLUMNS, HOUR_OF_YEAR
 
 
 def greedy_use_strategy(demand: DemandDf, production: ProductionDf, params: Params,
@@ -19,32 +18,21 @@ def greedy_use_strategy(demand: DemandDf, production: ProductionDf, params: Para
     :param production: ProductionDf: pd.DataFrame(columns=['HourOfYear', 'SolarProduction'])
     :param num_batteries: float number of batteries to simulate
     :param params: named tuple of parameters from parameters.csv
+    :param predict_demand_in_year: int year of the demand (not used, the strategy does not depend on the tariffs)
     :return: ElectricityUseDf pd.DataFrame(columns=['HourOfYear', 'GasUsage', 'GasStored', 'SolarUsage', 'StoredUsage',
                 'SolarStored', 'SolarLost', 'SolarSold' , 'StoredSold'])
     """
-    demand_shifted = shift_day_of_year(copy.deepcopy(demand.df[demand.Demand].to_numpy()),
-                                       predict_demand_in_year)  # shift demand to start on sunday
-    gas_usage_arr, solar_usage_arr, stored_usage_arr, solar_stored_arr, solar_lost_arr = __greedy_use_loop(
-        num_batteries * params.BATTERY_CAPACITY * params.BATTERY_EFFECTIVE_SIZE,
-        num_batteries * params.CHARGE_POWER,
-        params.BATTERY_EFFICIENCY,
-        demand_shifted,
-        production.df[production.SolarProduction].to_numpy())
-
-    hourly_use = ElectricityUseDf(pd.DataFrame())
-    hourly_use.df[hourly_use.GasUsage] = gas_usage_arr
-    hourly_use.df[hourly_use.SolarUsage] = solar_usage_arr
-    hourly_use.df[hourly_use.StoredUsage] = stored_usage_arr
-    hourly_use.df[hourly_use.SolarStored] = solar_stored_arr
-    hourly_use.df[hourly_use.SolarLost] = solar_lost_arr
-    hourly_use.df[hourly_use.HourOfYear] = demand.df[ElectricityUseDf.HourOfYear]
+    hourly_use = __greedy_use_loop(num_batteries * params.BATTERY_CAPACITY * params.BATTERY_EFFECTIVE_SIZE,
+                                   num_batteries * params.CHARGE_POWER,
+                                   params.BATTERY_EFFICIENCY,
+                                   demand.get_values(),
+                                   production.get_values())
     # no selling in this strategy
-    hourly_use.df[ElectricityUseDf.SolarSold] = 0
-    hourly_use.df[ElectricityUseDf.StoredSold] = 0
-    hourly_use.df[ElectricityUseDf.GasStored] = 0
-    return hourly_use
+    hourly_use[HOUR_OF_YEAR] = demand.get_hour_of_year().to_numpy(dtype=np.float64)
+    return ElectricityUseDf(hourly_use)
 
 
+@jit
 def __greedy_use_loop(battery_capacity_kwh: float, battery_power_kw: float, battery_efficiency: float, demand,
                       production):
     """
@@ -55,31 +43,82 @@ def __greedy_use_loop(battery_capacity_kwh: float, battery_power_kw: float, batt
     :param battery_efficiency: float ratio of (Kwh available to discharge / Kwh charged)
     :param demand: np array of DemandDf.df['Demand']
     :param production: np array of ProductionDf.df['SolarProduction']
-    :return: Tuple of Five np.Array for each relevant colum in ElectricityUseDf: 'GasUsage', 'SolarUsage',
-            'StoredUsage', 'SolarStored', 'SolarLost',
+    :return: np array (len(ElectricityUseDf.COLUMNS), hours) with the relevant rows filled: 'GasUsage', 'SolarUsage',
+            'StoredUsage', 'SolarStored', 'SolarLost'
     """
-    storage: float = 0
+    storage: float = 0.0
     # define useful structures
     len_simulation = len(demand)
-    gas_usage_arr = np.zeros(len_simulation)
-    solar_usage_arr = np.zeros(len_simulation)
-    stored_usage_arr = np.zeros(len_simulation)
-    solar_stored_arr = np.zeros(len_simulation)
-    solar_lost_arr = np.zeros(len_simulation)
+    hourly_use = np.zeros((NUM_COLUMNS, len_simulation))
     for i in range(len_simulation):
         needed_power = demand[i]
         solar_used = min(production[i], needed_power)
-        solar_usage_arr[i] = solar_used
+        hourly_use[SOLAR_USAGE, i] = solar_used
         needed_power -= solar_used
         solar_stored = min(production[i] - solar_used, battery_capacity_kwh - storage,
                            battery_power_kw) * battery_efficiency
-        solar_stored_arr[i] = solar_stored
+        hourly_use[SOLAR_STORED, i] = solar_stored
         storage += solar_stored
         solar_lost = production[i] - solar_used - solar_stored
-        solar_lost_arr[i] = solar_lost
+        hourly_use[SOLAR_LOST, i] = solar_lost
         stored_used = min(min(storage, needed_power), battery_power_kw)
-        stored_usage_arr[i] = stored_used
+        hourly_use[STORED_USAGE, i] = stored_used
         storage -= stored_used
         needed_power -= stored_used
-        gas_usage_arr[i] = needed_power
-    return gas_usage_arr, solar_usage_arr, stored_usage_arr, solar_stored_arr, solar_lost_arr
+        hourly_use[GAS_USAGE, i] = needed_power
+    return hourly_use
+
+
+def greedy_use_strategy_batch(demand: DemandDf, production: np.ndarray, params: Params,
+                              num_batteries: np.ndarray, predict_demand_in_year: int) -> np.ndarray:
+    """
+    greedy_use_strategy of many (solar panels, batteries) scenarios at once, the batteries of all the scenarios are
+    advanced together hour by hour.
+
+    :param demand: DemandDf: pd.DataFrame(columns=['HourOfYear', 'Demand'])
+    :param production: np.ndarray(scenarios, hours) the solar production of every scenario
+    :param params: named tuple of parameters from parameters.csv
+    :param num_batteries: np.ndarray(scenarios) number of batteries of every scenario
+    :return: np.ndarray(scenarios, len(ElectricityUseDf.COLUMNS), hours) the electricity use of every scenario
+    """
+    num_batteries = np.asarray(num_batteries, dtype=np.float64)
+    production = np.array(production, dtype=np.float64).T.copy()  # hours major
+    hourly_use = __greedy_use_loop_batch(num_batteries * params.BATTERY_CAPACITY * params.BATTERY_EFFECTIVE_SIZE,
+                                         num_batteries * params.CHARGE_POWER,
+                                         params.BATTERY_EFFICIENCY,
+                                         demand.get_values(),
+                                         production)
+    # no selling in this strategy
+    hourly_use[HOUR_OF_YEAR] = demand.get_hour_of_year().to_numpy(dtype=np.float64)[:, np.newaxis]
+    return np.ascontiguousarray(hourly_use.transpose(2, 0, 1))
+
+
+@jit
+def __greedy_use_loop_batch(battery_capacity_kwh, battery_power_kw, battery_efficiency: float, demand, production):
+    """
+    __greedy_use_loop of all the scenarios at once
+
+    :param battery_capacity_kwh: np array Battery Capacity of every scenario [Kwh]
+    :param battery_power_kw: np array battery max charging/discharging power limit of every scenario [Kw]
+    :param battery_efficiency: float ratio of (Kwh available to discharge / Kwh charged)
+    :param demand: np array of DemandDf.df['Demand']
+    :param production: np array (hours, scenarios) of the production of every scenario
+    :return: np array (len(ElectricityUseDf.COLUMNS), hours, scenarios) with the relevant rows filled: 'GasUsage',
+            'SolarUsage', 'StoredUsage', 'SolarStored', 'SolarLost'
+    """
+    hourly_use = np.zeros((NUM_COLUMNS, production.shape[0], production.shape[1]))
+    storage = np.zeros(production.shape[1])
+    for i in range(len(demand)):
+        solar_used = np.minimum(production[i], demand[i])
+        hourly_use[SOLAR_USAGE, i] = solar_used
+        needed_power = demand[i] - solar_used
+        solar_stored = np.minimum(np.minimum(production[i] - solar_used, battery_capacity_kwh - storage),
+                                  battery_power_kw) * battery_efficiency
+        hourly_use[SOLAR_STORED, i] = solar_stored
+        storage = storage + solar_stored
+        hourly_use[SOLAR_LOST, i] = production[i] - solar_used - solar_stored
+        stored_used = np.minimum(np.minimum(storage, needed_power), battery_power_kw)
+        hourly_use[STORED_USAGE, i] = stored_used
+        storage = storage - stored_used
+        hourly_use[GAS_USAGE, i] = needed_power - stored_used
+    return hourly_use
@@ -0,0 +1,194 @@
+import functools
+import logging
+from typing import Optional
+
+import numpy as np
+
+from df_objects.df_objects import DemandDf, ProductionDf, ElectricityUseDf
+from hourly_simulation.parameters import Params
+from hourly_simulation.strategies.columns import GAS_USAGE, GAS_STORED, SOLAR_USAGE, STORED_USAGE, SOLAR_STORED, \
+    SOLAR_LOST, SOLAR_SOLD, STORED_SOLD, NUM_COLUMNS, HOUR_OF_YEAR
+from hourly_simulation.tariff_calendar import TariffCalendar, get_tariff_calendar
+
+# hours optimised together, None solves the whole simulation in one sparse LP (exact, and faster than windows as HiGHS
+# has a fixed cost per solve). With rolling windows the dispatch of the first COMMIT_HOURS is kept and the next window
+# starts from its battery state, the rest of the window is a look-ahead so the batteries are not emptied at the end of
+# every window (72 hours reach the yearly optimum on the default profiles)
+WINDOW_HOURS = None
+COMMIT_HOURS = 24
+# cost per Kwh moved in or out of the batteries, breaks the ties of the LP towards not cycling the batteries
+CYCLING_COST = 1e-6
+
+# variables of every hour of a window, the LP vector is variable major: variable * hours + hour
+LP_SOLAR_USAGE = 0
+LP_SOLAR_STORED = 1  # Kwh entering the batteries, the production used is SolarStored / efficiency
+LP_SOLAR_SOLD = 2
+LP_GAS_STORED = 3  # Kwh entering the batteries, the electricity bought is GasStored / efficiency
+LP_STORED_USAGE = 4
+LP_STORED_SOLD = 5
+LP_GAS_USAGE = 6
+LP_STORAGE = 7  # Kwh in the batteries at the end of the hour
+NUM_LP_VARIABLES = 8
+
+
+def optimal_dispatch_strategy(demand: DemandDf, production: ProductionDf, params: Params, num_batteries: float,
+                              predict_demand_in_year: int, tariff: Optional[TariffCalendar] = None,
+                              window_hours: Optional[int] = WINDOW_HOURS,
+                              commit_hours: int = COMMIT_HOURS) -> ElectricityUseDf:
+    """
+    This is the implementation of the optimal dispatch strategy - the hourly use (buying, charging, discharging,
+    selling and curtailing) of the lowest electricity cost, found by a linear program under the constraints of
+    hourly_simulation/invariants.py: the demand is reached, the production is accounted for, the batteries capacity,
+    the charge power and the selling limit are not passed.
+    The LP is sparse and solved by HiGHS through scipy, for the whole year at once or in rolling windows of
+    window_hours keeping the first commit_hours of every window. The prices are the ones of calculate_cost, so the
+    dispatch is optimal for the simulated cost.
+
+    :param demand: DemandDf: pd.DataFrame(columns=['HourOfYear', 'Demand'])
+    :param production: ProductionDf: pd.DataFrame(columns=['HourOfYear', 'SolarProduction'])
+    :param params: named tuple of parameters from parameters.csv
+    :param num_batteries: float number of batteries to simulate
+    :param predict_demand_in_year: int year of the demand
+    :param tariff: TariffCalendar buying and selling prices of every hour, the calendar of predict_demand_in_year if
+        None
+    :param window_hours: int hours optimised together, None for the whole simulation
+    :param commit_hours: int hours kept of every window (ignored without windows)
+    :return: ElectricityUseDf pd.DataFrame(columns=['HourOfYear', 'GasUsage', 'GasStored', 'SolarUsage', 'StoredUsage',
+                'SolarStored', 'SolarLost', 'SolarSold' , 'StoredSold'])
+    """
+    if tariff is None:
+        tariff = get_tariff_calendar(predict_demand_in_year)
+    demand_values = demand.get_values()
+    production = production.get_values()
+    buy_price, sell_price = tariff.buy_price, tariff.sell_price
+    if not len(demand_values) == len(production) == len(buy_price):
+        raise ValueError("The demand, production and prices should have the same hours")
+    battery_capacity = num_batteries * params.BATTERY_CAPACITY * params.BATTERY_EFFECTIVE_SIZE
+    battery_power = num_batteries * params.CHARGE_POWER
+    efficiency = float(params.BATTERY_EFFICIENCY)
+
+    len_simulation = len(demand_values)
+    if window_hours is None:
+        window_hours = commit_hours = len_simulation
+    if not 0 < commit_hours <= window_hours:
+        raise ValueError("The committed hours should be positive and at most the window hours")
+    dispatch = np.zeros((NUM_LP_VARIABLES, len_simulation))
+    storage = 0.0
+    for start in range(0, len_simulation, commit_hours):
+        window = slice(start, min(start + window_hours, len_simulation))
+        window_dispatch = __solve_window(demand_values[window], production[window], buy_price[window],
+                                         sell_price[window], storage, battery_capacity, battery_power,
+                                         float(params.MAX_SELLING_POWER), efficiency)
+        committed = min(commit_hours, window.stop - start)
+        dispatch[:, start: start + committed] = window_dispatch[:, :committed]
+        storage = dispatch[LP_STORAGE, start + committed - 1]
+
+    hourly_use = __to_electricity_use(dispatch, production, battery_power)
+    hourly_use[HOUR_OF_YEAR] = demand.get_hour_of_year().to_numpy(dtype=np.float64)
+    return ElectricityUseDf(hourly_use)
+
+
+def __solve_window(demand, production, buy_price, sell_price, initial_storage: float, battery_capacity: float,
+                   battery_power: float, max_selling_power: float, efficiency: float) -> np.ndarray:
+    """
+    Cheapest dispatch of a window of hours
+
+    :return: np.ndarray(NUM_LP_VARIABLES, hours) the LP variables of every hour of the window
+    """
+    from scipy.optimize import linprog  # imported on use, scipy.optimize takes longer to import than the simulation
+    hours = len(demand)
+    a_eq, a_ub = __get_window_constraints(hours, efficiency)
+    cost = np.zeros((NUM_LP_VARIABLES, hours))
+    cost[LP_GAS_USAGE] = buy_price
+    cost[LP_GAS_STORED] = buy_price / efficiency + CYCLING_COST
+    cost[LP_SOLAR_SOLD] = -sell_price
+    cost[LP_STORED_SOLD] = -sell_price + CYCLING_COST
+    cost[LP_SOLAR_STORED] = CYCLING_COST
+    cost[LP_STORED_USAGE] = CYCLING_COST
+    # demand of every hour, then the storage balance of every hour starting from the initial storage
+    b_eq = np.concatenate([demand, np.zeros(hours)])
+    b_eq[hours] = initial_storage
+    # production, charging power, discharging power and selling limit of every hour
+    b_ub = np.concatenate([production, np.full(hours, battery_power), np.full(hours, battery_power),
+                           np.full(hours, max_selling_power)])
+    upper_bounds = np.full((NUM_LP_VARIABLES, hours), np.inf)
+    upper_bounds[LP_STORAGE] = battery_capacity
+    result = linprog(cost.ravel(), A_ub=a_ub, b_ub=b_ub, A_eq=a_eq, b_eq=b_eq,
+                     bounds=np.stack([np.zeros(upper_bounds.size), upper_bounds.ravel()], axis=1), method='highs')
+    if result.status != 0:
+        logging.error("optimal dispatch: " + result.message)
+        raise ValueError("Could not solve the optimal dispatch: " + result.message)
+    return np.maximum(result.x.reshape(NUM_LP_VARIABLES, hours), 0)
+
+
+@functools.lru_cache(maxsize=4)
+def __get_window_constraints(hours: int, efficiency: float):
+    """
+    Sparse constraint matrices of a window, the same for all the windows of the same length
+
+    :return: Tuple(A_eq, A_ub) of scipy.sparse.csr_matrix
+    """
+    import scipy.sparse as sp
+    identity = sp.identity(hours, format='csr')
+    zero = sp.csr_matrix((hours, hours))
+
+    def row(coefficients) -> 'sp.csr_matrix':
+        """
+        :param coefficients: dictionary(LP variable -> (hours, hours) coefficients of the variable)
+        :return: (hours, NUM_LP_VARIABLES * hours) constraints of the variables
+        """
+        return sp.hstack([coefficients.get(variable, zero) for variable in range(NUM_LP_VARIABLES)], format='csr')
+
+    # the storage of an hour minus the storage of the previous hour (the initial storage is in b_eq)
+    storage_change = identity - sp.eye(hours, k=-1, format='csr')
+    a_eq = sp.vstack([row({LP_SOLAR_USAGE: identity, LP_GAS_USAGE: identity, LP_STORED_USAGE: identity}),
+                      row({LP_STORAGE: storage_change, LP_SOLAR_STORED: -identity, LP_GAS_STORED: -identity,
+                           LP_STORED_USAGE: identity, LP_STORED_SOLD: identity})], format='csr')
+    a_ub = sp.vstack([row({LP_SOLAR_USAGE: identity, LP_SOLAR_STORED: identity / efficiency,
+                           LP_SOLAR_SOLD: identity}),
+                      row({LP_SOLAR_STORED: identity, LP_GAS_STORED: identity}),
+                      row({LP_STORED_USAGE: identity, LP_STORED_SOLD: identity}),
+                      row({LP_SOLAR_SOLD: identity, LP_STORED_SOLD: identity})], format='csr')
+    return a_eq, a_ub
+
+
+def __to_electricity_use(dispatch: np.ndarray, production: np.ndarray, battery_power: float) -> np.ndarray:
+    """
+    Rows of the electricity use of the dispatch. An LP may charge and discharge the batteries in the same hour
+    (e.g. buying to sell when the selling price is above the buying price), the overlap is netted so the batteries
+    are either charged or discharged in every hour, keeping the storage of every hour. The solver tolerance above the
+    charge power is cut, the missing discharge is bought.
+
+    :param dispatch: np.ndarray(NUM_LP_VARIABLES, hours) the LP variables of every hour (netted in place)
+    :param production: np array of the production of every hour
+    :param battery_power: float battery max charging/discharging power limit [Kw]
+    :return: np.ndarray(len(ElectricityUseDf.COLUMNS), hours) with all the rows but 'HourOfYear'
+    """
+    solar_usage, solar_stored, solar_sold, gas_stored, stored_usage, stored_sold, gas_usage, _ = dispatch
+    # (charged, discharged, gained) pairs: what was charged is not discharged, the use is taken from the gained row
+    for charged, discharged, gained in ((gas_stored, stored_sold, None), (solar_stored, stored_sold, solar_sold),
+                                        (solar_stored, stored_usage, solar_usage),
+                                        (gas_stored, stored_usage, gas_usage)):
+        overlap = np.minimum(charged, discharged)
+        charged -= overlap
+        discharged -= overlap
+        if gained is not None:
+            gained += overlap
+    for first, second, replaced_by in ((gas_stored, solar_stored, None), (stored_sold, stored_usage, gas_usage)):
+        excess = np.maximum(first + second - battery_power, 0)
+        cut = np.minimum(excess, first)
+        first -= cut
+        second -= excess - cut
+        if replaced_by is not None:
+            replaced_by += excess - cut
+    hourly_use = np.zeros((NUM_COLUMNS, dispatch.shape[1]))
+    hourly_use[GAS_USAGE] = gas_usage
+    hourly_use[GAS_STORED] = gas_stored
+    hourly_use[SOLAR_USAGE] = solar_usage
+    hourly_use[STORED_USAGE] = stored_usage
+    hourly_use[SOLAR_STORED] = solar_stored
+    hourly_use[SOLAR_SOLD] = solar_sold
+    hourly_use[STORED_SOLD] = stored_sold
+    # the production that was not used, sold or stored, including the losses of storing it
+    hourly_use[SOLAR_LOST] = np.maximum(production - solar_usage - solar_sold - solar_stored, 0)
+    return hourly_use
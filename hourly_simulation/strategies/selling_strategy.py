@@ -1,311 +1,382 @@
-import copy
 import typing
-from typing import Tuple
+from typing import Tuple, Optional
 
 import numpy as np
-import pandas as pd
 
-from df_objects.df_objects import DemandDf, ProductionDf, ElectricityUseDf, CostElectricityDf
-from hourly_simulation.parameters import Params, ELECTRICITY_COST, BINARY_SELLING_COST, ELECTRICITY_SELLING_INCOME
-from hourly_simulation.shift_day_in_year import shift_day_of_year
+from df_objects.df_objects import DemandDf, ProductionDf, ElectricityUseDf
+from hourly_simulation.jit import jit, JIT_ENABLED
+from hourly_simulation.parameters import Params
+from hourly_simulation.strategies.columns import GAS_USAGE, GAS_STORED, SOLAR_USAGE, STORED_USAGE, SOLAR_STORED, \
+    SOLAR_LOST, SOLAR_SOLD, STORED_SOLD, NUM_COLUMNS, HOUR_OF_YEAR
+from hourly_simulation.tariff_calendar import TariffCalendar, get_tariff_calendar, HOURS_IN_DAY
 
+# electricity is bought in the cheap hours before this hour, to be used or sold in the expansive hours
+THRESHOLD_HOUR = 20
 
-# todo: add documentation
 
+@jit
 def get_index(day_index: int, hour_index: int):
-    return day_index * 24 + hour_index
+    return day_index * HOURS_IN_DAY + hour_index
 
 
 def first_selling_strategy(demand: DemandDf, production: ProductionDf, param: Params, number_of_batteries,
                            predict_demand_in_year: int,
-                           binary_cost_profile: CostElectricityDf = BINARY_SELLING_COST,
-                           cost_profile: CostElectricityDf = ELECTRICITY_COST,
-                           sell_profile: CostElectricityDf = ELECTRICITY_SELLING_INCOME) -> ElectricityUseDf:
+                           tariff: Optional[TariffCalendar] = None) -> ElectricityUseDf:
     """
         Given a matching rect cost and sell function
         :param demand: DemandDf: pd.DataFrame(columns=[HourOfYear, 'Demand'])
         :param production: ProductionDf: pd.DataFrame(columns=[HourOfYear, 'SolarProduction'])
-        :param cost_profile: CostElectricityDf wrapper of pd.DataFrame with Cost and HourOfYear
-        :param sell_profile: CostElectricityDf wrapper of pd.DataFrame with selling price and HourOfYear
-        :param binary_cost_profile: CostElectricityDf wrapper of pd.DataFrame with Cost and HourOfYear as binary
-            (peak / low)
+        :param predict_demand_in_year: the year of the demand
+        :param tariff: TariffCalendar buying and selling prices and peak (expansive) hours of every hour, the calendar
+            of predict_demand_in_year if None
         :param battery_capacity: float capacity of battery
         :param battery_power: power of the battery
         :return: pd.DataFrame(columns=[HourOfYear, GasUsage, SolarUsage, StoredUsage, SolarStored, SolarLost, SolarSold, StoredSold]
         """
-    len_simulation = len(demand.df[demand.HourOfYear])
-    if not len_simulation % 24 == 0:
+    len_simulation = len(demand.get_hour_of_year())
+    if not len_simulation % HOURS_IN_DAY == 0:
         raise ValueError("Length of input should be a whole number of days")
     sale_max_power = param.MAX_SELLING_POWER * param.BATTERY_EFFECTIVE_SIZE
     battery_power = param.CHARGE_POWER * number_of_batteries * param.BATTERY_EFFECTIVE_SIZE
     battery_capacity = param.BATTERY_CAPACITY * number_of_batteries * param.BATTERY_EFFECTIVE_SIZE
     battery_efficiency = param.BATTERY_EFFICIENCY
-    # Helpful definitions
-    bin_cost = binary_cost_profile.df[binary_cost_profile.Cost].to_numpy()
-    production = copy.deepcopy(production.df[production.SolarProduction].to_numpy())  # overwriting
-    demand = shift_day_of_year(copy.deepcopy(demand.df[demand.Demand].to_numpy()),
-                               predict_demand_in_year)  # shift demand to start on sunday
-    hour_of_year = sell_profile.df[CostElectricityDf.HourOfYear] # to use later in the returned df
-    cost_profile = shift_day_of_year(copy.deepcopy(cost_profile.df[cost_profile.Cost]).to_numpy(), 2018)
-    sell_profile = shift_day_of_year(copy.deepcopy(sell_profile.df[sell_profile.Cost]).to_numpy(), 2018)
-    # production = copy.deepcopy(production.df[production.SolarProduction].to_numpy())
-    # demand = copy.deepcopy(demand.df[demand.Demand].to_numpy())
-    day_use = {c: np.zeros(len(demand)) for c in ElectricityUseDf.COLUMNS}
-    total_stored = 0
-    # Iterating days
-    for day_index in range(0, len_simulation // 24):
-        # iterate expensive hours and use all the production for the demand
-        expensive_hours = [i for i, x in enumerate(bin_cost[day_index * 24: (day_index + 1) * 24]) if x == 1]
-        cheap_hours = [i for i, x in enumerate(bin_cost[day_index * 24: (day_index + 1) * 24]) if x == 0]
-        if not len(expensive_hours) == 0:
-            total_stored = day_with_expansive_hours(expensive_hours, day_index, demand, production, day_use,
-                                                    sale_max_power, battery_power,
-                                                    total_stored,
-                                                    battery_capacity, battery_efficiency, binary_cost_profile,
-                                                    cheap_hours, cost_profile,
-                                                    sell_profile)
-        else:
-            total_stored = no_expansive_hours_day(demand, production, day_index, battery_capacity, total_stored,
-                                                  sale_max_power, battery_efficiency, battery_power, day_use)
-    return combine_to_df(day_use, hour_of_year)
-
-
-def day_with_expansive_hours(expensive_hours, day_index, demand, production, day_use, sale_max_power,
-                             battery_power, total_stored,
-                             battery_capacity, battery_efficiency, binary_cost_profile, cheap_hours, cost_profile,
-                             sell_profile):
+    if tariff is None:
+        tariff = get_tariff_calendar(predict_demand_in_year)
+    if not len(tariff.buy_price) == len_simulation:
+        raise ValueError("The demand and the tariffs should have the same hours")
+    if JIT_ENABLED:
+        # compiled, the hour by hour loop is faster than the (days, 24) blocks
+        day_use = selling_loop(np.array(demand.get_values(), dtype=np.float64),
+                               np.array(production.get_values(), dtype=np.float64), tariff.day_is_peak,
+                               tariff.day_is_off_peak, tariff.buy_price, tariff.sell_price, tariff.buy_order,
+                               tariff.sell_order, float(sale_max_power), float(battery_power), float(battery_capacity),
+                               float(battery_efficiency))
+    else:
+        day_use = selling_day_blocks(demand.get_values(), production.get_values(), tariff, float(sale_max_power),
+                                     float(battery_power), float(battery_capacity), float(battery_efficiency))
+    return combine_to_df(day_use, demand.get_hour_of_year().to_numpy(dtype=np.float64))
+
+
+@jit
+def selling_loop(demand, production, day_is_peak, day_is_off_peak, cost_profile, sell_profile, buy_order, sell_order,
+                 sale_max_power, battery_power, battery_capacity, battery_efficiency):
     """
-    fill demand and selling in a day with expansive hours
-    @param expensive_hours: list of indexes of the expansive hours in the current day
-    @param day_index: index of the current day
-    @param demand: list of the demand for every hour in the year
-    @param production: list of the solar production (for all the panels combined) for every hour in the year
-    @param day_use: dictionary with the energy lists names as keys (solar usage, solar sold...), and the lists to fill throughout the simulation
+    The days of first_selling_strategy hour by hour, the compiled core of first_selling_strategy (selling_day_blocks
+    without numba). The peak hours and the orders of the hours of every day are (days, 24) matrices (see
+    TariffCalendar)
+    @param demand: array of the demand for every hour in the year (overwritten)
+    @param production: array of the solar production (for all the panels combined) for every hour in the year
+        (overwritten)
+    @param day_is_peak: (days, 24) bool matrix of the expansive hours
+    @param day_is_off_peak: (days, 24) bool matrix of the cheap hours
+    @param cost_profile: array of the buying cost per kwh for each hour in the year
+    @param sell_profile: array of the selling cost per kwh for each hour in the year
+    @param buy_order: (days, 24) the hours of every day by ascending buying cost
+    @param sell_order: (days, 24) the hours of every day by descending selling cost
     @param sale_max_power: maximum power to sell back to the IEC
     @param battery_power: maximum power to charge and discharge from the batteries
-    @param total_stored: the total energy in the batteries, until the current day
     @param battery_capacity: the batteries' capacity (all of them combined)
     @param battery_efficiency: the ratio between the energy used for charging, to the energy charged
-    @param binary_cost_profile: binary classification of all the hours in the year, to expansive and cheap hours
-    @param cheap_hours: list of indexes of the cheap hours in the current day
-    @param cost_profile: list of the buying cost per kwh for each hour in the year
-    @param sell_profile: list of the selling cost per kwh for each hour in the year
-    @return: total_stored: updated total stored, after current day
+    @return: day_use: matrix with a row per ElectricityUseDf column (HourOfYear row is left empty)
     """
-    expansive_completion, expansive_use_completion = (0, 0)
-    expansive_completion, expansive_use_completion = get_affective_expansive_demand(expensive_hours, day_index,
-                                                                                    demand, production, day_use,
-                                                                                    sale_max_power,
-                                                                                    expansive_completion,
-                                                                                    battery_power,
-                                                                                    expansive_use_completion)
-    total_stored = store_overproduction_to_fill_battery(expensive_hours, total_stored, battery_capacity,
-                                                        day_index, demand, production, battery_efficiency,
-                                                        battery_power, day_use)
-    if get_is_buying_profitable(battery_efficiency, binary_cost_profile, get_index(day_index, cheap_hours[0]),
-                                get_index(day_index, expensive_hours[0]), cost_profile, sell_profile):
-        total_stored = buy_in_cheap_hours(battery_capacity, expansive_completion, cheap_hours, total_stored,
-                                          day_index,
-                                          battery_power, day_use, sell_profile, cost_profile)
-    total_stored = fill_expansive_hours(expensive_hours, day_index, demand, battery_power, day_use,
-                                        total_stored, expansive_use_completion, sale_max_power, sell_profile)
-    fill_cheap_hours(cheap_hours, day_index, production, demand, sale_max_power, day_use)
-    return total_stored
+    day_use = np.zeros((NUM_COLUMNS, len(demand)))
+    total_stored = 0.0
+    for day_index in range(0, len(demand) // HOURS_IN_DAY):
+        expensive_hours = np.nonzero(day_is_peak[day_index])[0]
+        cheap_hours = np.nonzero(day_is_off_peak[day_index])[0]
+        if not len(expensive_hours) == 0:
+            total_stored = day_with_expansive_hours(expensive_hours, day_index, demand, production, day_use,
+                                                    sale_max_power, battery_power, total_stored, battery_capacity,
+                                                    battery_efficiency, cheap_hours, cost_profile, sell_profile,
+                                                    day_is_peak[day_index], day_is_off_peak[day_index],
+                                                    buy_order[day_index], sell_order[day_index])
+        else:
+            total_stored = no_expansive_hours_day(demand, production, day_index, battery_capacity, total_stored,
+                                                  sale_max_power, battery_efficiency, battery_power, day_use)
+    return day_use
 
 
-def get_affective_expansive_demand(expensive_hours, day_index, demand, production, day_use, sale_max_power,
-                                   expansive_completion, battery_power, expansive_use_completion):
+@jit
+def day_with_expansive_hours(expensive_hours, day_index, demand, production, day_use, sale_max_power, battery_power,
+                             total_stored, battery_capacity, battery_efficiency, cheap_hours, cost_profile,
+                             sell_profile, is_peak, is_off_peak, buy_order, sell_order):
     """
-    get energy to be filled in cheap hours to answer demand and selling in expansive hours
-    @param expensive_hours: list of indexes of the expansive hours in the current day
-    @param day_index: index of the current day
-    @param demand: list of the demand for every hour in the year
-    @param production: list of the solar production (for all the panels combined) for every hour in the year
-    @param day_use: dictionary with the energy lists names as keys (solar usage, solar sold...), and the lists to fill throughout the simulation
-    @param sale_max_power: maximum power to sell back to the IEC
-    @param expansive_completion: amount of kwh to fill in cheap hours to cover the demand and selling in expansive hours
-    @param battery_power:
-    @param expansive_use_completion: amount of kwh to fill in cheap hours to cover only the selling in expansive hours
-    @return: updated expansive_completion and expansive_use_completion
+    fill demand and selling in a day with expansive hours. The cheap hours are bought in by buy_order (ascending buying
+    price) and the expansive hours are filled by sell_order (descending selling price), the orders of all the hours of
+    the day
+    @return: total_stored: updated total stored, after current day
     """
+    # use the production of the expansive hours, the rest is filled in cheap hours
+    expansive_completion = 0.0
+    expansive_use_completion = 0.0
     for hour_index in expensive_hours:
         i = get_index(day_index, hour_index)
-        needed_power = demand[i]
-        solar_used = min(production[i], needed_power)
-        day_use[ElectricityUseDf.SolarUsage][i] += solar_used
+        solar_used = min(production[i], demand[i])
+        day_use[SOLAR_USAGE, i] += solar_used
         demand[i] -= solar_used
         solar_sold = min(production[i] - solar_used, sale_max_power)
-        day_use[ElectricityUseDf.SolarSold][i] = solar_sold
+        day_use[SOLAR_SOLD, i] = solar_sold
         solar_lost = production[i] - solar_used - solar_sold  # not storing in expansive hours
-        day_use[ElectricityUseDf.SolarLost][i] += solar_lost
+        day_use[SOLAR_LOST, i] += solar_lost
         production[i] -= (solar_used + solar_sold + solar_lost)
-        expansive_completion += min(demand[i] + sale_max_power - solar_sold,
-                                    battery_power)  # to buy in cheap hours later
+        expansive_completion += min(demand[i] + sale_max_power - solar_sold, battery_power)
         expansive_use_completion += min(demand[i], battery_power)
-    return expansive_completion, expansive_use_completion
 
-
-def store_overproduction_to_fill_battery(expensive_hours, total_stored, battery_capacity, day_index, demand, production,
-                                         battery_efficiency, battery_power, day_use):
-    """
-    go through cheap hours, store the overproduction to fill battery
-    @param expensive_hours: list of indexes of the expansive hours in the current day
-    @param total_stored: the total energy in the batteries, until the current day
-    @param battery_capacity: the batteries' capacity (all of them combined)
-    @param day_index: index of the current day
-    @param demand: list of the demand for every hour in the year
-    @param production: list of the solar production (for all the panels combined) for every hour in the year
-    @param battery_efficiency: the ratio between the energy used for charging, to the energy charged
-    @param battery_power: maximum power to charge and discharge from the batteries
-    @param day_use: dictionary with the energy lists names as keys (solar usage, solar sold...), and the lists to fill throughout the simulation
-    @return: total_stored: updated total stored, after filling overproduction
-    """
+    # store the overproduction of the cheap hours before the expansive hours, until the batteries are full
     for hour_index in range(expensive_hours[0] - 1, -1, -1):
-        if total_stored >= battery_capacity:  # trying to fill the battery
+        if total_stored >= battery_capacity:
             break
         i = get_index(day_index, hour_index)
-        needed_power = demand[i]
-        overproduction = production[i] - min(production[i], needed_power)
-        storing = min(overproduction, (battery_capacity - total_stored) / battery_efficiency, battery_power /
-                      battery_efficiency)
+        overproduction = production[i] - min(production[i], demand[i])
+        storing = min(overproduction, (battery_capacity - total_stored) / battery_efficiency,
+                      battery_power / battery_efficiency)
         total_stored += storing * battery_efficiency  # when using battery, some power disappears
-        day_use[ElectricityUseDf.SolarStored][i] = storing * battery_efficiency
-        day_use[ElectricityUseDf.SolarLost][i] = storing * (1 - battery_efficiency)
+        day_use[SOLAR_STORED, i] = storing * battery_efficiency
+        day_use[SOLAR_LOST, i] = storing * (1 - battery_efficiency)
         production[i] = production[i] - storing
-    return total_stored
-
-
-def buy_in_cheap_hours(battery_capacity, expansive_completion, cheap_hours, total_stored, day_index, battery_power,
-                       day_use, sell_profile, cost_profile):
-    """
-    go through cheap hours, buy and store to answer the expansive completion
-    @param battery_capacity: the batteries' capacity (all of them combined)
-    @param expansive_completion: amount of kwh to fill in cheap hours to cover the demand and selling in expansive hours
-    @param cheap_hours: list of indexes of the cheap hours in the current day
-    @param total_stored: the total energy in the batteries, until the current day
-    @param day_index: index of the current day
-    @param battery_power: maximum power to charge and discharge from the batteries
-    @param day_use: dictionary with the energy lists names as keys (solar usage, solar sold...), and the lists to fill throughout the simulation
-    @param sell_profile: list of the selling cost per kwh for each hour in the year
-    @param cost_profile: list of the buying cost per kwh for each hour in the year
-    @return: total_stored: updated total stored, after buying in cheap hours
-    """
-    effective_battery_capacity = min(battery_capacity, expansive_completion)
-    for i in ordered_cheap_hours(cheap_hours, cost_profile, day_index):
-        # print(f"energy bought in hour {i}", end=" ")
-        # i = get_index(day_index, hour_index)
-        if total_stored >= effective_battery_capacity:
-            break
-        # i = get_index(day_index, hour_index)
-        solar_buy = min(battery_power - day_use[ElectricityUseDf.SolarStored][i], effective_battery_capacity
-                        - total_stored)
-        total_stored += solar_buy
-        day_use[ElectricityUseDf.GasStored][i] = solar_buy
-    return total_stored
-
 
-def fill_expansive_hours(expensive_hours, day_index, demand, battery_power, day_use, total_stored,
-                         expansive_use_completion, sale_max_power, sell_profile):
-    """
-    go through expansive hours, fill the demand and sell (if profitable) the stored energy
-    @param expensive_hours: list of indexes of the expansive hours in the current day
-    @param day_index: index of the current day
-    @param demand: list of the demand for every hour in the year
-    @param battery_power: maximum power to charge and discharge from the batteries
-    @param day_use: dictionary with the energy lists names as keys (solar usage, solar sold...), and the lists to fill throughout the simulation
-    @param total_stored: the total energy in the batteries, until the current day
-    @param expansive_use_completion: amount of kwh to fill in cheap hours to cover only the selling in expansive hours
-    @param sale_max_power: maximum power to sell back to the IEC
-    @param sell_profile: list of the selling cost per kwh for each hour in the year
-    @return: total_stored: updated total stored, after filling expansive
-    """
+    if get_is_buying_profitable(battery_efficiency, get_index(day_index, cheap_hours[0]),
+                                get_index(day_index, expensive_hours[0]), cost_profile, sell_profile):
+        effective_battery_capacity = min(battery_capacity, expansive_completion)
+        for hour_index in buy_order:
+            if not is_off_peak[hour_index] or hour_index >= THRESHOLD_HOUR:  # bought before the expansive hours
+                continue
+            if total_stored >= effective_battery_capacity:
+                break
+            i = get_index(day_index, hour_index)
+            solar_buy = min(battery_power - day_use[SOLAR_STORED, i], effective_battery_capacity - total_stored)
+            total_stored += solar_buy
+            day_use[GAS_STORED, i] = solar_buy
+
+    # fill the expansive hours from the batteries and sell what is not needed
     expansive_sell_completion = total_stored - expansive_use_completion
-    for i in ordered_hours(expensive_hours, sell_profile, day_index):
-        # i = get_index(day_index, hour_index)
+    for hour_index in sell_order:
+        if not is_peak[hour_index]:
+            continue
+        i = get_index(day_index, hour_index)
         stored_used = min(demand[i], battery_power, total_stored)
         total_stored -= stored_used
-        day_use[ElectricityUseDf.StoredUsage][i] = stored_used
+        day_use[STORED_USAGE, i] = stored_used
         if expansive_sell_completion > 0:  # in case that the stored power won't last to the last expansive hour
-            stored_sell = min(sale_max_power - day_use[ElectricityUseDf.SolarSold][i], battery_power -
-                              day_use[ElectricityUseDf.StoredUsage][i], expansive_sell_completion)
+            stored_sell = min(sale_max_power - day_use[SOLAR_SOLD, i], battery_power - day_use[STORED_USAGE, i],
+                              expansive_sell_completion)
             expansive_sell_completion -= stored_sell
         else:
-            stored_sell = 0
-        day_use[ElectricityUseDf.StoredSold][i] = stored_sell
+            stored_sell = 0.0
+        day_use[STORED_SOLD, i] = stored_sell
         total_stored -= stored_sell
-        day_use[ElectricityUseDf.GasUsage][i] = demand[i] - stored_used
-    return total_stored
+        day_use[GAS_USAGE, i] = demand[i] - stored_used
 
-
-def fill_cheap_hours(cheap_hours, day_index, production, demand, sale_max_power, day_use):
-    """
-    go through cheap hours, use solar production, sell if possible and buy if necessary
-    @param cheap_hours: list of indexes of the cheap hours in the current day
-    @param day_index: index of the current day
-    @param production: list of the solar production (for all the panels combined) for every hour in the year
-    @param demand: list of the demand for every hour in the year
-    @param sale_max_power: maximum power to sell back to the IEC
-    @param day_use: dictionary with the energy lists names as keys (solar usage, solar sold...), and the lists to fill throughout the simulation
-    @return: None
-    """
+    # use the solar production of the cheap hours, sell if possible and buy if necessary
     for hour_index in cheap_hours:
         i = get_index(day_index, hour_index)
         solar_used = min(production[i], demand[i])
-        day_use[ElectricityUseDf.SolarUsage][i] = solar_used
+        day_use[SOLAR_USAGE, i] = solar_used
         solar_sold = min(production[i] - solar_used, sale_max_power)
-        day_use[ElectricityUseDf.SolarSold][i] = solar_sold
-        day_use[ElectricityUseDf.SolarLost][i] += production[i] - solar_used - solar_sold
-        day_use[ElectricityUseDf.GasUsage][i] = demand[i] - solar_used
+        day_use[SOLAR_SOLD, i] = solar_sold
+        day_use[SOLAR_LOST, i] += production[i] - solar_used - solar_sold
+        day_use[GAS_USAGE, i] = demand[i] - solar_used
+    return total_stored
 
 
+@jit
 def no_expansive_hours_day(demand, production, day_index, battery_capacity, total_stored, sale_max_power,
                            battery_efficiency, battery_power, day_use):
     """
     fill demand and selling in a day with no expansive hours
-    @param demand: list of the demand for every hour in the year
-    @param production: list of the solar production (for all the panels combined) for every hour in the year
-    @param day_index: index of the current day
-    @param battery_capacity: the batteries' capacity (all of them combined)
-    @param total_stored: the total energy in the batteries, until the current day
-    @param sale_max_power: maximum power to sell back to the IEC
-    @param battery_efficiency: the ratio between the energy used for charging, to the energy charged
-    @param battery_power: maximum power to charge and discharge from the batteries
-    @param day_use: dictionary with the energy lists names as keys (solar usage, solar sold...), and the lists to fill throughout the simulation
     @return: total_stored: updated total stored, after current day
     """
-    for i in range(day_index * 24, (day_index + 1) * 24):
+    for i in range(day_index * HOURS_IN_DAY, (day_index + 1) * HOURS_IN_DAY):
         needed_power = demand[i]
         solar_used = min(production[i], needed_power)
-        day_use[ElectricityUseDf.SolarUsage][i] = solar_used
+        day_use[SOLAR_USAGE, i] = solar_used
         needed_power -= solar_used
         solar_stored_natural = min(production[i] - solar_used, (battery_capacity - total_stored) / battery_efficiency,
                                    battery_power / battery_efficiency)
-        day_use[ElectricityUseDf.SolarStored][i] = solar_stored_natural * battery_efficiency
+        day_use[SOLAR_STORED, i] = solar_stored_natural * battery_efficiency
         total_stored += solar_stored_natural * battery_efficiency
         # energy lost when charging the battery
         solar_stored_lost = solar_stored_natural * (1 - battery_efficiency)
         solar_sold = min(production[i] - solar_used - solar_stored_natural, sale_max_power)
-        day_use[ElectricityUseDf.SolarSold][i] = solar_sold
-        solar_lost = production[i] + solar_stored_lost - solar_used - solar_stored_natural - solar_sold
-        day_use[ElectricityUseDf.SolarLost][i] = solar_lost
+        day_use[SOLAR_SOLD, i] = solar_sold
+        day_use[SOLAR_LOST, i] = production[i] + solar_stored_lost - solar_used - solar_stored_natural - solar_sold
         stored_used = min(total_stored, needed_power, battery_power)
-        day_use[ElectricityUseDf.StoredUsage][i] = stored_used
+        day_use[STORED_USAGE, i] = stored_used
         total_stored -= stored_used
         needed_power -= stored_used
-        day_use[ElectricityUseDf.GasUsage][i] = needed_power
+        day_use[GAS_USAGE, i] = needed_power
     return total_stored
 
 
-def get_is_buying_profitable(battery_efficiency, binary_cost_profile, low_index, peak_index, cost_profile,
-                             sell_profile):
+def selling_day_blocks(demand, production, tariff: TariffCalendar, sale_max_power, battery_power, battery_capacity,
+                       battery_efficiency):
+    """
+    The days of first_selling_strategy as (days, 24) blocks. The peak hours and the price orderings of the hours of
+    every day are taken from the tariff calendar, and every step of a day (storing the overproduction, buying in the
+    cheap hours, filling and selling in the expansive hours) is a row-wise cumulative sum capped by the batteries.
+    Only the energy stored in the batteries is carried from day to day, by a scalar recurrence over the days.
+    @param demand: array of the demand for every hour in the year
+    @param production: array of the solar production (for all the panels combined) for every hour in the year
+    @param tariff: TariffCalendar of the demand: prices, expansive (peak) and cheap (off-peak) hours of every day
+    @param sale_max_power: maximum power to sell back to the IEC
+    @param battery_power: maximum power to charge and discharge from the batteries
+    @param battery_capacity: the batteries' capacity (all of them combined)
+    @param battery_efficiency: the ratio between the energy used for charging, to the energy charged
+    @return: day_use: matrix with a row per ElectricityUseDf column (HourOfYear row is left empty)
+    """
+    demand, production = (np.reshape(profile, (-1, HOURS_IN_DAY)) for profile in (demand, production))
+    days = np.arange(len(demand))
+    hours = np.arange(HOURS_IN_DAY)
+    expensive, cheap = tariff.day_is_peak, tariff.day_is_off_peak
+    is_expensive_day, first_expensive = tariff.is_peak_day, tariff.first_peak_hour
+    # expansive hours by descending selling cost, cheap hours by ascending buying cost
+    sell_order, cost_order = tariff.sell_order, tariff.buy_order
+    is_buying_hour = cheap & (hours < THRESHOLD_HOUR)
+    is_profitable = is_expensive_day & cheap.any(axis=1) & (
+            tariff.day_buy_price[days, cheap.argmax(axis=1)] <
+            tariff.day_sell_price[days, np.minimum(first_expensive, HOURS_IN_DAY - 1)] * battery_efficiency)
+
+    solar_usage = np.minimum(production, demand)
+    needed_power = demand - solar_usage
+    surplus = production - solar_usage
+    # the surplus stored in an hour when the batteries are not full
+    storable = np.minimum(surplus, battery_power / battery_efficiency) * battery_efficiency
+    stored_usable = np.minimum(needed_power, battery_power)
+
+    # expansive hours: the surplus is sold, the batteries fill the demand and sell the rest
+    expensive_sold = np.minimum(surplus, sale_max_power)
+    expansive_completion = np.where(expensive, np.minimum(needed_power + sale_max_power - expensive_sold,
+                                                          battery_power), 0.0).sum(axis=1)
+    to_use = np.where(expensive, stored_usable, 0.0)
+    to_sell = np.where(expensive, np.minimum(sale_max_power - expensive_sold, battery_power - to_use), 0.0)
+    # the overproduction of the cheap hours before the expansive hours is stored from the last of them backwards
+    to_store = np.where(hours < first_expensive[:, np.newaxis], storable, 0.0)
+    stored_after = np.cumsum(to_store[:, ::-1], axis=1)[:, ::-1] - to_store
+    late_to_store = np.where(hours >= THRESHOLD_HOUR, to_store, 0.0).sum(axis=1)
+
+    # days without expansive hours: the batteries of every hour are min(max(start + offset, low), high) of the start
+    # of the day, composing the hours of min(stored + charge, capacity) - discharge (not below zero)
+    # (hours, days) so every hour is a contiguous row
+    charge_minus_discharge = np.where(is_expensive_day, 0.0, (storable - stored_usable).T)
+    discharge_high = np.maximum(battery_capacity - stored_usable, 0).T
+    offset, low, high = (np.empty((HOURS_IN_DAY, len(demand))) for _ in range(3))
+    offset_hour, low_hour, high_hour = 0.0, -np.inf, np.inf
+    for hour in hours:
+        offset_hour = offset[hour] = offset_hour + charge_minus_discharge[hour]
+        low_hour = low[hour] = np.maximum(low_hour + charge_minus_discharge[hour], 0)
+        high_hour = high[hour] = np.minimum(np.maximum(high_hour + charge_minus_discharge[hour], 0),
+                                            discharge_high[hour])
+
+    start_stored = selling_carry(is_expensive_day, is_profitable, expansive_completion, to_store.sum(axis=1),
+                                 late_to_store, is_buying_hour.sum(axis=1) * battery_power, to_use.sum(axis=1),
+                                 to_sell.sum(axis=1), offset[-1], low[-1], high[-1], battery_capacity)
+
+    # the hours of the expansive days
+    start = start_stored[:, np.newaxis]
+    solar_stored = np.clip(np.maximum(battery_capacity - start, 0) - stored_after, 0, to_store)
+    stored_before_buying = start_stored + solar_stored.sum(axis=1)
+    buyable = np.take_along_axis(np.where(is_buying_hour, battery_power - solar_stored, 0.0), cost_order, axis=1)
+    effective_battery_capacity = np.minimum(battery_capacity, expansive_completion)
+    bought = np.where(is_profitable[:, np.newaxis],
+                      __capped_cumulative(buyable, effective_battery_capacity - stored_before_buying), 0.0)
+    gas_stored = np.empty(demand.shape)
+    np.put_along_axis(gas_stored, cost_order, bought, axis=1)
+    stored_before_filling = stored_before_buying + bought.sum(axis=1)
+    stored_used = np.empty(demand.shape)
+    np.put_along_axis(stored_used, sell_order, __capped_cumulative(np.take_along_axis(to_use, sell_order, axis=1),
+                                                                   stored_before_filling), axis=1)
+    stored_sold = np.empty(demand.shape)
+    np.put_along_axis(stored_sold, sell_order, __capped_cumulative(np.take_along_axis(to_sell, sell_order, axis=1),
+                                                                   stored_before_filling - to_use.sum(axis=1)),
+                      axis=1)
+    production_left = production - solar_stored / battery_efficiency
+    cheap_usage = np.minimum(production_left, demand)
+    cheap_sold = np.minimum(production_left - cheap_usage, sale_max_power)
+
+    # the hours of the days without expansive hours
+    stored_by_hour = np.minimum(np.maximum(start + offset.T, low.T), high.T)
+    stored_before_hour = np.concatenate([start, stored_by_hour[:, :-1]], axis=1)
+    natural_stored = np.minimum(storable, battery_capacity - stored_before_hour)
+    natural_stored_used = np.minimum(np.minimum(stored_before_hour + natural_stored, needed_power), battery_power)
+    natural_sold = np.minimum(surplus - natural_stored / battery_efficiency, sale_max_power)
+
+    day_use = np.zeros((NUM_COLUMNS,) + demand.shape)
+    expensive_day = is_expensive_day[:, np.newaxis]
+    day_use[SOLAR_USAGE] = np.where(expensive_day & cheap, cheap_usage, solar_usage)
+    day_use[SOLAR_STORED] = np.where(expensive_day, solar_stored, natural_stored)
+    day_use[GAS_STORED] = np.where(expensive_day, gas_stored, 0.0)
+    day_use[STORED_USAGE] = np.where(expensive_day, stored_used, natural_stored_used)
+    day_use[STORED_SOLD] = np.where(expensive_day, stored_sold, 0.0)
+    day_use[SOLAR_SOLD] = np.where(expensive_day, np.where(expensive, expensive_sold, cheap_sold), natural_sold)
+    day_use[SOLAR_LOST] = np.where(
+        expensive_day,
+        np.where(expensive, production - solar_usage - expensive_sold,
+                 solar_stored / battery_efficiency * (1 - battery_efficiency) + production_left - cheap_usage -
+                 cheap_sold),
+        production - solar_usage - natural_stored - natural_sold)
+    day_use[GAS_USAGE] = np.where(expensive_day, np.where(expensive, needed_power - stored_used,
+                                                          demand - cheap_usage),
+                                  needed_power - natural_stored_used)
+    return day_use.reshape(NUM_COLUMNS, -1)
+
+
+@jit
+def selling_carry(is_expensive_day, is_profitable, expansive_completion, to_store, late_to_store, buy_space,
+                  to_use, to_sell, day_offset, day_low, day_high, battery_capacity):
+    """
+    The energy in the batteries at the start of every day, the only sequential part of selling_day_blocks
+    @param is_expensive_day: array of bool does the day have expansive hours
+    @param is_profitable: array of bool is buying in the cheap hours to sell in the expansive hours profitable
+    @param expansive_completion: array of the energy to fill in cheap hours to cover the expansive hours of every day
+    @param to_store: array of the overproduction that can be stored before the expansive hours of every day
+    @param late_to_store: array of the part of to_store in the hours from THRESHOLD_HOUR (not bought in)
+    @param buy_space: array of the charging power of the hours to buy in of every day
+    @param to_use: array of the demand of the expansive hours that the batteries can fill
+    @param to_sell: array of the energy the batteries can sell in the expansive hours
+    @param day_offset: array of the change of the batteries in a day without expansive hours
+    @param day_low: array of the lowest energy in the batteries at the end of a day without expansive hours
+    @param day_high: array of the highest energy in the batteries at the end of a day without expansive hours
+    @param battery_capacity: the batteries' capacity (all of them combined)
+    @return: start_stored: array of the energy in the batteries at the start of every day
+    """
+    start_stored = np.empty(len(is_expensive_day))
+    total_stored = 0.0
+    for day in range(len(is_expensive_day)):
+        start_stored[day] = total_stored
+        if not is_expensive_day[day]:
+            total_stored = min(max(total_stored + day_offset[day], day_low[day]), day_high[day])
+            continue
+        room = max(battery_capacity - total_stored, 0.0)
+        stored = min(room, to_store[day])
+        total_stored += stored
+        if is_profitable[day]:
+            # the hours from THRESHOLD_HOUR are stored first and are not bought in
+            space = buy_space[day] - (stored - min(room, late_to_store[day]))
+            total_stored += min(max(min(battery_capacity, expansive_completion[day]) - total_stored, 0.0), space)
+        # the stored energy is sold only when it covers the demand of all the expansive hours
+        total_stored -= min(total_stored, to_use[day]) + min(max(total_stored - to_use[day], 0.0), to_sell[day])
+    return start_stored
+
+
+def __capped_cumulative(amounts, cap):
+    """
+    The amounts taken hour by hour until their sum reaches the cap of the day
+    @param amounts: (days, hours) non-negative amounts of every hour, in the order they are taken
+    @param cap: array of the cap of every day
+    @return: (days, hours) the amount taken in every hour
+    """
+    return np.clip(np.asarray(cap)[:, np.newaxis] - (np.cumsum(amounts, axis=1) - amounts), 0, amounts)
+
+
+@jit
+def get_is_buying_profitable(battery_efficiency, low_index, peak_index, cost_profile, sell_profile):
     """
     checks if it is profitable to buy and store energy in cheap hours to sell in expansive hours
     @param battery_efficiency: the ratio between the energy used for charging, to the energy charged
-    @param binary_cost_profile: binary classification of all the hours in the year, to expansive and cheap hours
     @param low_index: index of cheap hour
     @param peak_index: index of expansive hour
-    @param cost_profile: list of the buying cost per kwh for each hour in the year
-    @param sell_profile: list of the selling cost per kwh for each hour in the year
+    @param cost_profile: array of the buying cost per kwh for each hour in the year
+    @param sell_profile: array of the selling cost per kwh for each hour in the year
     @return: bool: is the cheap cost less than the expansive cost times the battery efficiency
     """
     low_buy_price = cost_profile[low_index]
@@ -315,61 +386,201 @@ def get_is_buying_profitable(battery_efficiency, binary_cost_profile, low_index,
 
 def combine_to_df(day_use, hour_of_year):
     """
-    combine the list in day_use (simulation result) to ElectricityUseDf
-    @param day_use: dictionary with the energy lists names as keys (solar usage, solar sold...), and the lists that were filled throughout the simulation
-    @param hour_of_year: list of hours for every matching value in day use (basically the indexes plus 1)
+    combine the rows in day_use (simulation result) to ElectricityUseDf, without copying them
+    @param day_use: matrix with a row per ElectricityUseDf column (solar usage, solar sold...), that was filled throughout the simulation
+    @param hour_of_year: array of hours for every matching value in day use (basically the indexes plus 1)
     @return: ElectricityUseDf of the data simulated
     """
-    hourly_use = ElectricityUseDf(pd.DataFrame())
-    hourly_use.df[hourly_use.GasUsage] = day_use[ElectricityUseDf.GasUsage]
-    hourly_use.df[hourly_use.SolarUsage] = day_use[ElectricityUseDf.SolarUsage]
-    hourly_use.df[hourly_use.StoredUsage] = day_use[ElectricityUseDf.StoredUsage]
-    hourly_use.df[hourly_use.SolarStored] = day_use[ElectricityUseDf.SolarStored]
-    hourly_use.df[hourly_use.SolarLost] = round_array(day_use[ElectricityUseDf.SolarLost], 6)
-    hourly_use.df[hourly_use.SolarSold] = day_use[ElectricityUseDf.SolarSold]
-    hourly_use.df[hourly_use.StoredSold] = day_use[ElectricityUseDf.StoredSold]
-    hourly_use.df[hourly_use.GasStored] = day_use[ElectricityUseDf.GasStored]
-    hourly_use.df[hourly_use.HourOfYear] = hour_of_year
-    return hourly_use
-
-
-def ordered_hours(hours, sell_profile, day_index, reverse=True):
+    day_use[SOLAR_LOST] = round_array(day_use[SOLAR_LOST], 6)
+    day_use[HOUR_OF_YEAR] = hour_of_year
+    return ElectricityUseDf(day_use)
+
+
+def round_array(arr, decimal):
     """
-    order hours by their selling costs
-    @param hours: list of hours
-    @param sell_profile: list of the selling cost per kwh for each hour in the year
-    @param day_index: index of the current day
-    @param reverse: bool: descending order
-    @return: ordered hours by the matching selling costs
+    zeroes the floats smaller than 10 ** -decimal in absolute value
+    @param arr: np.ndarray of floats
+    @param decimal: number of digit to round from
+    @return: new rounded np.ndarray
     """
-    daily_sell_profile = [sell_profile[get_index(day_index, i)] for i in hours]
-    ordered_hours_array = [val for _, val in sorted(zip(daily_sell_profile, hours), reverse=reverse)]
-    return [get_index(day_index, i) for i in ordered_hours_array]
+    return np.where(np.abs(arr) < 10 ** (-decimal), 0.0, arr)
 
 
-def ordered_cheap_hours(hours, cost_profile, day_index, threshold_hour=20):
+def first_selling_strategy_batch(demand: DemandDf, production: np.ndarray, param: Params,
+                                 number_of_batteries: np.ndarray, predict_demand_in_year: int,
+                                 tariff: Optional[TariffCalendar] = None) -> np.ndarray:
     """
-    order cheap hours by their selling costs, in ascending order
-    @param hours: list of hours
-    @param cost_profile: list of the buying cost per kwh for each hour in the year
-    @param day_index: index of the current day
-    @param threshold_hour: an expansive hour
-    @return: ordered cheap hours, in ascending
+    first_selling_strategy of many (solar panels, batteries) scenarios at once, the batteries of all the scenarios are
+    advanced together hour by hour.
+    @param demand: DemandDf: pd.DataFrame(columns=[HourOfYear, 'Demand'])
+    @param production: np.ndarray(scenarios, hours) the solar production of every scenario
+    @param param: named tuple of parameters from parameters.csv
+    @param number_of_batteries: np.ndarray(scenarios) the number of batteries of every scenario
+    @param predict_demand_in_year: the year of the demand
+    @param tariff: TariffCalendar buying and selling prices and peak (expansive) hours of every hour, the calendar of
+        predict_demand_in_year if None
+    @return: np.ndarray(scenarios, len(ElectricityUseDf.COLUMNS), hours) the electricity use of every scenario
     """
-    early_hours = [i for i in hours if i < threshold_hour]  # to buy before the expansive hours
-    return ordered_hours(early_hours, cost_profile, day_index, reverse=False)
+    len_simulation = len(demand.get_hour_of_year())
+    if not len_simulation % HOURS_IN_DAY == 0:
+        raise ValueError("Length of input should be a whole number of days")
+    number_of_batteries = np.asarray(number_of_batteries, dtype=np.float64)
+    sale_max_power = param.MAX_SELLING_POWER * param.BATTERY_EFFECTIVE_SIZE
+    battery_power = param.CHARGE_POWER * number_of_batteries * param.BATTERY_EFFECTIVE_SIZE
+    battery_capacity = param.BATTERY_CAPACITY * number_of_batteries * param.BATTERY_EFFECTIVE_SIZE
+    if tariff is None:
+        tariff = get_tariff_calendar(predict_demand_in_year)
+    if not len(tariff.buy_price) == len_simulation:
+        raise ValueError("The demand and the tariffs should have the same hours")
+    # hours major copies, each row is the state of all the scenarios in one hour (overwritten)
+    production = np.array(production, dtype=np.float64).T.copy()
+    demand = np.repeat(demand.get_values()[:, np.newaxis], production.shape[1], axis=1)
+    day_use = selling_loop_batch(demand, production, tariff.day_is_peak, tariff.day_is_off_peak, tariff.buy_price,
+                                 tariff.sell_price, tariff.buy_order, tariff.sell_order, float(sale_max_power),
+                                 battery_power, battery_capacity, float(param.BATTERY_EFFICIENCY))
+    day_use[HOUR_OF_YEAR] = tariff.hour_of_year[:, np.newaxis]
+    return np.ascontiguousarray(day_use.transpose(2, 0, 1))
+
+
+@jit
+def selling_loop_batch(demand, production, day_is_peak, day_is_off_peak, cost_profile, sell_profile, buy_order,
+                       sell_order, sale_max_power, battery_power, battery_capacity, battery_efficiency):
+    """
+    The days of first_selling_strategy for all the scenarios, hour by hour. Every per scenario value is an array of
+    the scenarios and demand and production are (hours, scenarios) matrices. The peak hours and the orders of the
+    hours of every day are (days, 24) matrices (see TariffCalendar)
+    @return: day_use: (len(ElectricityUseDf.COLUMNS), hours, scenarios) matrix (HourOfYear row is left empty)
+    """
+    day_use = np.zeros((NUM_COLUMNS, production.shape[0], production.shape[1]))
+    total_stored = np.zeros(production.shape[1])
+    for day_index in range(0, len(demand) // HOURS_IN_DAY):
+        expensive_hours = np.nonzero(day_is_peak[day_index])[0]
+        cheap_hours = np.nonzero(day_is_off_peak[day_index])[0]
+        if not len(expensive_hours) == 0:
+            total_stored = day_with_expansive_hours_batch(expensive_hours, day_index, demand, production, day_use,
+                                                          sale_max_power, battery_power, total_stored,
+                                                          battery_capacity, battery_efficiency, cheap_hours,
+                                                          cost_profile, sell_profile, day_is_peak[day_index],
+                                                          day_is_off_peak[day_index], buy_order[day_index],
+                                                          sell_order[day_index])
+        else:
+            total_stored = no_expansive_hours_day_batch(demand, production, day_index, battery_capacity,
+                                                        total_stored, sale_max_power, battery_efficiency,
+                                                        battery_power, day_use)
+    return day_use
 
 
-def round_array(arr, decimal):
+@jit
+def day_with_expansive_hours_batch(expensive_hours, day_index, demand, production, day_use, sale_max_power,
+                                   battery_power, total_stored, battery_capacity, battery_efficiency, cheap_hours,
+                                   cost_profile, sell_profile, is_peak, is_off_peak, buy_order, sell_order):
     """
-    rounds float in a list
-    @param arr: a list of floats
-    @param decimal: number of digit to round from
-    @return: rounded list
+    fill demand and selling in a day with expansive hours for all the scenarios, every per scenario value is an array
+    of the scenarios and demand, production and day_use rows are (hours, scenarios) matrices. The cheap hours are
+    bought in by buy_order (ascending buying price) and the expansive hours are filled by sell_order (descending
+    selling price), the orders of all the hours of the day
+    @return: total_stored: updated total stored of every scenario, after current day
     """
-    new_arr = copy.deepcopy(arr)
-    for i in range(len(new_arr)):
-        if 0 < abs(new_arr[i]) < 10 ^ (-decimal):
-            new_arr[i] = 0
+    expansive_completion = np.zeros(len(total_stored))
+    expansive_use_completion = np.zeros(len(total_stored))
+    for hour_index in expensive_hours:
+        i = get_index(day_index, hour_index)
+        solar_used = np.minimum(production[i], demand[i])
+        day_use[SOLAR_USAGE, i] += solar_used
+        demand[i] -= solar_used
+        solar_sold = np.minimum(production[i] - solar_used, sale_max_power)
+        day_use[SOLAR_SOLD, i] = solar_sold
+        solar_lost = production[i] - solar_used - solar_sold  # not storing in expansive hours
+        day_use[SOLAR_LOST, i] += solar_lost
+        production[i] -= (solar_used + solar_sold + solar_lost)
+        expansive_completion += np.minimum(demand[i] + sale_max_power - solar_sold, battery_power)
+        expansive_use_completion += np.minimum(demand[i], battery_power)
+
+    # store the overproduction of the cheap hours before the expansive hours, until the batteries are full
+    filling = np.ones(len(total_stored), dtype=np.bool_)
+    for hour_index in range(expensive_hours[0] - 1, -1, -1):
+        filling &= total_stored < battery_capacity
+        if not filling.any():
+            break
+        i = get_index(day_index, hour_index)
+        overproduction = production[i] - np.minimum(production[i], demand[i])
+        storing = np.minimum(np.minimum(overproduction, (battery_capacity - total_stored) / battery_efficiency),
+                             battery_power / battery_efficiency)
+        storing = np.where(filling, storing, 0.0)
+        total_stored = total_stored + storing * battery_efficiency
+        day_use[SOLAR_STORED, i] = np.where(filling, storing * battery_efficiency, day_use[SOLAR_STORED, i])
+        day_use[SOLAR_LOST, i] = np.where(filling, storing * (1 - battery_efficiency), day_use[SOLAR_LOST, i])
+        production[i] = production[i] - storing
+
+    if get_is_buying_profitable(battery_efficiency, get_index(day_index, cheap_hours[0]),
+                                get_index(day_index, expensive_hours[0]), cost_profile, sell_profile):
+        effective_battery_capacity = np.minimum(battery_capacity, expansive_completion)
+        buying = np.ones(len(total_stored), dtype=np.bool_)
+        for hour_index in buy_order:
+            if not is_off_peak[hour_index] or hour_index >= THRESHOLD_HOUR:  # bought before the expansive hours
+                continue
+            i = get_index(day_index, hour_index)
+            buying &= total_stored < effective_battery_capacity
+            if not buying.any():
+                break
+            solar_buy = np.minimum(battery_power - day_use[SOLAR_STORED, i], effective_battery_capacity - total_stored)
+            total_stored = total_stored + np.where(buying, solar_buy, 0.0)
+            day_use[GAS_STORED, i] = np.where(buying, solar_buy, day_use[GAS_STORED, i])
+
+    # fill the expansive hours from the batteries and sell what is not needed
+    expansive_sell_completion = total_stored - expansive_use_completion
+    for hour_index in sell_order:
+        if not is_peak[hour_index]:
+            continue
+        i = get_index(day_index, hour_index)
+        stored_used = np.minimum(np.minimum(demand[i], battery_power), total_stored)
+        total_stored = total_stored - stored_used
+        day_use[STORED_USAGE, i] = stored_used
+        selling = expansive_sell_completion > 0
+        stored_sell = np.where(selling, np.minimum(np.minimum(sale_max_power - day_use[SOLAR_SOLD, i],
+                                                              battery_power - day_use[STORED_USAGE, i]),
+                                                   expansive_sell_completion), 0.0)
+        expansive_sell_completion = expansive_sell_completion - stored_sell
+        day_use[STORED_SOLD, i] = stored_sell
+        total_stored = total_stored - stored_sell
+        day_use[GAS_USAGE, i] = demand[i] - stored_used
+
+    for hour_index in cheap_hours:
+        i = get_index(day_index, hour_index)
+        solar_used = np.minimum(production[i], demand[i])
+        day_use[SOLAR_USAGE, i] = solar_used
+        solar_sold = np.minimum(production[i] - solar_used, sale_max_power)
+        day_use[SOLAR_SOLD, i] = solar_sold
+        day_use[SOLAR_LOST, i] += production[i] - solar_used - solar_sold
+        day_use[GAS_USAGE, i] = demand[i] - solar_used
+    return total_stored
+
 
-    return new_arr
+@jit
+def no_expansive_hours_day_batch(demand, production, day_index, battery_capacity, total_stored, sale_max_power,
+                                 battery_efficiency, battery_power, day_use):
+    """
+    fill demand and selling in a day with no expansive hours for all the scenarios, every per scenario value is an
+    array of the scenarios and demand, production and day_use rows are (hours, scenarios) matrices
+    @return: total_stored: updated total stored of every scenario, after current day
+    """
+    for i in range(day_index * HOURS_IN_DAY, (day_index + 1) * HOURS_IN_DAY):
+        needed_power = demand[i]
+        solar_used = np.minimum(production[i], needed_power)
+        day_use[SOLAR_USAGE, i] = solar_used
+        needed_power = needed_power - solar_used
+        solar_stored_natural = np.minimum(np.minimum(production[i] - solar_used,
+                                                     (battery_capacity - total_stored) / battery_efficiency),
+                                          battery_power / battery_efficiency)
+        day_use[SOLAR_STORED, i] = solar_stored_natural * battery_efficiency
+        total_stored = total_stored + solar_stored_natural * battery_efficiency
+        # energy lost when charging the battery
+        solar_stored_lost = solar_stored_natural * (1 - battery_efficiency)
+        solar_sold = np.minimum(production[i] - solar_used - solar_stored_natural, sale_max_power)
+        day_use[SOLAR_SOLD, i] = solar_sold
+        day_use[SOLAR_LOST, i] = production[i] + solar_stored_lost - solar_used - solar_stored_natural - solar_sold
+        stored_used = np.minimum(np.minimum(total_stored, needed_power), battery_power)
+        day_use[STORED_USAGE, i] = stored_used
+        total_stored = total_stored - stored_used
+        day_use[GAS_USAGE, i] = needed_power - stored_used
+    return total_stored
@@ -1,13 +1,18 @@
-import pandas as pd
+from typing import Optional
 
-from df_objects.df_objects import DemandDf, ProductionDf, ElectricityUseDf, CostElectricityDf
-from hourly_simulation.parameters import Params
+import numpy as np
 
-from hourly_simulation.strategies import greedy_strategy
+from df_objects.df_objects import DemandDf, ProductionDf, ElectricityUseDf
+from hourly_simulation.jit import jit
+from hourly_simulation.parameters import Params
+from hourly_simulation.strategies.columns import GAS_USAGE, GAS_STORED, SOLAR_USAGE, STORED_USAGE, SOLAR_STORED, \
+    SOLAR_LOST, NUM_COLUMNS, HOUR_OF_YEAR
+from hourly_simulation.tariff_calendar import TariffCalendar, get_tariff_calendar
 
 
 def smart_storing_strategy(demand: DemandDf, production: ProductionDf, params: Params,
-                        num_batteries: float, predict_demand_in_year: int) -> ElectricityUseDf:
+                           num_batteries: float, predict_demand_in_year: int,
+                           tariff: Optional[TariffCalendar] = None) -> ElectricityUseDf:
     """
     This is an implementation of the smart storing strategy - saving up just enough energy in batteries during cheap
     electricity hours to then use it during the expensive hours (only if we use gas-power during those hours), in order
@@ -17,43 +22,99 @@ def smart_storing_strategy(demand: DemandDf, production: ProductionDf, params: P
     :param production: ProductionDf: pd.DataFrame(columns=['HourOfYear', 'SolarProduction'])
     :param num_batteries: float number of batteries to simulate
     :param params: named tuple of parameters from parameters.csv
+    :param predict_demand_in_year: int year of the demand
+    :param tariff: TariffCalendar peak hours of every hour, the calendar of predict_demand_in_year if None
     :return: ElectricityUseDf pd.DataFrame(columns=['HourOfYear', 'GasUsage', 'GasStored', 'SolarUsage', 'StoredUsage',
                 'SolarStored', 'SolarLost', 'SolarSold' , 'StoredSold'])
     """
-    greedy_usage_df = greedy_strategy.greedy_use_strategy(demand, production, params, num_batteries, predict_demand_in_year).df
-    binary_cost_df = CostElectricityDf(pd.read_csv(r'data/electricity_cost_binary.csv', index_col=0)).df
-    battery_power = params.CHARGE_POWER
-    needed_to_purchase = []
-    pos = -2
-    storage_space = num_batteries * params.BATTERY_CAPACITY
-
-    # creates a list (needed_to_purchase) that on every index corresponding to an hour before the expensive electricity hours, the amount of additional electricity that should be stored in the batteries before the expensive hours is saved (on top of greedy_stratedy).
-    for hour, price in zip(greedy_usage_df.itertuples(), binary_cost_df.itertuples()):
-        needed_to_purchase.append(0)
-        storage_space += getattr(hour, ElectricityUseDf.StoredUsage) - getattr(hour, ElectricityUseDf.SolarStored)
-
-        if getattr(price, CostElectricityDf.Cost) and getattr(hour, CostElectricityDf.HourOfYear) > 1:
-            needed_to_purchase[pos] += min(getattr(hour, ElectricityUseDf.GasUsage), battery_power)
-            needed_to_purchase[pos] = min(needed_to_purchase[pos], storage_space)
-            pos -= 1
+    if tariff is None:
+        tariff = get_tariff_calendar(predict_demand_in_year)
+    if not len(tariff.is_peak) == len(demand.get_values()):
+        raise ValueError("The demand and the tariffs should have the same hours")
+    battery_capacity = float(num_batteries * params.BATTERY_CAPACITY * params.BATTERY_EFFECTIVE_SIZE)
+    battery_power = float(num_batteries * params.CHARGE_POWER)
+    demand_values, production_values = demand.get_values(), production.get_values()
+    block_need, hours_to_block = get_block_needs(tariff, np.maximum(demand_values - production_values, 0.0),
+                                                 battery_power, battery_capacity)
+    hourly_use = __smart_storing_loop(battery_capacity, battery_power, params.BATTERY_EFFICIENCY, demand_values,
+                                      production_values, tariff.is_peak, block_need, hours_to_block)
+    # no selling in this strategy
+    hourly_use[HOUR_OF_YEAR] = demand.get_hour_of_year().to_numpy(dtype=np.float64)
+    return ElectricityUseDf(hourly_use)
+
+
+def get_block_needs(tariff: TariffCalendar, missing_power: np.ndarray, battery_power: float, battery_capacity: float):
+    """
+    What the batteries should hold when the next block of expensive hours starts: the gas-power the block would use,
+    up to the battery power every hour and to the battery capacity in total.
+
+    :param tariff: TariffCalendar of the simulated demand
+    :param missing_power: np array of the demand not met by the solar production of every hour
+    :param battery_power: float battery max charging/discharging power limit [Kw]
+    :param battery_capacity: float Battery Capacity [Kwh]
+    :return: Tuple(np array of the need of the next block of every cheap hour (0 after the last block),
+        np array of int the hours from every cheap hour to the start of the next block)
+    """
+    starts, stops = tariff.peak_starts, tariff.peak_stops
+    hours = np.arange(len(missing_power))
+    need_by_hour = np.concatenate([[0.0], np.cumsum(np.minimum(missing_power, battery_power))])
+    needs = np.minimum(need_by_hour[stops] - need_by_hour[starts], battery_capacity)
+    # the index of the next block of every hour, len(starts) after the last one
+    next_block = np.searchsorted(starts, hours, side='right')
+    has_block = next_block < len(starts)
+    block_need = np.where(has_block, np.append(needs, 0.0)[next_block], 0.0)
+    hours_to_block = np.where(has_block, np.append(starts, len(hours))[next_block] - hours, 0)
+    return block_need, hours_to_block
+
+
+@jit
+def __smart_storing_loop(battery_capacity_kwh: float, battery_power_kw: float, battery_efficiency: float, demand,
+                         production, is_peak, block_need, hours_to_block):
+    """
+    Helper function for the smart_storing_strategy using faster jit. The solar production is used and stored as in the
+    greedy strategy. In the expensive hours the batteries are used greedily. In the cheap hours the batteries keep
+    what cannot be bought in the hours left before the next block of expensive hours (buying at the battery power every
+    hour), only the energy above it is used, and gas-power is bought into the batteries when they are below it. So the
+    energy of a block is bought as late as possible and the batteries are never charged and discharged in the same
+    hour.
+
+    :param battery_capacity_kwh: float Battery Capacity [Kwh]
+    :param battery_power_kw: float battery max charging/discharging power limit [Kw]
+    :param battery_efficiency: float ratio of (Kwh available to discharge / Kwh charged)
+    :param demand: np array of DemandDf.df['Demand']
+    :param production: np array of ProductionDf.df['SolarProduction']
+    :param is_peak: np array of bool is an expensive hour
+    :param block_need: np array of the energy to hold when the next block of expensive hours starts
+        (see get_block_needs)
+    :param hours_to_block: np array of int the hours to the start of the next block of expensive hours
+    :return: np array (len(ElectricityUseDf.COLUMNS), hours) with the relevant rows filled: 'GasUsage', 'GasStored',
+            'SolarUsage', 'StoredUsage', 'SolarStored', 'SolarLost'
+    """
+    storage: float = 0.0
+    len_simulation = len(demand)
+    hourly_use = np.zeros((NUM_COLUMNS, len_simulation))
+    for i in range(len_simulation):
+        needed_power = demand[i]
+        solar_used = min(production[i], needed_power)
+        hourly_use[SOLAR_USAGE, i] = solar_used
+        needed_power -= solar_used
+        solar_stored = min(production[i] - solar_used, battery_capacity_kwh - storage,
+                           battery_power_kw) * battery_efficiency
+        hourly_use[SOLAR_STORED, i] = solar_stored
+        storage += solar_stored
+        hourly_use[SOLAR_LOST, i] = production[i] - solar_used - solar_stored
+        reserve = 0.0
+        if not is_peak[i]:
+            reserve = max(block_need[i] - (hours_to_block[i] - 1) * battery_power_kw, 0.0)
+        if storage < reserve:
+            # cannot be bought in the hours left before the block, bought now
+            gas_stored = min(reserve - storage, battery_power_kw - solar_stored, battery_capacity_kwh - storage)
+            hourly_use[GAS_STORED, i] = gas_stored
+            storage += gas_stored
         else:
-            pos = -2
-
-    # modifies greedy_usage_df, changes GasUsage and StoredUsage for the expensive hours.
-    used_purchased = 0
-    for hour, purchased in zip(greedy_usage_df.itertuples(), needed_to_purchase):
-        used_purchased += purchased
-        hourly_usage = min(used_purchased, battery_power, getattr(hour, ElectricityUseDf.GasUsage))
-        used_purchased -= hourly_usage
-
-        greedy_usage_df.at[getattr(hour, 'Index'), ElectricityUseDf.GasUsage] -= hourly_usage
-        greedy_usage_df.at[getattr(hour, 'Index'), ElectricityUseDf.StoredUsage] += hourly_usage
-
-    # modifies greedy_usage_df, changes GasStored for before the expensive hours.
-    for i in range(len(needed_to_purchase) - 1, 0, -1):
-        charge_bought = min(battery_power, needed_to_purchase[i])
-        greedy_usage_df.at[i, ElectricityUseDf.GasStored] += charge_bought
-        if charge_bought != needed_to_purchase[i]:
-            needed_to_purchase[i - 1] = needed_to_purchase[i] - charge_bought
-
-    return ElectricityUseDf(greedy_usage_df)
+            stored_used = min(storage - reserve, needed_power, battery_power_kw)
+            hourly_use[STORED_USAGE, i] = stored_used
+            storage -= stored_used
+            needed_power -= stored_used
+        hourly_use[GAS_USAGE, i] = needed_power
+    return hourly_use
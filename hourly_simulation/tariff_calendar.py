@@ -0,0 +1,125 @@
+import collections
+import datetime
+import hashlib
+import threading
+from typing import Dict, Tuple
+
+import numpy as np
+
+from hourly_simulation import profile_store
+from hourly_simulation.parameters import ELECTRICITY_COST_PATH, ELECTRICITY_SELLING_INCOME_PATH, \
+    ELECTRICITY_COST_BINARY_PATH
+
+HOURS_IN_DAY = 24
+DAYS_IN_WEEK = 7
+# number of calendars kept, one per demand year
+MAX_TARIFF_CALENDARS = 16
+
+# demand year -> TariffCalendar of the current tariffs, by recent use
+__calendars = collections.OrderedDict()
+__calendars_lock = threading.Lock()
+
+
+class TariffCalendar:
+    """
+    The electricity tariffs aligned to the hours of a demand year, built once per demand year and version of the
+    tariffs (see get_tariff_calendar) and shared by the strategies and calculate_cost. The tariffs are rolled once so
+    every hour of the demand falls on the same day of the week as its price (see get_tariff_shift), the demand and the
+    production are used as they are. Everything the strategies need of the tariffs is precomputed: the prices, the
+    peak (expensive) and off-peak (cheap) hours, the blocks of consecutive peak hours and the order of the hours of
+    every day by their prices. All the arrays are read-only.
+    """
+
+    def __init__(self, demand_year: int, cost_path: str = ELECTRICITY_COST_PATH,
+                 sell_path: str = ELECTRICITY_SELLING_INCOME_PATH, peak_path: str = ELECTRICITY_COST_BINARY_PATH):
+        """
+        :param demand_year: int year of the demand the tariffs are aligned to
+        :param cost_path: str path of the csv of the buying price per Kwh of every hour
+        :param sell_path: str path of the csv of the selling price per Kwh of every hour
+        :param peak_path: str path of the csv of the binary tariff of every hour (1 for peak hours, 0 for off-peak)
+        """
+        # the parsed tariffs the calendar is built from (see get_tariff_calendar)
+        self.profiles = cost, sell, peak = get_tariff_profiles(cost_path, sell_path, peak_path)
+        if not len({int(profile[profile_store.YEAR]) for profile in (cost, sell, peak)}) == 1:
+            raise ValueError("The buying, selling and binary tariffs should be of the same year")
+        if not len(cost[profile_store.VALUES]) == len(sell[profile_store.VALUES]) == len(peak[profile_store.VALUES]):
+            raise ValueError("The buying, selling and binary tariffs should have the same hours")
+        if not len(cost[profile_store.VALUES]) % HOURS_IN_DAY == 0:
+            raise ValueError("Length of the tariffs should be a whole number of days")
+        self.tariff_year = int(cost[profile_store.YEAR])
+        self.demand_year = demand_year
+        # the price of the hour i of the demand is the price of the hour i + tariff_shift of the tariffs
+        self.tariff_shift = get_tariff_shift(self.tariff_year, demand_year)
+        self.hour_of_year = cost[profile_store.HOUR_OF_YEAR].astype(np.float64)
+        self.buy_price, self.sell_price, binary = (np.roll(profile[profile_store.VALUES].astype(np.float64),
+                                                           -self.tariff_shift) for profile in (cost, sell, peak))
+        self.is_peak = binary == 1
+        self.is_off_peak = binary == 0
+        edges = np.diff(self.is_peak.astype(np.int8), prepend=0, append=0)
+        # the first hour of every block of consecutive peak hours and the hour after it
+        self.peak_starts = np.flatnonzero(edges == 1)
+        self.peak_stops = np.flatnonzero(edges == -1)
+
+        # (days, HOURS_IN_DAY) views of the year
+        self.day_buy_price, self.day_sell_price, self.day_is_peak, self.day_is_off_peak = (
+            np.reshape(array, (-1, HOURS_IN_DAY)) for array in (self.buy_price, self.sell_price, self.is_peak,
+                                                                 self.is_off_peak))
+        self.is_peak_day = self.day_is_peak.any(axis=1)
+        # HOURS_IN_DAY for the days without peak hours
+        self.first_peak_hour = np.where(self.is_peak_day, self.day_is_peak.argmax(axis=1), HOURS_IN_DAY)
+        # the hours of every day by ascending buying price and by descending selling price, ties are broken by the
+        # hour (as sorting (price, hour) tuples, reversed for the selling price)
+        self.buy_order = np.argsort(self.day_buy_price, axis=1, kind='mergesort')
+        self.sell_order = np.ascontiguousarray(np.argsort(self.day_sell_price, axis=1, kind='mergesort')[:, ::-1])
+        # digest of the tariffs of the demand year, part of the keys of the cached electricity uses and lifetime costs
+        self.digest = hashlib.blake2b(np.concatenate([self.buy_price, self.sell_price, self.is_peak]).tobytes(),
+                                      digest_size=16).hexdigest()
+        for array in vars(self).values():
+            if isinstance(array, np.ndarray):
+                array.setflags(write=False)
+
+
+def get_tariff_calendar(demand_year: int) -> TariffCalendar:
+    """
+    :param demand_year: int year of the demand
+    :return: TariffCalendar of the tariffs of parameters.py aligned to the demand year, created once per year and
+        again when a csv of the tariffs is modified
+    """
+    profiles = get_tariff_profiles()
+    with __calendars_lock:
+        calendar = __calendars.get(demand_year)
+        if calendar is not None and all(built is current for built, current in zip(calendar.profiles, profiles)):
+            __calendars.move_to_end(demand_year)
+            return calendar
+    calendar = TariffCalendar(demand_year)
+    with __calendars_lock:
+        __calendars[demand_year] = calendar
+        __calendars.move_to_end(demand_year)
+        while len(__calendars) > MAX_TARIFF_CALENDARS:
+            __calendars.popitem(last=False)
+    return calendar
+
+
+def get_tariff_profiles(cost_path: str = ELECTRICITY_COST_PATH, sell_path: str = ELECTRICITY_SELLING_INCOME_PATH,
+                        peak_path: str = ELECTRICITY_COST_BINARY_PATH) -> Tuple[Dict[str, np.ndarray], ...]:
+    """
+    :param cost_path: str path of the csv of the buying price per Kwh of every hour
+    :param sell_path: str path of the csv of the selling price per Kwh of every hour
+    :param peak_path: str path of the csv of the binary tariff of every hour
+    :return: Tuple of the parsed buying, selling and binary tariffs (see profile_store.get_profile), the same
+        dictionaries while the csvs are not modified
+    """
+    return tuple(profile_store.get_profile(path, profile_store.COST) for path in (cost_path, sell_path, peak_path))
+
+
+def get_tariff_shift(tariff_year: int, demand_year: int) -> int:
+    """
+    Hours to roll the tariffs back so they fall on the days of the week of the demand year, the nearest whole number
+    of days (at most 3 days earlier or later) that matches the day of the week of the first of january
+
+    :param tariff_year: int year of the tariffs
+    :param demand_year: int year of the demand
+    :return: int the hours of the demand year are the hours of the tariffs year after this shift
+    """
+    days = datetime.date(demand_year, 1, 1).weekday() - datetime.date(tariff_year, 1, 1).weekday()
+    return ((days + DAYS_IN_WEEK // 2) % DAYS_IN_WEEK - DAYS_IN_WEEK // 2) * HOURS_IN_DAY
@@ -0,0 +1,203 @@
+import contextlib
+import contextvars
+import functools
+import importlib.util
+import logging
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+# set THOUSAND_SUNS_TIMING=0 to skip the timing of the stages (see timed and stage)
+TIMING_ENV_VAR = 'THOUSAND_SUNS_TIMING'
+TIMING_ENABLED = os.environ.get(TIMING_ENV_VAR, '1') != '0'
+# set THOUSAND_SUNS_PROFILE to a directory to save a profile of every run (see profile_run), by the profiler of
+# THOUSAND_SUNS_PROFILER: cprofile (.prof files of pstats, the default) or pyinstrument (.html files)
+PROFILE_ENV_VAR = 'THOUSAND_SUNS_PROFILE'
+PROFILER_ENV_VAR = 'THOUSAND_SUNS_PROFILER'
+CPROFILE = 'cprofile'
+PYINSTRUMENT = 'pyinstrument'
+PYINSTRUMENT_INSTALLED = importlib.util.find_spec('pyinstrument') is not None
+
+# stages of a run, a stage never runs inside another one so their seconds add up
+LOAD_PROFILES = 'Loading profiles'
+PREDICT_DEMAND = 'Predicting demand'
+SOLAR_PRODUCTION = 'Solar production'
+STRATEGY = 'Strategy'
+CHECK_INVARIANTS = 'Sanity checks'
+COST = 'Cost'
+PLOT = 'Plotting'
+
+# the StageTimings the stages of the current thread (or task) are added to, None when they are not collected
+__current_timings = contextvars.ContextVar('stage_timings', default=None)
+
+
+class StageTimings:
+    """
+    Seconds and number of calls of every stage of a run (an annual simulation, an optimisation job), added to from the
+    threads of the run
+    """
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.started = time.perf_counter()  # restarted by collect
+        self.finished: Optional[float] = None
+        self.__lock = threading.Lock()
+
+    def add(self, stage_name: str, seconds: float, calls: int = 1) -> None:
+        with self.__lock:
+            self.seconds[stage_name] = self.seconds.get(stage_name, 0.0) + seconds
+            self.calls[stage_name] = self.calls.get(stage_name, 0) + calls
+
+    def merge(self, stages: Dict[str, Tuple[float, int]]) -> None:
+        """
+        :param stages: dictionary(stage -> (seconds, calls)) of as_dict, of the stages run by a worker process
+        """
+        for stage_name, (seconds, calls) in stages.items():
+            self.add(stage_name, seconds, calls)
+
+    def as_dict(self) -> Dict[str, Tuple[float, int]]:
+        """
+        :return: dictionary(stage -> (seconds, calls)) ordered by the seconds
+        """
+        with self.__lock:
+            return {stage_name: (self.seconds[stage_name], self.calls[stage_name])
+                    for stage_name in sorted(self.seconds, key=self.seconds.get, reverse=True)}
+
+    @property
+    def wall_seconds(self) -> float:
+        """
+        :return: float seconds since the run started, until it finished
+        """
+        return (self.finished if self.finished is not None else time.perf_counter()) - self.started
+
+
+@contextlib.contextmanager
+def collect(timings: Optional[StageTimings] = None):
+    """
+    Adds the stages run by the calling thread inside the with block to timings, the wall time of the run is the time
+    of the block. The threads started inside the block do not inherit it, the stages of the worker processes are added
+    with StageTimings.merge.
+
+    :param timings: StageTimings of the run, a new one if None
+    :return: context manager of the StageTimings
+    """
+    timings = StageTimings() if timings is None else timings
+    timings.started = time.perf_counter()
+    try:
+        with add_stages_to(timings):
+            yield timings
+    finally:
+        timings.finished = time.perf_counter()
+
+
+@contextlib.contextmanager
+def add_stages_to(timings: StageTimings):
+    """
+    Adds the stages run by the calling thread inside the with block to timings, without changing the wall time of its
+    run (for example the plotting of the results of a job by the thread of the web server)
+
+    :param timings: StageTimings of a run
+    """
+    token = __current_timings.set(timings)
+    try:
+        yield
+    finally:
+        __current_timings.reset(token)
+
+
+def get_current_timings() -> Optional[StageTimings]:
+    """
+    :return: StageTimings the stages of the calling thread are added to, None when they are not collected
+    """
+    return __current_timings.get()
+
+
+@contextlib.contextmanager
+def stage(stage_name: str):
+    """
+    Times the with block as a stage of the current run (see collect), does nothing outside of a run
+
+    :param stage_name: str name of the stage
+    """
+    timings = __current_timings.get() if TIMING_ENABLED else None
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(stage_name, time.perf_counter() - start)
+
+
+def timed(stage_name: str) -> Callable[[Callable], Callable]:
+    """
+    Decorator timing every call of a function as a stage of the current run (see stage), the function is returned
+    untouched when the timing is disabled
+
+    :param stage_name: str name of the stage
+    """
+    def decorator(func: Callable) -> Callable:
+        if not TIMING_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timings = __current_timings.get()
+            if timings is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings.add(stage_name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+@contextlib.contextmanager
+def profile_run(name: str):
+    """
+    Profiles the with block to a file named after the run in the directory of PROFILE_ENV_VAR, does nothing if it is
+    not set
+
+    :param name: str name of the run, part of the name of the file
+    """
+    directory = os.environ.get(PROFILE_ENV_VAR)
+    if not directory:
+        yield
+        return
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{re.sub(r'[^A-Za-z0-9_.-]', '_', name)}_{time.strftime('%Y%m%d-%H%M%S')}")
+    use_pyinstrument = os.environ.get(PROFILER_ENV_VAR, CPROFILE) == PYINSTRUMENT
+    if use_pyinstrument and not PYINSTRUMENT_INSTALLED:
+        logging.warning("pyinstrument is not installed, profiling with cProfile")
+    if use_pyinstrument and PYINSTRUMENT_INSTALLED:
+        import pyinstrument
+        profiler = pyinstrument.Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(path + '.html', 'w') as profile_file:
+                profile_file.write(profiler.output_html())
+            logging.info(f"profile of {name} saved to {path}.html")
+        return
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # a single cProfile runs at a time from python 3.12
+        logging.warning(f"{name} was not profiled, another run is being profiled")
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path + '.prof')
+        logging.info(f"profile of {name} saved to {path}.prof")
@@ -0,0 +1,211 @@
+import collections
+import functools
+import hashlib
+import logging
+import os
+import sys
+import threading
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from df_objects.df_objects import DemandDf, ProductionDf, ElectricityUseDf
+from hourly_simulation.parameters import Params, PHYSICAL_PARAMS
+from hourly_simulation.tariff_calendar import get_tariff_calendar
+
+# number of electricity uses kept in memory (a year is len(ElectricityUseDf.COLUMNS) * 8760 floats, ~0.6 MB)
+MAX_MEMORY_ENTRIES = 32
+# set THOUSAND_SUNS_USAGE_CACHE to a directory to keep the electricity uses on disk as well (one file per use), across
+# processes and restarts
+USAGE_CACHE_ENV_VAR = 'THOUSAND_SUNS_USAGE_CACHE'
+USAGE_CACHE_SUFFIX = '.npz'
+# the least recently used files are removed when the files of the directory pass this size
+MAX_DISK_BYTES = 512 * 1024 * 1024
+# bump when the key or the saved files change, the files of older versions are not used (the tariffs and the code of
+# the strategy are part of the key)
+USAGE_CACHE_VERSION = 2
+
+# counters of get_electricity_use (see get_stats)
+MEMORY_HITS = 'memory_hits'
+DISK_HITS = 'disk_hits'
+MISSES = 'misses'
+
+# key -> read-only np.ndarray(len(ElectricityUseDf.COLUMNS), hours), by recent use
+__memory = collections.OrderedDict()
+__stats = {MEMORY_HITS: 0, DISK_HITS: 0, MISSES: 0}
+__lock = threading.Lock()
+
+
+def get_key(demand: DemandDf, normalised_production: ProductionDf, params: Params, solar_panel_power_kw: float,
+            num_batteries: float, strategy: Callable, simulated_year: int) -> str:
+    """
+    Stable key of a simulated electricity use: the same in every process for the same inputs (the values of the
+    profiles, the tariffs of the demand year, the strategy by its name and its code and only the PHYSICAL_PARAMS of
+    the params)
+
+    :param demand: DemandDf of pd.DataFrame(columns=['HourOfYear', '$(Year)'])
+    :param normalised_production: ProductionDf of pd.DataFrame(columns=['HourOfYear', 'SolarProduction'])
+        between 0 and 1
+    :param params: namedtuple simulation params
+    :param solar_panel_power_kw: float power of solar panels Kwh
+    :param num_batteries: float number of batteries
+    :param strategy: function responsible for handling the cost
+    :param simulated_year: int year to simulate
+    :return: str hex digest
+    """
+    description = repr((USAGE_CACHE_VERSION, get_digest(demand.get_values()), demand.YearOfDemand,
+                        get_digest(normalised_production.get_values()),
+                        get_tariff_calendar(demand.YearOfDemand).digest,
+                        tuple(float(getattr(params, name)) for name in PHYSICAL_PARAMS), float(solar_panel_power_kw),
+                        float(num_batteries), f"{strategy.__module__}.{strategy.__qualname__}",
+                        get_code_digest(strategy), int(simulated_year)))
+    return hashlib.blake2b(description.encode(), digest_size=20).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def get_code_digest(strategy: Callable) -> str:
+    """
+    Digest of the code of a strategy: the bytecode and the constants of every function of its module (the strategy
+    and the kernels it calls), so the saved electricity uses are not used once the strategy is changed
+
+    :param strategy: function responsible for handling the cost
+    :return: str hex digest
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for name, value in sorted(vars(sys.modules[strategy.__module__]).items()):
+        function = getattr(value, 'py_func', value)  # the python function of a jit kernel
+        code = getattr(function, '__code__', None)
+        if code is None or getattr(function, '__module__', None) != strategy.__module__:
+            continue
+        # the nested code objects are functions of their own, the sets are sorted (their order changes by process)
+        constants = tuple(sorted(map(repr, constant)) if isinstance(constant, frozenset) else constant
+                          for constant in code.co_consts if not hasattr(constant, 'co_code'))
+        digest.update(repr((name, code.co_code, constants)).encode())
+    return digest.hexdigest()
+
+
+def get_digest(values: np.ndarray) -> str:
+    """
+    :param values: np.ndarray values of an input profile
+    :return: str hex digest of the values
+    """
+    return hashlib.blake2b(np.ascontiguousarray(values, dtype=np.float64).tobytes(), digest_size=16).hexdigest()
+
+
+def get_electricity_use(key: str, simulate: Callable[[], ElectricityUseDf]) -> ElectricityUseDf:
+    """
+    The electricity use of the key, from memory, from the disk or simulated (and saved to both). Safe to call from
+    many threads, a use simulated by two threads at once is simulated twice.
+
+    :param key: str key of the electricity use (see get_key)
+    :param simulate: function() -> ElectricityUseDf simulating the electricity use
+    :return: ElectricityUseDf a new copy for every call, free to overwrite
+    """
+    with __lock:
+        values = __memory.get(key)
+        if values is not None:
+            __memory.move_to_end(key)
+            __stats[MEMORY_HITS] += 1
+            return ElectricityUseDf(values.copy())
+    values = __load(key)
+    if values is not None:
+        counter = DISK_HITS
+    else:
+        counter = MISSES
+        values = simulate().values.copy()
+        __save(key, values)
+    values.setflags(write=False)
+    with __lock:
+        __stats[counter] += 1
+        __memory[key] = values
+        __memory.move_to_end(key)
+        while len(__memory) > MAX_MEMORY_ENTRIES:
+            __memory.popitem(last=False)
+    return ElectricityUseDf(values.copy())
+
+
+def get_stats() -> Dict[str, int]:
+    """
+    :return: dictionary(MEMORY_HITS, DISK_HITS, MISSES -> int number of calls of get_electricity_use) and the
+        number of uses in memory
+    """
+    with __lock:
+        return dict(__stats, entries=len(__memory))
+
+
+def clear_memory() -> None:
+    """
+    Forgets the electricity uses kept in memory and resets the counters, the files on the disk are kept
+    """
+    with __lock:
+        __memory.clear()
+        __stats.update({counter: 0 for counter in __stats})
+
+
+def get_cache_directory() -> Optional[str]:
+    """
+    :return: str directory of the files of the electricity uses, None when they are only kept in memory
+    """
+    return os.environ.get(USAGE_CACHE_ENV_VAR) or None
+
+
+def __load(key: str) -> Optional[np.ndarray]:
+    """
+    :return: np.ndarray saved electricity use of the key, None if there is no directory or the file is missing
+    """
+    directory = get_cache_directory()
+    if directory is None:
+        return None
+    path = os.path.join(directory, key + USAGE_CACHE_SUFFIX)
+    try:
+        with np.load(path, allow_pickle=False) as saved:
+            values = saved['values']
+        os.utime(path)  # recently used, evicted last
+        return values
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError):
+        logging.warning("Could not load the saved electricity use: " + path)
+        return None
+
+
+def __save(key: str, values: np.ndarray) -> None:
+    """
+    Saves the electricity use of the key to the directory and removes the least recently used files beyond
+    MAX_DISK_BYTES, a missing or read-only directory only logs a warning
+    """
+    directory = get_cache_directory()
+    if directory is None:
+        return
+    path = os.path.join(directory, key + USAGE_CACHE_SUFFIX)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp{USAGE_CACHE_SUFFIX}"
+    try:
+        os.makedirs(directory, exist_ok=True)
+        np.savez(temp_path, values=values)
+        os.replace(temp_path, path)  # atomic, other threads and processes never see a partial file
+        __evict(directory)
+    except OSError:
+        logging.warning("Could not save the electricity use: " + path)
+
+
+def __evict(directory: str) -> None:
+    """
+    Removes the least recently used files of the directory until they fit in MAX_DISK_BYTES
+    """
+    files = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(USAGE_CACHE_SUFFIX) and '.tmp' not in entry.name:
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:  # removed by an other process
+                continue
+            files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+    total_size = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total_size <= MAX_DISK_BYTES:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
@@ -1,13 +1,16 @@
 import copy
-from typing import Iterator
+import re
+import uuid
+from typing import Dict, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
 from df_objects.df_objects import SimulationResults, DemandDf
-from hourly_simulation.parameters import Params, get_simulation_parameters, PARAMS_PATH
-from hourly_simulation.shift_day_in_year import shift_day_of_year
+from hourly_simulation.parameters import get_params
+from hourly_simulation.timing import timed, PLOT
 
 GAS_USAGE = 'GasUsage'
 SOLAR_USAGE = 'SolarUsage'
@@ -93,11 +96,225 @@ BUY_SELL_PLOT_POSITION = (2, 1)
 USAGE_PRODUCTION_PLOT_POSITION = (3, 1)
 
 HOURS_IN_DAY = 24
+DAYS_IN_WEEK = 7
+
+# resolutions of the yearly graph from the finest, by the (average) hours of their periods
+HOURLY = 'Hourly'
+DAILY = 'Daily'
+WEEKLY = 'Weekly'
+MONTHLY = 'Monthly'
+RESOLUTION_HOURS = {HOURLY: 1, DAILY: HOURS_IN_DAY, WEEKLY: DAYS_IN_WEEK * HOURS_IN_DAY, MONTHLY: 730}
+RESOLUTION_UNITS = {HOURLY: 'kWh', DAILY: 'kWh per day', WEEKLY: 'kWh per week', MONTHLY: 'kWh per month'}
+RESOLUTION_HOVER_FORMATS = {HOURLY: '%b %d, %H:00', DAILY: '%b %d', WEEKLY: 'Week of %b %d', MONTHLY: '%B'}
+# the yearly graph is drawn in the finest resolution with at most this many periods in the visible range
+MAX_PERIODS = 400
+# the series summed over the periods of a resolution, in this order
+SUMMED_LABELS = USAGE_PRODUCTION_LABELS + BUY_SELL_LABELS + [USAGE_SUM]
+STORED_STATE_MIN = 'Lowest Batteries Charge'
+STORED_STATE_MIN_COLOR = '#4682B4'
+# the WebGL yearly graph (yearly_graph_gl_fig) draws at most this many buckets of the visible periods, every bucket by
+# the periods of the minimum and the maximum of the totals of the subplots (see get_sample_periods)
+MAX_BUCKETS = 400
+# buckets of the periods outside of the visible range of a zoomed graph, drawn only to be panned to
+CONTEXT_BUCKETS = 100
+# transparency of the series drawn with a fill pattern in yearly_graph_fig, WebGL traces have no fill patterns
+PATTERN_ALPHA = 0.5
+# keys of the relayoutData of a zoom or a reset of the shared x axes of the subplots
+RELAYOUT_RANGE = re.compile(r'xaxis\d*\.range(\[0\])?$')
+RELAYOUT_AUTORANGE = re.compile(r'xaxis\d*\.autorange$')
+
+
+class PeriodSeries:
+    """
+    The series of the yearly graph in a resolution: the energy of every period summed and the lowest and the highest
+    charge of the batteries in it
+    """
+
+    def __init__(self, resolution: str, starts: np.ndarray, sums: np.ndarray, stored_state_min: np.ndarray,
+                 stored_state_max: np.ndarray, time_ms: np.ndarray):
+        """
+        :param resolution: str resolution of RESOLUTION_HOURS
+        :param starts: np.ndarray of the first hour of every period
+        :param sums: np.ndarray(SUMMED_LABELS, periods) of the energy of every period [kWh]
+        :param stored_state_min: np.ndarray of the lowest charge of the batteries in every period [%]
+        :param stored_state_max: np.ndarray of the highest charge of the batteries in every period [%]
+        :param time_ms: np.ndarray of the hours of the year in milliseconds since the epoch
+        """
+        self.resolution = resolution
+        self.starts = starts
+        self.values = dict(zip(SUMMED_LABELS, sums))
+        self.values[STORED_STATE_MIN] = stored_state_min
+        self.values[STORED_STATE] = stored_state_max
+        # the tops of the stacked series of a subplot, stacked in the order of their labels
+        self.stacked = {label: top for labels in (USAGE_PRODUCTION_LABELS, BUY_SELL_LABELS)
+                        for label, top in zip(labels, np.cumsum([self.values[label] for label in labels], axis=0))}
+        self.time_ms = time_ms[starts]
+        # the totals of the subplots, the periods of their extremes are kept by the sampling
+        self.envelopes = np.stack([self.stacked[USAGE_PRODUCTION_LABELS[-1]], self.values[USAGE_SUM],
+                                   self.stacked[BUY_SELL_LABELS[-1]], stored_state_min, stored_state_max])
+
+    def get_periods(self, start: int, end: int) -> Tuple[int, int]:
+        """
+        :param start: int first hour of a range
+        :param end: int hour after the range
+        :return: Tuple of the first period and the period after the periods of the range
+        """
+        return int(np.searchsorted(self.starts, start, side='right')) - 1, int(np.searchsorted(self.starts, end))
+
+
+class YearlySeries:
+    """
+    The series of the yearly graph as numpy arrays, aggregated to every resolution once per simulation and sampled for
+    every zoom range by yearly_graph_gl_fig
+    """
+
+    def __init__(self, yearly_stats: pd.DataFrame, batteries_effective_cap: float, demand: DemandDf,
+                 simulated_year: Optional[int] = None):
+        """
+        :param yearly_stats: pd.DataFrame of ElectricityUseDf columns
+        :param batteries_effective_cap: float effective capacity of the batteries [Kwh]
+        :param demand: DemandDf of the simulated year
+        :param simulated_year: int year of the dates of the x axis, the year of the demand if None
+        """
+        self.values = {label: yearly_stats[label].to_numpy(dtype=np.float64)
+                       for label in USAGE_PRODUCTION_LABELS + BUY_SELL_LABELS}
+        if HIDE_BATTERY_EFFICIENCY_LOSS:
+            battery_efficiency = get_params().BATTERY_EFFICIENCY
+            self.values[SOLAR_LOST] = self.values[SOLAR_LOST] - \
+                self.values[SOLAR_STORED] / battery_efficiency * (1 - battery_efficiency)
+        self.values[USAGE_SUM] = demand.get_values()
+        self.values[STORED_STATE] = get_stored_state(yearly_stats, batteries_effective_cap)
+        self.hours = len(self.values[USAGE_SUM])
+        year = demand.YearOfDemand if simulated_year is None else simulated_year
+        self.time = np.datetime64(f"{int(year)}-01-01T00", 'h') + np.arange(self.hours)
+        # the x values sent to the graph, milliseconds since the epoch (a date axis) are sent as a binary array
+        self.time_ms = self.time.astype('datetime64[ms]').astype(np.float64)
+        # the zoom and the hidden series are kept while the graph of the same simulation is drawn again
+        self.revision = uuid.uuid4().hex
+        self.resolutions = self.__aggregate()
+
+    def __aggregate(self) -> Dict[str, PeriodSeries]:
+        """
+        Sums the hours to days and the days to weeks with reshape, and the days to calendar months with reduceat
+
+        :return: dictionary(resolution -> PeriodSeries)
+        """
+        hourly_sums = np.stack([self.values[label] for label in SUMMED_LABELS])
+        stored_state = self.values[STORED_STATE]
+        daily = sum_periods(hourly_sums, stored_state, stored_state, HOURS_IN_DAY)
+        weekly = sum_periods(*daily, DAYS_IN_WEEK)
+        day_starts = np.arange(len(daily[1])) * HOURS_IN_DAY
+        # the first day of every month, from the month of the start of every day
+        _, month_days = np.unique(self.time[np.minimum(day_starts, self.hours - 1)].astype('datetime64[M]'),
+                                  return_index=True)
+        monthly = (np.add.reduceat(daily[0], month_days, axis=1), np.minimum.reduceat(daily[1], month_days),
+                   np.maximum.reduceat(daily[2], month_days))
+        return {HOURLY: PeriodSeries(HOURLY, np.arange(self.hours), hourly_sums, stored_state, stored_state,
+                                     self.time_ms),
+                DAILY: PeriodSeries(DAILY, day_starts, *daily, self.time_ms),
+                WEEKLY: PeriodSeries(WEEKLY, day_starts[::DAYS_IN_WEEK], *weekly, self.time_ms),
+                MONTHLY: PeriodSeries(MONTHLY, day_starts[month_days], *monthly, self.time_ms)}
+
+    def get_hour(self, time) -> int:
+        """
+        :param time: str or datetime of the x axis
+        :return: int hour of the year of the time, clipped to the simulated hours
+        """
+        hour = (np.datetime64(pd.Timestamp(time).to_datetime64(), 'h') - self.time[0]).astype(int)
+        return int(np.clip(hour, 0, self.hours - 1))
+
+
+def sum_periods(sums: np.ndarray, minimum: np.ndarray, maximum: np.ndarray,
+                period_length: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Aggregates consecutive periods to periods period_length times longer, the last one is padded
+
+    :param sums: np.ndarray(series, periods) of the summed series
+    :param minimum: np.ndarray of the lowest value of every period
+    :param maximum: np.ndarray of the highest value of every period
+    :param period_length: int number of periods in an aggregated period
+    :return: Tuple of the sums, the minimum and the maximum of the aggregated periods
+    """
+    padding = -sums.shape[1] % period_length
+    return (np.pad(sums, ((0, 0), (0, padding))).reshape(len(sums), -1, period_length).sum(axis=2),
+            np.pad(minimum, (0, padding), mode='edge').reshape(-1, period_length).min(axis=1),
+            np.pad(maximum, (0, padding), mode='edge').reshape(-1, period_length).max(axis=1))
+
+
+def get_resolution(hours: int, max_periods: int = MAX_PERIODS) -> str:
+    """
+    :param hours: int number of visible hours
+    :param max_periods: int most periods drawn of the visible hours
+    :return: str finest resolution of RESOLUTION_HOURS with at most max_periods periods in the visible hours
+    """
+    return next((resolution for resolution, period_hours in RESOLUTION_HOURS.items()
+                 if hours / period_hours <= max_periods), MONTHLY)
+
+
+def get_stored_state(yearly_stats: pd.DataFrame, batteries_effective_cap: float) -> np.ndarray:
+    """
+    The charge of the batteries of every hour, as stored_state_stats with a cumulative sum
+
+    :return: np.ndarray of the charge in percents of batteries_effective_cap
+    """
+    if batteries_effective_cap == 0:
+        return np.zeros(len(yearly_stats.index))
+    difference = sum(yearly_stats[collector].to_numpy(dtype=np.float64) for collector in ENERGY_COLLECTORS) - \
+        sum(yearly_stats[consumer].to_numpy(dtype=np.float64) for consumer in STORED_CONSUMERS)
+    return normalize_battery(np.cumsum(difference), batteries_effective_cap)
+
+
+def get_sample_periods(envelopes: np.ndarray, start: int, end: int, max_buckets: int = MAX_BUCKETS) -> np.ndarray:
+    """
+    The periods drawn of a range: all of them if they are few, otherwise the range is split to max_buckets buckets of
+    periods and the periods of the minimum and the maximum of every envelope in every bucket are drawn, so the peaks
+    are kept at any zoom
+
+    :param envelopes: np.ndarray(envelopes, periods) series whose extremes are kept
+    :param start: int first period of the range
+    :param end: int period after the range
+    :param max_buckets: int number of buckets
+    :return: np.ndarray of the sorted periods to draw
+    """
+    if end - start <= 2 * max_buckets:
+        return np.arange(start, end)
+    bucket_periods = -(-(end - start) // max_buckets)
+    num_buckets = -(-(end - start) // bucket_periods)
+    # the last bucket is padded with its last period
+    visible = np.pad(envelopes[:, start:end], ((0, 0), (0, num_buckets * bucket_periods - (end - start))), mode='edge')
+    buckets = visible.reshape(len(envelopes), num_buckets, bucket_periods)
+    offsets = start + bucket_periods * np.arange(num_buckets)
+    extremes = np.concatenate([buckets.argmin(axis=2) + offsets, buckets.argmax(axis=2) + offsets], axis=None)
+    return np.unique(np.concatenate([[start, end - 1], np.minimum(extremes, end - 1)]))
+
+
+def get_relayout_hours(relayout_data: Optional[dict], series: YearlySeries) -> Optional[Tuple[int, int]]:
+    """
+    :param relayout_data: dictionary of the relayoutData of the yearly graph
+    :param series: YearlySeries of the graph
+    :return: Tuple of the first hour and the hour after the visible range, None if the x range was not changed
+    """
+    for key, value in (relayout_data or {}).items():
+        if RELAYOUT_AUTORANGE.match(key):
+            return 0, series.hours
+        if RELAYOUT_RANGE.match(key):
+            x_from, x_to = (value, relayout_data[key.replace('[0]', '[1]')]) if key.endswith('[0]') else value
+            return series.get_hour(x_from), series.get_hour(x_to) + 1
+    return None
+
+
+def __fill_color(label: str) -> str:
+    """
+    :return: str rgba fill color of a series, transparent for the series drawn with a fill pattern
+    """
+    red, green, blue = (int(COLORS[label][i: i + 2], 16) for i in (1, 3, 5))
+    return f"rgba({red},{green},{blue},{PATTERN_ALPHA if FILL_PATTERN.get(label) else OPACITY})"
 
 
 # todo: add docstring and docstring
+@timed(PLOT)
 def yearly_graph_fig(yearly_stats: pd.DataFrame,
-                     batteries_effecitive_cap, demand: DemandDf, demand_year,
+                     batteries_effecitive_cap, demand: DemandDf,
                      num_hours_to_sum=1):
     yearly_stats = copy.deepcopy(yearly_stats)
     x = []
@@ -105,7 +322,7 @@ def yearly_graph_fig(yearly_stats: pd.DataFrame,
         x.append(f"{(i // HOURS_IN_DAY) + 1} ({i % HOURS_IN_DAY + 1})")
         x.append(f"{(i // HOURS_IN_DAY) + 1} ({i % HOURS_IN_DAY + 1})")
 
-    wanted_simulation_params = Params(**get_simulation_parameters(PARAMS_PATH))
+    wanted_simulation_params = get_params()
     batter_eff = wanted_simulation_params.BATTERY_EFFICIENCY
     if HIDE_BATTERY_EFFICIENCY_LOSS:
         yearly_stats[SOLAR_LOST] -= yearly_stats[SOLAR_STORED] / batter_eff * (1 - batter_eff)
@@ -156,7 +373,7 @@ def yearly_graph_fig(yearly_stats: pd.DataFrame,
     )
 
     usage_sum_scatter = go.Scatter(
-        x=x, y=double_stat(shift_day_of_year(demand.df[demand.Demand], demand_year)),
+        x=x, y=double_stat(demand.df[demand.Demand].to_numpy()),
         name=NAMES[USAGE_SUM],
         marker_color=COLORS[USAGE_SUM],
         opacity=OPACITY,
@@ -198,6 +415,83 @@ def yearly_graph_fig(yearly_stats: pd.DataFrame,
     return fig
 
 
+@timed(PLOT)
+def yearly_graph_gl_fig(series: YearlySeries, hour_range: Optional[Tuple[int, int]] = None,
+                        resolution: Optional[str] = None, max_buckets: int = MAX_BUCKETS):
+    """
+    The yearly graph of yearly_graph_fig drawn with WebGL traces, in a resolution aggregated by YearlySeries: the
+    energy of every period is summed and the charge of the batteries is drawn by its highest and lowest value in the
+    period. Only the periods of the peaks of every bucket of the visible range are sent (see get_sample_periods). The
+    graph is drawn again for every zoom (see get_relayout_hours), the range outside of the visible one is drawn
+    coarsely so the graph can be panned.
+
+    :param series: YearlySeries of the simulation
+    :param hour_range: Tuple of the first hour and the hour after the visible range, the whole year if None
+    :param resolution: str resolution of RESOLUTION_HOURS, chosen by the length of the visible range if None (see
+        get_resolution)
+    :param max_buckets: int number of buckets drawn of the visible range
+    :return: plotly figure
+    """
+    start, end = hour_range if hour_range is not None else (0, series.hours)
+    resolution = get_resolution(end - start) if resolution is None else resolution
+    periods = series.resolutions[resolution]
+    shown = get_sample_periods(periods.envelopes, 0, len(periods.starts),
+                               max_buckets if hour_range is None else CONTEXT_BUCKETS)
+    if hour_range is not None:  # the visible range is drawn finely, the rest of the year coarsely
+        first, last = periods.get_periods(start, end)
+        shown = np.union1d(shown[(shown < first) | (shown >= last)],
+                           get_sample_periods(periods.envelopes, first, last, max_buckets))
+    x = periods.time_ms[shown]
+    unit = RESOLUTION_UNITS[resolution]
+
+    fig = make_subplots(rows=3, cols=1,
+                        shared_xaxes=True, row_heights=[0.2, 0.3, 0.5],
+                        vertical_spacing=0.01)
+    for labels, position in ((USAGE_PRODUCTION_LABELS, USAGE_PRODUCTION_PLOT_POSITION),
+                             (BUY_SELL_LABELS, BUY_SELL_PLOT_POSITION)):
+        fig.add_traces([go.Scattergl(x=x, y=periods.stacked[label][shown], customdata=periods.values[label][shown],
+                                     name=NAMES[label], fill='tozeroy' if index == 0 else 'tonexty',
+                                     fillcolor=__fill_color(label), mode=LINES,
+                                     line=dict(width=0, color=COLORS[label], shape='hv'),
+                                     hovertemplate='%{customdata:,.1f} ' + unit)
+                        for index, label in enumerate(labels)],
+                       rows=position[0], cols=position[1])
+    fig.add_trace(go.Scattergl(x=x, y=periods.values[USAGE_SUM][shown], name=NAMES[USAGE_SUM], mode=LINES,
+                               line=dict(width=THICK_WIDTH, color=COLORS[USAGE_SUM], dash=DASH, shape='hv'),
+                               hovertemplate='%{y:,.1f} ' + unit),
+                  row=USAGE_PRODUCTION_PLOT_POSITION[0], col=USAGE_PRODUCTION_PLOT_POSITION[1])
+    fig.add_trace(go.Scattergl(x=x, y=periods.values[STORED_STATE][shown], name=NAMES[STORED_STATE],
+                               legendgroup=STORED_STATE, fill='tozeroy', fillcolor=__fill_color(STORED_STATE),
+                               mode=LINES, line=dict(width=WIDTH, color=COLORS[STORED_STATE], shape='hv'),
+                               hovertemplate='%{y:.1f} %'),
+                  row=BATTERY_PLOT_POSITION[0], col=BATTERY_PLOT_POSITION[1])
+    # the lowest charge of the period, the same as the highest one in the hourly resolution
+    fig.add_trace(go.Scattergl(x=x, y=periods.values[STORED_STATE_MIN][shown], name=STORED_STATE_MIN,
+                               legendgroup=STORED_STATE, showlegend=False, mode=LINES,
+                               line=dict(width=WIDTH, color=STORED_STATE_MIN_COLOR, dash='dot', shape='hv'),
+                               hovertemplate='%{y:.1f} %', hoverinfo='skip' if resolution == HOURLY else None),
+                  row=BATTERY_PLOT_POSITION[0], col=BATTERY_PLOT_POSITION[1])
+
+    fig.update_xaxes(matches='x', type='date', hoverformat=RESOLUTION_HOVER_FORMATS[resolution])
+    if hour_range is not None:
+        fig.update_xaxes(range=[series.time[start], series.time[end - 1]])
+    fig.update_yaxes(title_text="percentage %",
+                     row=BATTERY_PLOT_POSITION[0],
+                     col=BATTERY_PLOT_POSITION[1]
+                     )
+    fig.update_yaxes(title_text=unit,
+                     row=BUY_SELL_PLOT_POSITION[0],
+                     col=BUY_SELL_PLOT_POSITION[1]
+                     )
+    fig.update_yaxes(title_text=unit,
+                     row=USAGE_PRODUCTION_PLOT_POSITION[0],
+                     col=USAGE_PRODUCTION_PLOT_POSITION[1]
+                     )
+    fig.update_layout(title=f'{resolution} Electricity Management', height=670, hovermode='x unified',
+                      uirevision=series.revision)
+    return fig
+
+
 def stored_state_stats(yearly_stats, batteries_effective_cap):
     if batteries_effective_cap == 0:
         return [0] * len(yearly_stats.index)
@@ -239,9 +533,8 @@ def double_stat(stat):
 
 
 def yearly_graph(yearly_stats: pd.DataFrame, batteries_num, batteries_cap,
-                 demand: DemandDf, demand_year, num_hours_to_sum=1):
-    yearly_graph_fig(yearly_stats, batteries_cap, demand,
-                     demand_year, num_hours_to_sum).show()
+                 demand: DemandDf, num_hours_to_sum=1):
+    yearly_graph_fig(yearly_stats, batteries_cap, demand, num_hours_to_sum).show()
 
 
 def daily_graph(daily_stats: pd.DataFrame):
@@ -278,26 +571,27 @@ def daily_graph(daily_stats: pd.DataFrame):
     fig.show()
 
 
-def simulation_graph(simulation_results: SimulationResults,
-                     solar_panel_power_it: Iterator,
-                     num_batteries_it: Iterator):
+@timed(PLOT)
+def simulation_graph(simulation_results: SimulationResults):
     """
-    Graphics of the whole simulation 3d graph + 2d contour of number of batteries and power of solar panels to scenario cost
+    Graphics of the whole simulation 3d graph + 2d contour of number of batteries and power of solar panels to scenario cost.
+    The axes are the simulated values, combinations which were not simulated (adaptive search) are left empty.
     :param simulation_results: SimulationResults of pd.DataFrame ['PowerSolar', 'NumBatteries', 'Cost']
-    :param solar_panel_power_it: iterator for different solar panels
-    :param num_batteries_it: iterator for different battery sizes
     :return: plotly figure :)
     """
 
-    z = simulation_results.df[simulation_results.Cost].to_numpy().reshape(
-        len(list(solar_panel_power_it)),
-        len(list(num_batteries_it)))
+    costs = simulation_results.df.pivot_table(index=simulation_results.PowerSolar,
+                                              columns=simulation_results.NumBatteries,
+                                              values=simulation_results.Cost)
+    z = costs.to_numpy()
+    solar_panel_power_it = costs.index.to_numpy() / 1000
+    num_batteries_it = costs.columns.to_numpy()
 
     fig = make_subplots(rows=1, cols=2,
                         specs=[[{'type': 'scatter'}, {'type': 'scene'}]])
 
     fig.add_traces(data=[
-        go.Contour(z=z, x=num_batteries_it, y=solar_panel_power_it,
+        go.Contour(z=z, x=num_batteries_it, y=solar_panel_power_it, connectgaps=True,
                    colorscale='Electric', showscale=False),
         go.Surface(x=num_batteries_it, y=solar_panel_power_it, z=z, opacity=.8,
                    colorscale='Electric',
@@ -0,0 +1,251 @@
+"""
+Headless runner of find optimum grid searches over many sites, strategies and years (see run_scenarios), without the
+Dash UI. The runs are listed in a json manifest, every run is expanded to the product of its demand profiles (paths or
+glob patterns), strategies and years:
+
+    {
+        "production": "data/simulation_production_profile/national_solar_production.csv",
+        "params": "data/parameters.csv",
+        "runs": [
+            {"demand": "data/simulation_demand_input/*.csv",
+             "strategy": ["Greedy Strategy", "Selling Strategy"],
+             "simulated_year": [2025, 2030],
+             "solar_panel_power_mw": [0, 20, 21],
+             "num_batteries": [0, 10, 11]}
+        ]
+    }
+
+The grids are [from, to, points] like the find optimum page, "production" and "params" may also be set per run.
+Every finished entry is written to its own .npz file in the output directory (the grid and its costs, the best
+combination and its yearly energy flows), so an interrupted sweep resumes by skipping the entries already written.
+An entry that fails is logged and skipped, the other entries still run (and it is run again when the sweep resumes).
+summary.csv of the output directory lists the best combination of every entry of the manifest, and the error of the
+entries that failed.
+
+usage (from the repository root): python -m scenario_evaluator.batch_sweep manifest.json output_dir [--processes N]
+"""
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from itertools import product
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from df_objects.df_objects import ElectricityUseDf, SimulationResults
+from hourly_simulation.parameters import Params, get_params, PARAMS_PATH
+from hourly_simulation.profile_store import load_demand, load_production
+from hourly_simulation.simulation import get_usage_profile
+from hourly_simulation.strategies import use_strategies
+from scenario_evaluator.run_senarios import run_scenarios
+
+# keys of a run of the manifest that may list many values, the entries are their product
+PRODUCT_KEYS = ('demand', 'strategy', 'simulated_year')
+GRID_KEYS = ('solar_panel_power_mw', 'num_batteries')
+ENTRY_SUFFIX = '.npz'
+SUMMARY_FILE = 'summary.csv'
+# column of summary.csv of the error of the entries that failed, empty for the entries that are done
+ERROR_COLUMN = 'error'
+# energy flows saved for the best combination of every entry, the totals of the simulated year
+ENERGY_FLOW_COLUMNS = ElectricityUseDf.COLUMNS[1:]
+
+
+def get_entries(manifest: Dict) -> List[Dict]:
+    """
+    Expands the runs of the manifest to entries of a single demand profile, strategy and year
+
+    :param manifest: dictionary of the manifest (see the module documentation)
+    :return: List of dictionaries of every entry, in the order of the manifest
+    """
+    entries = []
+    for run in manifest['runs']:
+        run = dict(run)
+        run.setdefault('production', manifest.get('production'))
+        run.setdefault('params', manifest.get('params', PARAMS_PATH))
+        if not run['production']:
+            raise ValueError("Every run needs a production profile")
+        values = {key: run[key] if isinstance(run[key], list) else [run[key]] for key in PRODUCT_KEYS}
+        values['demand'] = [path for pattern in values['demand'] for path in get_demand_paths(pattern)]
+        for strategy in values['strategy']:
+            if strategy not in use_strategies:
+                raise ValueError(f"Unknown strategy '{strategy}', one of: {', '.join(use_strategies)}")
+        for key in GRID_KEYS:
+            if not len(run[key]) == 3:
+                raise ValueError(f"{key} should be [from, to, points]")
+        for demand, strategy, simulated_year in product(*(values[key] for key in PRODUCT_KEYS)):
+            entries.append(dict(run, demand=demand, strategy=strategy, simulated_year=int(simulated_year)))
+    return entries
+
+
+def get_demand_paths(pattern: str) -> List[str]:
+    """
+    :param pattern: str path or glob pattern of demand profiles
+    :return: List of the sorted paths of the demand profiles, raises ValueError if there are none
+    """
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        raise ValueError(f"No demand profile matches '{pattern}'")
+    return paths
+
+
+def get_entry_id(entry: Dict, params: Params) -> str:
+    """
+    :param entry: dictionary of an entry
+    :param params: namedtuple simulation params of the entry
+    :return: str name of the file of the entry, changes with its inputs and parameter values
+    """
+    description = json.dumps({'entry': entry, 'params': params._asdict()}, sort_keys=True)
+    name = os.path.splitext(os.path.basename(entry['demand']))[0]
+    return f"{name}_{entry['simulated_year']}_{hashlib.blake2b(description.encode(), digest_size=8).hexdigest()}"
+
+
+def run_entry(entry: Dict) -> Dict[str, np.ndarray]:
+    """
+    Grid search of an entry and the energy flows of its best combination
+
+    :param entry: dictionary of an entry
+    :return: dictionary of the arrays saved for the entry
+    """
+    params = get_params(entry['params'])
+    demand = load_demand(entry['demand'])
+    normalised_production = load_production(entry['production'])
+    strategy = use_strategies[entry['strategy']]
+    power_from, power_to, power_points = entry['solar_panel_power_mw']
+    batteries_from, batteries_to, batteries_points = entry['num_batteries']
+    df_results, best_combination, _ = run_scenarios(
+        demand=demand, normalised_production=normalised_production, simulated_year=entry['simulated_year'],
+        solar_panel_power_it_kw=np.linspace(power_from * 1000, power_to * 1000, int(power_points)),
+        num_batteries_it=np.linspace(batteries_from, batteries_to, int(batteries_points)), strategy=strategy,
+        params=params, progress_bar=[], num_workers=1)
+    best_use = get_usage_profile(demand=demand, normalised_production=normalised_production, params=params,
+                                 solar_panel_power_kw=best_combination[SimulationResults.PowerSolar],
+                                 num_batteries=best_combination[SimulationResults.NumBatteries], strategy=strategy,
+                                 simulated_year=entry['simulated_year'])
+    return {SimulationResults.PowerSolar: df_results.df[SimulationResults.PowerSolar].to_numpy(),
+            SimulationResults.NumBatteries: df_results.df[SimulationResults.NumBatteries].to_numpy(),
+            SimulationResults.Cost: df_results.df[SimulationResults.Cost].to_numpy(),
+            'best': best_combination[[SimulationResults.PowerSolar, SimulationResults.NumBatteries,
+                                      SimulationResults.Cost]].to_numpy(dtype=np.float64),
+            'energy_flows': best_use.values[1:].sum(axis=1),
+            'entry': np.array(json.dumps(entry))}
+
+
+def run_indexed_entry(indexed_entry: Tuple[int, Dict]) -> Tuple[int, Optional[Dict[str, np.ndarray]], float,
+                                                                 Optional[str]]:
+    """
+    run_entry in a process of the pool, an entry that fails is logged with its traceback instead of stopping the sweep
+
+    :return: Tuple of the index of the entry, its arrays (None if it failed), the seconds it took and its error (None
+        if it is done)
+    """
+    start = time.perf_counter()
+    index, entry = indexed_entry
+    try:
+        return index, run_entry(entry), time.perf_counter() - start, None
+    except Exception as error:
+        logging.exception(f"Entry {index + 1} failed: {entry['demand']}, {entry['strategy']}, "
+                          f"{entry['simulated_year']}")
+        return index, None, time.perf_counter() - start, f"{type(error).__name__}: {error}"
+
+
+def save_entry(output_dir: str, entry_id: str, arrays: Dict[str, np.ndarray]) -> None:
+    """
+    Saves the arrays of an entry, atomically so an interrupted sweep never leaves a partial file
+    """
+    path = os.path.join(output_dir, entry_id + ENTRY_SUFFIX)
+    temp_path = path + '.tmp' + ENTRY_SUFFIX
+    np.savez(temp_path, **arrays)
+    os.replace(temp_path, path)
+
+
+def write_summary(output_dir: str, entries: List[Dict], entry_ids: List[str],
+                  errors: Optional[Dict[int, str]] = None) -> pd.DataFrame:
+    """
+    Writes summary.csv of the best combination and energy flows of the entries that are done, and of the error of the
+    entries that failed
+
+    :param errors: dictionary(index of a failed entry -> str error)
+    :return: pd.DataFrame of the summary
+    """
+    errors = errors or {}
+    rows = []
+    for index, (entry, entry_id) in enumerate(zip(entries, entry_ids)):
+        row = {'entry': entry_id, 'demand': entry['demand'], 'strategy': entry['strategy'],
+               'simulated_year': entry['simulated_year']}
+        path = os.path.join(output_dir, entry_id + ENTRY_SUFFIX)
+        if index in errors:
+            rows.append(dict(row, **{ERROR_COLUMN: errors[index]}))
+            continue
+        if not os.path.exists(path):
+            continue
+        with np.load(path) as saved:
+            best, energy_flows = saved['best'], saved['energy_flows']
+        rows.append(dict(row, **dict(zip((SimulationResults.PowerSolar, SimulationResults.NumBatteries,
+                                          SimulationResults.Cost), best)),
+                         **dict(zip(ENERGY_FLOW_COLUMNS, energy_flows)), **{ERROR_COLUMN: ''}))
+    summary = pd.DataFrame(rows)
+    summary.to_csv(os.path.join(output_dir, SUMMARY_FILE), index=False)
+    return summary
+
+
+def run_sweep(manifest_path: str, output_dir: str, processes: int = 1) -> pd.DataFrame:
+    """
+    Runs the entries of the manifest that are not in output_dir yet
+
+    :param manifest_path: str path of the json manifest
+    :param output_dir: str directory of the results
+    :param processes: int number of entries run together, 1 runs them in the calling process
+    :return: pd.DataFrame of the summary of the entries that are done or failed
+    """
+    with open(manifest_path) as manifest_file:
+        entries = get_entries(json.load(manifest_file))
+    entry_ids = [get_entry_id(entry, get_params(entry['params'])) for entry in entries]
+    os.makedirs(output_dir, exist_ok=True)
+    todo = [(index, entry) for index, entry in enumerate(entries)
+            if not os.path.exists(os.path.join(output_dir, entry_ids[index] + ENTRY_SUFFIX))]
+    print(f"{len(entries) - len(todo)} of {len(entries)} entries are done, running {len(todo)}", flush=True)
+
+    errors = {}
+
+    def on_entry_done(index: int, arrays: Optional[Dict[str, np.ndarray]], seconds: float, error: Optional[str]):
+        if error is not None:
+            errors[index] = error
+            print(f"[{index + 1}/{len(entries)}] {entry_ids[index]}: failed, {error} ({seconds:.1f}s)", flush=True)
+            return
+        save_entry(output_dir, entry_ids[index], arrays)
+        power, batteries, cost = arrays['best']
+        print(f"[{index + 1}/{len(entries)}] {entry_ids[index]}: {power / 1000:g} Mw, {batteries:g} batteries, "
+              f"cost {cost:,.0f} ({seconds:.1f}s)", flush=True)
+
+    if processes > 1 and len(todo) > 1:
+        with multiprocessing.Pool(processes=min(processes, len(todo))) as pool:
+            for result in pool.imap_unordered(run_indexed_entry, todo, chunksize=1):
+                on_entry_done(*result)
+    else:
+        for indexed_entry in todo:
+            on_entry_done(*run_indexed_entry(indexed_entry))
+    return write_summary(output_dir, entries, entry_ids, errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('manifest', help='json manifest of the runs')
+    parser.add_argument('output_dir', help='directory of the results, the entries already in it are skipped')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help='entries run together')
+    args = parser.parse_args()
+    summary = run_sweep(args.manifest, args.output_dir, args.processes)
+    failed = int((summary[ERROR_COLUMN] != '').sum()) if len(summary) else 0
+    print(f"{len(summary) - failed} entries done, {failed} failed, summary: "
+          f"{os.path.join(args.output_dir, SUMMARY_FILE)}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+import logging
+from typing import Callable, List, Optional
+
+import numpy as np
+
+# maximal estimated error of the interpolated lifetime cost of a scenario, relative to the sum of its absolute yearly
+# costs (see lifetime_cost)
+MAX_RELATIVE_ERROR = 1e-3
+# relative error of the linear interpolation of the first and last years under which the yearly cost of a scenario is
+# linear in the demand (for example without solar panels, the gas usage is the demand)
+LINEAR_RELATIVE_ERROR = 1e-9
+
+
+def lifetime_cost(cost_in_year: Callable[[int, np.ndarray], np.ndarray], years: int, num_scenarios: int,
+                  growth_per_year: float, max_relative_error: float = MAX_RELATIVE_ERROR, exact: bool = False,
+                  on_progress: Optional[Callable[[int], None]] = None) -> np.ndarray:
+    """
+    Sums the yearly cost of scenarios over the years of the facility.
+    Between the years only the demand changes (scaled by growth_per_year ** year), so the yearly cost of a scenario is
+    a function of the demand scale. Instead of simulating every year, the cost is interpolated from anchor years which
+    are refined level by level: the first and last years (linear), then the middle year (quadratic), then the middle of
+    every range (piecewise quadratic) and so on. The error of a level is estimated by the anchors the next level adds:
+    the larger of the mean error of the interpolated cost of these years times the number of interpolated years, and
+    the change of the lifetime cost between the two levels. When it is within max_relative_error of the sum of the
+    absolute yearly costs, the lifetime cost of the next level is taken. The linear level is only taken for scenarios
+    linear in the demand (within LINEAR_RELATIVE_ERROR), as a single middle year may fall on the line by chance: these
+    scenarios take 3 simulated years and the others at least 5. Only the scenarios which are not done are simulated in
+    the next level, the last level simulates every year.
+
+    :param cost_in_year: function(year index from 0, np.ndarray indexes of scenarios) -> np.ndarray of the cost of these
+        scenarios in that year
+    :param years: int number of years to sum
+    :param num_scenarios: int number of scenarios
+    :param growth_per_year: float ratio of the demand growth every year
+    :param max_relative_error: float maximal estimated error of the lifetime cost relative to the sum of the absolute
+        yearly costs
+    :param exact: bool simulate every year (no interpolation), for validation
+    :param on_progress: function(number of scenario years) called when scenario years are simulated or interpolated
+    :return: np.ndarray total cost of every scenario over the years
+    """
+    years = int(years)
+    yearly_cost = np.full((years, num_scenarios), np.nan)
+    simulated_years = 0
+
+    def simulate(year_indexes: List[int], scenarios: np.ndarray) -> None:
+        nonlocal simulated_years
+        for year in year_indexes:
+            yearly_cost[year, scenarios] = cost_in_year(year, scenarios)
+            simulated_years += len(scenarios)
+            if on_progress:
+                on_progress(len(scenarios))
+
+    all_scenarios = np.arange(num_scenarios)
+    levels = get_anchor_levels(years)
+    if exact or len(levels) == 1:
+        simulate(list(range(years)), all_scenarios)
+        return yearly_cost.sum(axis=0)
+
+    demand_scale = growth_per_year ** np.arange(years, dtype=np.float64)
+    total_cost = np.zeros(num_scenarios)
+    scenarios = all_scenarios
+    simulate(levels[0], scenarios)
+    for level, (anchors, next_anchors) in enumerate(zip(levels, levels[1:])):
+        added_anchors = [year for year in next_anchors if year not in anchors]
+        simulate(added_anchors, scenarios)
+        if len(next_anchors) == years:  # every year is simulated
+            total_cost[scenarios] = yearly_cost[:, scenarios].sum(axis=0)
+            break
+        cost = yearly_cost[:, scenarios]
+        interpolated = interpolate_yearly_cost(cost[anchors], demand_scale, anchors)
+        next_estimation = interpolate_lifetime_cost(cost[next_anchors], demand_scale, next_anchors)
+        error = np.maximum(np.abs(interpolated[added_anchors] - cost[added_anchors]).mean(axis=0) *
+                           (years - len(anchors)), np.abs(next_estimation - interpolated.sum(axis=0)))
+        absolute_cost = years * np.abs(cost[next_anchors]).mean(axis=0)
+        done = error <= (LINEAR_RELATIVE_ERROR if level == 0 else max_relative_error) * absolute_cost
+        total_cost[scenarios[done]] = next_estimation[done]
+        if on_progress:
+            on_progress(int(done.sum()) * (years - len(next_anchors)))
+        scenarios = scenarios[~done]
+        if len(scenarios) == 0:
+            break
+    logging.info(f"lifetime cost: simulated {simulated_years} of {years * num_scenarios} scenario years")
+    return total_cost
+
+
+def get_anchor_levels(years: int) -> List[List[int]]:
+    """
+    The anchor years of the refinement levels, every level contains the anchors of the previous levels and the last
+    level contains every year
+
+    :param years: int number of years
+    :return: List of sorted lists of year indexes
+    """
+    levels = [[0, years - 1]] if years > 1 else []
+    num_anchors = 3
+    while not levels or len(levels[-1]) < years:
+        anchors = sorted(set(int(year) for year in np.round(np.linspace(0, years - 1, num_anchors))))
+        levels.append(anchors if len(anchors) < years else list(range(years)))
+        num_anchors = 2 * num_anchors - 1
+    return levels
+
+
+def interpolate_lifetime_cost(anchors_cost: np.ndarray, demand_scale: np.ndarray, anchors: List[int]) -> np.ndarray:
+    """
+    Sums the yearly cost interpolated from the anchor years (see interpolate_yearly_cost)
+
+    :param anchors_cost: np.ndarray(anchors, scenarios) the cost of the anchor years
+    :param demand_scale: np.ndarray the demand scale of every year
+    :param anchors: sorted list of the anchor year indexes, from the first year to the last one
+    :return: np.ndarray(scenarios) the interpolated lifetime cost
+    """
+    return interpolate_yearly_cost(anchors_cost, demand_scale, anchors).sum(axis=0)
+
+
+def interpolate_yearly_cost(anchors_cost: np.ndarray, demand_scale: np.ndarray, anchors: List[int]) -> np.ndarray:
+    """
+    The yearly cost interpolated from the anchor years by the demand scale of every year.
+    The interpolation is linear for two anchors, otherwise quadratic on consecutive triples of anchors (a last pair of
+    anchors is interpolated linearly).
+
+    :param anchors_cost: np.ndarray(anchors, scenarios) the cost of the anchor years
+    :param demand_scale: np.ndarray the demand scale of every year
+    :param anchors: sorted list of the anchor year indexes, from the first year to the last one
+    :return: np.ndarray(years, scenarios) the interpolated cost of every year
+    """
+    yearly_cost = np.zeros((len(demand_scale), anchors_cost.shape[1]))
+    segment_start = 0
+    while segment_start < len(anchors) - 1:
+        segment = anchors[segment_start: segment_start + 3]
+        # the first anchor of a segment is interpolated by the previous segment
+        first_year = segment[0] if segment_start == 0 else segment[0] + 1
+        scale = demand_scale[first_year: segment[-1] + 1]
+        points = demand_scale[segment]
+        # lagrange interpolation on the anchors of the segment
+        basis = np.ones((len(segment), len(scale)))
+        for index in range(len(segment)):
+            for other in range(len(segment)):
+                if other != index:
+                    basis[index] *= (scale - points[other]) / (points[index] - points[other])
+        yearly_cost[first_year: segment[-1] + 1] = basis.T @ anchors_cost[segment_start: segment_start + len(segment)]
+        segment_start += len(segment) - 1
+    return yearly_cost
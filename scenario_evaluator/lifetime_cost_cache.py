@@ -0,0 +1,86 @@
+import collections
+import threading
+from typing import Callable, Tuple
+
+import numpy as np
+
+from df_objects.df_objects import DemandDf, ProductionDf
+from hourly_simulation.parameters import Params, PHYSICAL_PARAMS
+from hourly_simulation.tariff_calendar import get_tariff_calendar
+from hourly_simulation.usage_cache import get_digest
+
+# parameters of the key of a search: the ones that change the electricity use of the years (PHYSICAL_PARAMS) and the
+# number of years summed. The other parameters (capex, opex, loans, profit) only change the facility costs of
+# calculate_cost, so the lifetime electricity cost of a combination is reused when only they change.
+LIFETIME_PARAMS = PHYSICAL_PARAMS + ('YEARS_TO_SIMULATE',)
+# number of searches kept (inputs, strategy and physical parameters), the least recently used is evicted
+MAX_CACHED_SEARCHES = 8
+
+# search key -> dictionary((solar panel power kw, number of batteries) -> lifetime electricity cost), by recent use
+__lifetime_costs = collections.OrderedDict()
+__lifetime_costs_lock = threading.Lock()
+
+
+def get_search_key(demand: DemandDf, normalised_production: ProductionDf, simulated_year: int, strategy: Callable,
+                   params: Params, max_relative_error: float, exact: bool) -> Tuple:
+    """
+    The key of the lifetime electricity costs of a search: everything the simulated electricity use and its
+    electricity cost depend on, including the tariffs (see TariffCalendar.digest)
+
+    :param demand: DemandDf of pd.DataFrame(columns=['HourOfYear', '$(Year)'])
+    :param normalised_production: ProductionDf of pd.DataFrame(columns=['HourOfYear', 'SolarProduction'])
+        between 0 and 1
+    :param simulated_year: int year to simulate
+    :param strategy: function responsible for handling the cost
+    :param params: namedtuple simulation params, only LIFETIME_PARAMS are part of the key
+    :param max_relative_error: float maximal relative error of the interpolated lifetime cost of a combination
+    :param exact: bool simulate every year
+    :return: hashable Tuple
+    """
+    return (get_digest(demand.get_values()), demand.YearOfDemand, get_digest(normalised_production.get_values()),
+            get_tariff_calendar(demand.YearOfDemand).digest, simulated_year, strategy,
+            tuple(float(getattr(params, name)) for name in LIFETIME_PARAMS), max_relative_error, exact)
+
+
+def get_lifetime_costs(key: Tuple, solar_panel_power_kw: np.ndarray, num_batteries: np.ndarray) -> np.ndarray:
+    """
+    :param key: Tuple search key (see get_search_key)
+    :param solar_panel_power_kw: np.ndarray solar panel power of every combination in kw
+    :param num_batteries: np.ndarray number of batteries of every combination
+    :return: np.ndarray saved lifetime electricity cost of every combination, np.nan for the combinations not saved
+    """
+    with __lifetime_costs_lock:
+        if key not in __lifetime_costs:
+            return np.full(len(solar_panel_power_kw), np.nan)
+        __lifetime_costs.move_to_end(key)
+        costs = __lifetime_costs[key]
+        return np.array([costs.get(combination, np.nan) for combination in zip(solar_panel_power_kw.tolist(),
+                                                                                 num_batteries.tolist())])
+
+
+def save_lifetime_costs(key: Tuple, solar_panel_power_kw: np.ndarray, num_batteries: np.ndarray,
+                        lifetime_electricity_cost: np.ndarray) -> None:
+    """
+    Saves the lifetime electricity costs of combinations of a search, evicts the least recently used search beyond
+    MAX_CACHED_SEARCHES
+
+    :param key: Tuple search key (see get_search_key)
+    :param solar_panel_power_kw: np.ndarray solar panel power of every combination in kw
+    :param num_batteries: np.ndarray number of batteries of every combination
+    :param lifetime_electricity_cost: np.ndarray lifetime electricity cost of every combination
+    """
+    with __lifetime_costs_lock:
+        costs = __lifetime_costs.setdefault(key, {})
+        costs.update(zip(zip(solar_panel_power_kw.tolist(), num_batteries.tolist()),
+                         lifetime_electricity_cost.tolist()))
+        __lifetime_costs.move_to_end(key)
+        while len(__lifetime_costs) > MAX_CACHED_SEARCHES:
+            __lifetime_costs.popitem(last=False)
+
+
+def clear() -> None:
+    """
+    Forgets the lifetime electricity costs of all the searches
+    """
+    with __lifetime_costs_lock:
+        __lifetime_costs.clear()
@@ -0,0 +1,208 @@
+import collections
+import logging
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Optional, Any, Tuple
+
+import pandas as pd
+
+from df_objects.df_objects import SimulationResults
+from hourly_simulation import timing
+
+# optimisations running at the same time, the others wait in the queue
+MAX_RUNNING_JOBS = 2
+# optimisations waiting or running, submitting more raises JobQueueFull until one finishes
+MAX_PENDING_JOBS = 8
+# finished optimisations kept for their results, the oldest is forgotten
+MAX_FINISHED_JOBS = 32
+
+# states of a job
+QUEUED = "Queued"
+RUNNING = "Running"
+DONE = "Done"
+FAILED = "Failed"
+CANCELLED = "Cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobQueueFull(Exception):
+    """
+    Raised when submitting a job while MAX_PENDING_JOBS jobs are waiting or running
+    """
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a running job by its progress (see JobProgress) after the job was cancelled
+    """
+
+
+class JobProgress(list):
+    """
+    The progress_bar list of the searches (see run_scenarios and search_optimum): keeps only the latest fraction done
+    and stops the search at its next update once the job is cancelled
+    """
+
+    def __init__(self):
+        super().__init__([0])
+        self.cancelled = threading.Event()
+
+    def append(self, fraction_done: float) -> None:
+        if self.cancelled.is_set():
+            raise JobCancelled()
+        self[:] = [fraction_done]
+
+    @property
+    def fraction_done(self) -> float:
+        return self[-1]
+
+
+class OptimumJob:
+    """
+    An optimisation submitted to the OptimumJobQueue, polled by its job_id. The combinations are added to its partial
+    results as soon as their cost is known (the on_results of the searches), with the best combination so far.
+    The time of its stages is added to its timings while it runs (see timing.collect), the run is profiled when
+    timing.PROFILE_ENV_VAR is set.
+    """
+
+    def __init__(self, run_search: Callable, arguments: dict):
+        """
+        :param run_search: function of the search (run_scenarios or search_optimum)
+        :param arguments: dictionary of the arguments of the search, without progress_bar
+        """
+        self.job_id = uuid.uuid4().hex
+        self.state = QUEUED
+        self.progress = JobProgress()
+        self.result = None
+        self.error: Optional[str] = None
+        self.params = arguments['params']  # to describe the result
+        self.future: Optional[Future] = None
+        self.timings = timing.StageTimings()
+        self.__partial_results = []  # pd.DataFrame of every on_results
+        self.__best_combination: Optional[pd.Series] = None
+        self.__results_lock = threading.Lock()
+        self.__run_search = run_search
+        self.__arguments = arguments
+
+    def run(self) -> Any:
+        """
+        Runs the search in the calling thread, the result (or the error) is kept by the job
+        """
+        if self.progress.cancelled.is_set():
+            self.state = CANCELLED
+            return None
+        self.state = RUNNING
+        try:
+            with timing.collect(self.timings), timing.profile_run(f"optimum_job_{self.job_id}"):
+                self.result = self.__run_search(progress_bar=self.progress, on_results=self.add_results,
+                                                **self.__arguments)
+            self.state = DONE
+        except JobCancelled:
+            logging.info(f"optimisation job {self.job_id} was cancelled")
+            self.state = CANCELLED
+        except Exception as e:
+            logging.error(traceback.format_exc())
+            self.error = str(e)
+            self.state = FAILED
+        finally:
+            self.__arguments = None  # the inputs are not needed anymore
+        return self.result
+
+    def add_results(self, simulation_results: SimulationResults) -> None:
+        """
+        :param simulation_results: SimulationResults of combinations whose cost became known
+        """
+        if simulation_results.df.empty:
+            return
+        best = simulation_results.df.loc[simulation_results.df[SimulationResults.Cost].idxmin()]
+        with self.__results_lock:
+            self.__partial_results.append(simulation_results.df)
+            if self.__best_combination is None or \
+                    best[SimulationResults.Cost] < self.__best_combination[SimulationResults.Cost]:
+                self.__best_combination = best
+
+    def get_partial_results(self) -> Tuple[Optional[SimulationResults], Optional[pd.Series], int]:
+        """
+        :return: Tuple of (SimulationResults of the combinations whose cost is known so far, the best of them, their
+            number), (None, None, 0) before the first results
+        """
+        with self.__results_lock:
+            if not self.__partial_results:
+                return None, None, 0
+            df = pd.concat(self.__partial_results, ignore_index=True)
+            self.__partial_results = [df]
+            return SimulationResults(df), self.__best_combination, len(df)
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+
+class OptimumJobQueue:
+    """
+    Runs the optimisations of the find optimum page in its own threads, so the threads of the web server only submit
+    and poll them. The queue is bounded: at most max_running jobs run together and submitting beyond max_pending jobs
+    waiting or running raises JobQueueFull.
+    """
+
+    def __init__(self, max_running: int = MAX_RUNNING_JOBS, max_pending: int = MAX_PENDING_JOBS,
+                 max_finished: int = MAX_FINISHED_JOBS):
+        """
+        :param max_running: int number of jobs running together
+        :param max_pending: int number of jobs waiting or running
+        :param max_finished: int number of finished jobs kept for their results
+        """
+        self.max_running = max_running
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self.__executor = ThreadPoolExecutor(max_workers=max_running, thread_name_prefix="optimum_job")
+        self.__jobs = collections.OrderedDict()  # job_id -> OptimumJob, by submission
+        self.__lock = threading.Lock()
+
+    def submit(self, run_search: Callable, arguments: dict) -> str:
+        """
+        :param run_search: function of the search (run_scenarios or search_optimum)
+        :param arguments: dictionary of the arguments of the search, without progress_bar
+        :return: str job_id of the new job
+        """
+        job = OptimumJob(run_search, arguments)
+        with self.__lock:
+            if sum(not queued.finished for queued in self.__jobs.values()) >= self.max_pending:
+                raise JobQueueFull(f"{self.max_pending} optimisations are already waiting or running")
+            self.__jobs[job.job_id] = job
+            self.__forget_finished()
+            job.future = self.__executor.submit(job.run)
+        return job.job_id
+
+    def get_job(self, job_id: Optional[str]) -> Optional[OptimumJob]:
+        """
+        :param job_id: str id of a submitted job
+        :return: OptimumJob, None if the job_id is unknown or forgotten
+        """
+        with self.__lock:
+            return self.__jobs.get(job_id)
+
+    def cancel(self, job_id: Optional[str]) -> bool:
+        """
+        Cancels a job: a waiting job never starts, a running job stops at its next progress update
+
+        :param job_id: str id of a submitted job
+        :return: bool True if the job was waiting or running
+        """
+        job = self.get_job(job_id)
+        if job is None or job.finished:
+            return False
+        job.progress.cancelled.set()
+        if job.future.cancel():
+            job.state = CANCELLED
+        return True
+
+    def __forget_finished(self) -> None:
+        """
+        Forgets the oldest finished jobs beyond max_finished, called with the lock held
+        """
+        finished = [job_id for job_id, job in self.__jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.__jobs[job_id]
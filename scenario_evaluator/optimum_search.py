@@ -0,0 +1,142 @@
+import logging
+import math
+from typing import Tuple, Callable, List, Dict
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from df_objects.df_objects import DemandDf, ProductionDf, SimulationResults
+from hourly_simulation.parameters import Params
+from scenario_evaluator.lifetime_cost import MAX_RELATIVE_ERROR
+from scenario_evaluator.run_senarios import simulate_combinations, check_reached_edges_of_iterator, \
+    get_simulation_results, worker_pool, BATCH_SIZE, NUM_WORKERS
+
+# maximal number of evaluated combinations before the search stops without reaching the tolerance
+MAX_EVALUATIONS = 60
+# decimals of the combinations, so a combination reached from different directions is evaluated once
+COMBINATION_DECIMALS = 6
+# directions of the neighbours of a combination (solar panel power, number of batteries), the diagonals follow the
+# valley of the cost where more solar panels need more batteries
+NEIGHBOUR_DIRECTIONS = [np.array([power, batteries]) for power in (-1, 0, 1) for batteries in (-1, 0, 1)
+                        if power or batteries]
+
+
+def search_optimum(demand: DemandDf, normalised_production: ProductionDf, simulated_year: int,
+                   solar_panel_power_range_kw: Tuple[float, float], num_batteries_range: Tuple[float, float],
+                   solar_panel_power_tolerance_kw: float, num_batteries_tolerance: float, strategy: Callable,
+                   params: Params, progress_bar: List[float], max_evaluations: int = MAX_EVALUATIONS,
+                   batch_size: int = BATCH_SIZE, max_relative_error: float = MAX_RELATIVE_ERROR, exact: bool = False,
+                   num_workers: int = NUM_WORKERS,
+                   on_results: Callable[[SimulationResults], None] = None) -> Tuple[SimulationResults, pd.DataFrame,
+                                                                                     Tuple[bool, str]]:
+    """
+    Adaptive search of the optimal solar panel and battery combination, instead of simulating a whole grid.
+    A coarse 3x3 grid of the ranges is simulated, then the search refines around the best combination: its 8 neighbours
+    (the 3x3 grid around it, one step on every axis) are simulated, moving to a better neighbour or halving the steps
+    when there is none. A neighbour outside of the ranges expands them, so an optimum on the edge of the ranges is
+    followed (down to zero). The search stops when no neighbour is better and the steps are within the tolerances, or
+    after max_evaluations combinations.
+    Every round of combinations is simulated together (see simulate_combinations), by the same worker processes.
+
+    :param demand: DemandDf of pd.DataFrame(columns=['HourOfYear', '$(Year)'])
+    :param normalised_production: ProductionDf of pd.DataFrame(columns=['HourOfYear', 'SolarProduction'])
+        between 0 and 1
+    :param simulated_year: int year to simulate
+    :param solar_panel_power_range_kw: Tuple(from, to) initial range of the solar panels power in kw
+    :param num_batteries_range: Tuple(from, to) initial range of the number of batteries
+    :param solar_panel_power_tolerance_kw: float step of the solar panels power (kw) to stop at
+    :param num_batteries_tolerance: float step of the number of batteries to stop at
+    :param strategy: function responsible for handling the cost
+    :param params: namedtuple simulation params
+    :param progress_bar: List reference used to update callee on percentage done.
+    :param max_evaluations: int maximal number of simulated combinations
+    :param batch_size: int number of combinations simulated together
+    :param max_relative_error: float maximal relative error of the interpolated lifetime cost of a combination
+    :param exact: bool simulate every year, for validation
+    :param num_workers: int number of processes, 1 simulates in the calling process
+    :param on_results: function(SimulationResults of the combinations whose cost became known) called as soon as
+        their lifetime cost is known
+    :return: Tuple of (SimulationResults of the evaluated combinations, the best combination, Tuple[is reached bounds?,
+        String status of optimal combination in bounds])
+    """
+    lower = np.array([min(solar_panel_power_range_kw), min(num_batteries_range)], dtype=np.float64)
+    upper = np.array([max(solar_panel_power_range_kw), max(num_batteries_range)], dtype=np.float64)
+    tolerance = np.array([solar_panel_power_tolerance_kw, num_batteries_tolerance], dtype=np.float64)
+    if np.any(lower < 0) or np.any(tolerance <= 0):
+        raise ValueError("The ranges must be non-negative and the tolerances positive")
+    step = np.maximum((upper - lower) / 2, tolerance)
+    # the progress is estimated by the coarse grid and 8 neighbours for every halving of the steps
+    halvings = max(0, math.ceil(max(np.log2(step / tolerance))))
+    total_simulations = min(9 + 8 * halvings, max_evaluations) * params.YEARS_TO_SIMULATE
+    evaluated: Dict[Tuple[float, float], float] = {}
+    converged = False
+    counter = [0]
+
+    with tqdm(total=total_simulations) as progress, \
+            worker_pool(num_workers, demand, normalised_production, simulated_year, strategy, params,
+                        max_relative_error, exact) as pool:
+        def on_progress(scenario_years: int):
+            counter[0] += scenario_years
+            progress.update(scenario_years)
+            progress_bar.append(min(counter[0] / total_simulations, 1))
+
+        def on_combination_results(power_kw: np.ndarray, batteries: np.ndarray, cost: np.ndarray):
+            on_results(get_simulation_results(power_kw, batteries, cost))
+
+        def evaluate(combinations: List[Tuple[float, float]]) -> None:
+            new = list(dict.fromkeys(combination for combination in combinations if combination not in evaluated))
+            new = new[:max_evaluations - len(evaluated)]
+            if not new:
+                return
+            solar_panel_power_kw, num_batteries = np.array(new, dtype=np.float64).T
+            total_cost = simulate_combinations(demand, normalised_production, simulated_year, solar_panel_power_kw,
+                                               num_batteries, strategy, params, on_progress=on_progress,
+                                               batch_size=batch_size, max_relative_error=max_relative_error,
+                                               exact=exact, num_workers=num_workers,
+                                               on_results=on_combination_results if on_results else None, pool=pool)
+            evaluated.update(zip(new, total_cost))
+
+        evaluate([get_combination(power, batteries)
+                  for power in np.linspace(lower[0], upper[0], 3) for batteries in np.linspace(lower[1], upper[1], 3)])
+        best = min(evaluated, key=evaluated.get)
+        while len(evaluated) < max_evaluations:
+            neighbours = [get_combination(*np.maximum(np.array(best) + direction * step, 0))
+                          for direction in NEIGHBOUR_DIRECTIONS]
+            evaluate(neighbours)
+            best_neighbour = min((neighbour for neighbour in neighbours if neighbour in evaluated),
+                                 key=evaluated.get, default=best)
+            if evaluated[best_neighbour] < evaluated[best]:
+                best = best_neighbour
+            elif np.any(step > tolerance):
+                step = np.maximum(step / 2, tolerance)
+            else:
+                converged = True
+                break
+        progress_bar.append(1)
+
+    logging.info(f"search optimum: evaluated {len(evaluated)} combinations")
+    df_results = get_simulation_results(np.array([combination[0] for combination in evaluated]),
+                                        np.array([combination[1] for combination in evaluated]),
+                                        np.array(list(evaluated.values())))
+    optimal_scenario = df_results.df.loc[df_results.df[df_results.Cost].idxmin()]
+    in_bounds = check_reached_edges_of_iterator(solar_panel_power_it_kw=df_results.df[df_results.PowerSolar],
+                                                num_batteries_it=df_results.df[df_results.NumBatteries],
+                                                optimal_power=optimal_scenario[df_results.PowerSolar],
+                                                optimal_num_batteries=optimal_scenario[df_results.NumBatteries])
+    if not converged:
+        msg = f"Stopped after {max_evaluations} combinations before reaching the tolerance"
+        logging.warning(msg)
+        in_bounds = True, (in_bounds[1] + '\n' if in_bounds[0] else '') + msg
+    return df_results, optimal_scenario, in_bounds
+
+
+def get_combination(solar_panel_power_kw: float, num_batteries: float) -> Tuple[float, float]:
+    """
+    Rounded combination, used as the key of the evaluated combinations
+
+    :param solar_panel_power_kw: float solar panel power in kw
+    :param num_batteries: float number of batteries
+    :return: Tuple(solar panel power in kw, number of batteries)
+    """
+    return round(float(solar_panel_power_kw), COMBINATION_DECIMALS), round(float(num_batteries), COMBINATION_DECIMALS)
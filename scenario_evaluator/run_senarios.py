@@ -1,13 +1,35 @@
+import contextlib
 import logging
-from typing import Iterator, Tuple, Callable, List
+import math
+import multiprocessing
+from typing import Iterator, Tuple, Callable, List, Optional
 
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
 from df_objects.df_objects import DemandDf, ProductionDf, SimulationResults
+from hourly_simulation.cost_evaluator import get_facility_costs
+from hourly_simulation import jit, timing
 from hourly_simulation.parameters import Params
 from hourly_simulation.predict_demand import predict_demand_in_year
-from hourly_simulation.simulation import simulate_use
+from hourly_simulation.simulation import simulate_electricity_cost_batch
+from scenario_evaluator import lifetime_cost_cache
+from scenario_evaluator.lifetime_cost import lifetime_cost, MAX_RELATIVE_ERROR
+
+# number of scenarios simulated together, bounds the memory of the batched strategies
+BATCH_SIZE = 64
+# number of processes simulating the batches, 1 simulates in the calling process
+NUM_WORKERS = 1
+# seconds between progress updates while the worker processes are simulating
+PROGRESS_POLL_SECONDS = 0.2
+# start method of the worker processes. The pools are created from the threads of the server and of the jobs, a forked
+# worker would inherit the locks (of the profile store and the caches) held by the other threads at the fork, and block
+# on them. The forkserver forks the workers from a process of a single thread which imported this module once.
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# inputs shared by all the batches of a worker process, set once by __init_worker
+__worker_inputs = {}
 
 
 def check_reached_edges_of_iterator(solar_panel_power_it_kw: Iterator, num_batteries_it: Iterator,
@@ -43,11 +65,258 @@ def check_reached_edges_of_iterator(solar_panel_power_it_kw: Iterator, num_batte
     return True, results
 
 
+def batch_lifetime_cost(demand: DemandDf, normalised_production: ProductionDf, simulated_year: int,
+                        solar_panel_power_kw: np.ndarray, num_batteries: np.ndarray, strategy: Callable,
+                        params: Params, max_relative_error: float = MAX_RELATIVE_ERROR, exact: bool = False,
+                        on_progress: Callable[[int], None] = None) -> np.ndarray:
+    """
+    Lifetime electricity cost of a batch of solar panel and battery combinations (the cost of the electricity bought
+    minus the income of the electricity sold, summed over the years), without the facility costs
+
+    :param demand: DemandDf of pd.DataFrame(columns=['HourOfYear', '$(Year)'])
+    :param normalised_production: ProductionDf of pd.DataFrame(columns=['HourOfYear', 'SolarProduction'])
+        between 0 and 1
+    :param simulated_year: int year to simulate
+    :param solar_panel_power_kw: np.ndarray solar panel power of every combination in kw
+    :param num_batteries: np.ndarray number of batteries of every combination
+    :param strategy: function responsible for handling the cost
+    :param params: namedtuple simulation params
+    :param max_relative_error: float maximal relative error of the interpolated lifetime cost of a combination
+    :param exact: bool simulate every year, for validation
+    :param on_progress: function(number of scenario years) called on progress
+    :return: np.ndarray lifetime electricity cost of every combination
+    """
+    def cost_in_year(year: int, scenarios: np.ndarray) -> np.ndarray:
+        return simulate_electricity_cost_batch(
+            demand=predict_demand_in_year(demand, params, demand.YearOfDemand + year),
+            normalised_production=normalised_production,
+            params=params,
+            solar_panel_power_kw=solar_panel_power_kw[scenarios],
+            num_batteries=num_batteries[scenarios],
+            strategy=strategy,
+            simulated_year=simulated_year)
+
+    return lifetime_cost(cost_in_year, params.YEARS_TO_SIMULATE, len(solar_panel_power_kw), params.GROWTH_PER_YEAR,
+                         max_relative_error=max_relative_error, exact=exact, on_progress=on_progress)
+
+
+def __init_worker(demand: DemandDf, normalised_production: ProductionDf, simulated_year: int, strategy: Callable,
+                  params: Params, max_relative_error: float, exact: bool, counter) -> None:
+    """
+    Keeps the inputs shared by all the batches in the worker process, so they are sent once per worker and not with
+    every batch
+
+    :param counter: multiprocessing.Value of the scenario years done by all the workers
+    """
+    __worker_inputs.update(demand=demand, normalised_production=normalised_production, simulated_year=simulated_year,
+                           strategy=strategy, params=params, max_relative_error=max_relative_error, exact=exact)
+    __worker_inputs['counter'] = counter
+
+
+def __worker_batch_lifetime_cost(batch: Tuple[int, np.ndarray, np.ndarray]) -> Tuple[int, np.ndarray, dict]:
+    """
+    Lifetime electricity cost of a batch in a worker process
+
+    :param batch: Tuple of the index of the batch, the solar panel power (kw) and the number of batteries of its
+        combinations
+    :return: Tuple of the index of the batch, np.ndarray lifetime electricity cost of every combination and the stages
+        of the batch (see StageTimings.as_dict)
+    """
+    counter = __worker_inputs['counter']
+
+    def on_progress(scenario_years: int):
+        with counter.get_lock():
+            counter.value += scenario_years
+
+    inputs = {key: value for key, value in __worker_inputs.items() if key != 'counter'}
+    with timing.collect() as timings:
+        batch_cost = batch_lifetime_cost(solar_panel_power_kw=batch[1], num_batteries=batch[2],
+                                         on_progress=on_progress, **inputs)
+    return batch[0], batch_cost, timings.as_dict()
+
+
+class WorkerPool:
+    """
+    Pool of processes simulating the batches of a search (see worker_pool), reused by all the rounds of the search
+    """
+
+    def __init__(self, pool, counter, num_workers: int):
+        """
+        :param pool: multiprocessing.pool.Pool of the workers
+        :param counter: multiprocessing.Value of the scenario years done by all the workers
+        :param num_workers: int number of processes
+        """
+        self.pool = pool
+        self.counter = counter
+        self.num_workers = num_workers
+        self.reported = 0
+
+    def take_progress(self) -> int:
+        """
+        :return: int number of scenario years done by the workers since the last call
+        """
+        done = self.counter.value
+        progress, self.reported = done - self.reported, done
+        return progress
+
+
+@contextlib.contextmanager
+def worker_pool(num_workers: int, demand: DemandDf, normalised_production: ProductionDf, simulated_year: int,
+                strategy: Callable, params: Params, max_relative_error: float = MAX_RELATIVE_ERROR,
+                exact: bool = False):
+    """
+    Starts num_workers processes (see START_METHOD) for the batches of a search, the inputs of the search are sent
+    once to every worker and only the combinations of a batch are sent with it. The processes are stopped at the end
+    of the with block.
+
+    :param num_workers: int number of processes
+    :return: context manager of the WorkerPool, None if num_workers <= 1 (the batches are simulated by the caller)
+    """
+    if num_workers <= 1:
+        yield None
+        return
+    context = multiprocessing.get_context(START_METHOD)
+    if START_METHOD == 'forkserver':  # the workers are forked with the main module and the simulation imported once
+        context.set_forkserver_preload(['__main__', __name__] + (['numba'] if jit.JIT_ENABLED else []))
+    counter = context.Value('q', 0)
+    with context.Pool(processes=num_workers, initializer=__init_worker,
+                      initargs=(demand, normalised_production, simulated_year, strategy, params, max_relative_error,
+                                exact, counter)) as pool:
+        yield WorkerPool(pool, counter, num_workers)
+
+
+def simulate_combinations(demand: DemandDf, normalised_production: ProductionDf, simulated_year: int,
+                          solar_panel_power_kw: np.ndarray, num_batteries: np.ndarray, strategy: Callable,
+                          params: Params, on_progress: Callable[[int], None] = None, batch_size: int = BATCH_SIZE,
+                          max_relative_error: float = MAX_RELATIVE_ERROR, exact: bool = False,
+                          num_workers: int = NUM_WORKERS,
+                          on_results: Callable[[np.ndarray, np.ndarray, np.ndarray], None] = None,
+                          pool: Optional[WorkerPool] = None) -> np.ndarray:
+    """
+    Lifetime cost of solar panel and battery combinations, batch_size combinations are simulated together.
+    With num_workers > 1 the batches are simulated by a pool of processes (see worker_pool), the demand, production and
+    params are sent once to every worker (the electricity cost profiles are loaded by the worker itself) and only the
+    combinations of a batch are sent with it. A search simulating many rounds of combinations passes the pool it
+    started for all of them.
+    The lifetime electricity cost of the combinations is saved by the physical parameters (see lifetime_cost_cache),
+    the facility costs are added to it for the params. When only the economic parameters change, the combinations
+    simulated before are repriced without simulating them again.
+    The costs are passed to on_results as soon as they are known: the saved ones first, then every simulated batch.
+
+    :param demand: DemandDf of pd.DataFrame(columns=['HourOfYear', '$(Year)'])
+    :param normalised_production: ProductionDf of pd.DataFrame(columns=['HourOfYear', 'SolarProduction'])
+        between 0 and 1
+    :param simulated_year: int year to simulate
+    :param solar_panel_power_kw: np.ndarray solar panel power of every combination in kw
+    :param num_batteries: np.ndarray number of batteries of every combination
+    :param strategy: function responsible for handling the cost
+    :param params: namedtuple simulation params
+    :param on_progress: function(number of scenario years) called on progress
+    :param batch_size: int number of combinations simulated together
+    :param max_relative_error: float maximal relative error of the interpolated lifetime cost of a combination
+    :param exact: bool simulate every year, for validation
+    :param num_workers: int number of processes, 1 simulates in the calling process
+    :param on_results: function(solar panel power kw, number of batteries, lifetime cost) of the combinations whose
+        lifetime cost became known
+    :param pool: WorkerPool started with the same inputs (see worker_pool) simulating the batches instead of
+        num_workers new processes
+    :return: np.ndarray lifetime cost of every combination
+    """
+    solar_panel_power_kw = np.asarray(solar_panel_power_kw, dtype=np.float64)
+    num_batteries = np.asarray(num_batteries, dtype=np.float64)
+    key = lifetime_cost_cache.get_search_key(demand, normalised_production, simulated_year, strategy, params,
+                                             max_relative_error, exact)
+    facility_costs = int(params.YEARS_TO_SIMULATE) * np.sum(
+        get_facility_costs(params, battery_capacity=params.BATTERY_CAPACITY * num_batteries,
+                           solar_panel_power_kw=solar_panel_power_kw), axis=0)
+    electricity_cost = lifetime_cost_cache.get_lifetime_costs(key, solar_panel_power_kw, num_batteries)
+    missing = np.flatnonzero(np.isnan(electricity_cost))
+    if len(missing) < len(electricity_cost):
+        saved = np.flatnonzero(~np.isnan(electricity_cost))
+        if on_progress:
+            on_progress(len(saved) * int(params.YEARS_TO_SIMULATE))
+        if on_results:
+            on_results(solar_panel_power_kw[saved], num_batteries[saved],
+                       electricity_cost[saved] + facility_costs[saved])
+
+    def on_batch(batch: slice, batch_cost: np.ndarray):
+        combinations = missing[batch]
+        electricity_cost[combinations] = batch_cost
+        # saved by batch, so the batches done before a cancelled search are not simulated again
+        lifetime_cost_cache.save_lifetime_costs(key, solar_panel_power_kw[combinations], num_batteries[combinations],
+                                                batch_cost)
+        if on_results:
+            on_results(solar_panel_power_kw[combinations], num_batteries[combinations],
+                       batch_cost + facility_costs[combinations])
+
+    if len(missing) > 0:
+        __simulate_electricity_cost(demand, normalised_production, simulated_year, solar_panel_power_kw[missing],
+                                    num_batteries[missing], strategy, params, on_progress, batch_size,
+                                    max_relative_error, exact, num_workers, on_batch, pool)
+    return electricity_cost + facility_costs
+
+
+def __simulate_electricity_cost(demand: DemandDf, normalised_production: ProductionDf, simulated_year: int,
+                                solar_panel_power_kw: np.ndarray, num_batteries: np.ndarray, strategy: Callable,
+                                params: Params, on_progress: Callable[[int], None], batch_size: int,
+                                max_relative_error: float, exact: bool, num_workers: int,
+                                on_batch: Callable[[slice, np.ndarray], None], pool: Optional[WorkerPool]) -> None:
+    """
+    Lifetime electricity cost of the combinations, simulated by batches (see simulate_combinations)
+
+    :param on_batch: function(slice of the combinations of a batch, np.ndarray lifetime electricity cost of every
+        combination of the batch) called when a batch is done, in the order the batches finish
+    """
+    if pool is None and num_workers > 1:
+        with worker_pool(num_workers, demand, normalised_production, simulated_year, strategy, params,
+                         max_relative_error, exact) as pool:
+            __simulate_electricity_cost(demand, normalised_production, simulated_year, solar_panel_power_kw,
+                                        num_batteries, strategy, params, on_progress, batch_size, max_relative_error,
+                                        exact, num_workers, on_batch, pool)
+        return
+    num_combinations = len(solar_panel_power_kw)
+    if pool is not None:  # smaller batches so every worker gets some
+        batch_size = max(1, min(batch_size, math.ceil(num_combinations / pool.num_workers)))
+    batches = [slice(batch_start, batch_start + batch_size) for batch_start in range(0, num_combinations, batch_size)]
+    if pool is not None:
+        timings = timing.get_current_timings()  # the stages of the workers are added to the run of the caller
+        results = pool.pool.imap_unordered(__worker_batch_lifetime_cost,
+                                           [(index, solar_panel_power_kw[batch], num_batteries[batch])
+                                            for index, batch in enumerate(batches)], chunksize=1)
+        remaining = len(batches)
+        while remaining:
+            try:
+                index, batch_cost, batch_stages = results.next(PROGRESS_POLL_SECONDS)
+            except multiprocessing.TimeoutError:
+                index = None
+            progress = pool.take_progress()
+            if on_progress and progress > 0:
+                on_progress(progress)
+            if index is not None:
+                remaining -= 1
+                if timings is not None:
+                    timings.merge(batch_stages)
+                on_batch(batches[index], batch_cost)
+    else:
+        for batch in batches:
+            on_batch(batch, batch_lifetime_cost(demand, normalised_production, simulated_year,
+                                                solar_panel_power_kw[batch], num_batteries[batch], strategy, params,
+                                                max_relative_error=max_relative_error, exact=exact,
+                                                on_progress=on_progress))
+
+
 def run_scenarios(demand: DemandDf, normalised_production: ProductionDf, simulated_year: int,
                   solar_panel_power_it_kw: Iterator, num_batteries_it: Iterator, strategy: Callable, params: Params,
-                  progress_bar: List[float]) -> Tuple[SimulationResults, pd.DataFrame, Tuple[bool, str]]:
+                  progress_bar: List[float], batch_size: int = BATCH_SIZE,
+                  max_relative_error: float = MAX_RELATIVE_ERROR, exact: bool = False,
+                  num_workers: int = NUM_WORKERS,
+                  on_results: Callable[[SimulationResults], None] = None) -> Tuple[SimulationResults, pd.DataFrame,
+                                                                                    Tuple[bool, str]]:
     """
-    Run the simulation of various solar panel and battery combinations
+    Run the simulation of various solar panel and battery combinations (see simulate_combinations).
+    The cost of most of the years is interpolated from a few simulated years (see lifetime_cost).
+    The grid is simulated from coarse to fine (see get_refinement_levels), so the first results passed to on_results
+    already cover the whole ranges and the later ones refine them.
 
     :param demand: DemandDf of pd.DataFrame(columns=['HourOfYear', '$(Year)'])
     :param normalised_production: ProductionDf of pd.DataFrame(columns=['HourOfYear', 'SolarProduction'])
@@ -58,33 +327,75 @@ def run_scenarios(demand: DemandDf, normalised_production: ProductionDf, simulat
     :param strategy: function responsible for handling the cost
     :param params: namedtuple simulation params
     :param progress_bar: List reference used to update callee on percentage done.
+    :param batch_size: int number of combinations simulated together
+    :param max_relative_error: float maximal relative error of the interpolated lifetime cost of a combination
+    :param exact: bool simulate every year, for validation
+    :param num_workers: int number of processes, 1 simulates in the calling process
+    :param on_results: function(SimulationResults of the combinations whose cost became known) called as soon as
+        their lifetime cost is known
     :return: Tuple of the best combination of (number of solar panels, size of battery)
     """
-    simulation_results = {SimulationResults.PowerSolar: [], SimulationResults.NumBatteries: [],
-                          SimulationResults.Cost: []}
-    counter = 0
-    total_simulations = sum(1 for _ in solar_panel_power_it_kw) * sum(
-        1 for _ in num_batteries_it) * params.YEARS_TO_SIMULATE
-    for solar_panel_power_kw in tqdm(solar_panel_power_it_kw):
-        for num_batteries in num_batteries_it:
-            total_cost = 0
-            for year in range(int(params.YEARS_TO_SIMULATE)):
-                total_cost += simulate_use(demand=predict_demand_in_year(demand, params, demand.YearOfDemand + year),
-                                           normalised_production=normalised_production,
-                                           params=params,
-                                           solar_panel_power_kw=solar_panel_power_kw,
-                                           num_batteries=num_batteries,
-                                           strategy=strategy,
-                                           simulated_year=simulated_year)
-                counter += 1
-                progress_bar.append(counter / total_simulations)
-            simulation_results[SimulationResults.PowerSolar].append(solar_panel_power_kw)
-            simulation_results[SimulationResults.NumBatteries].append(num_batteries)
-            simulation_results[SimulationResults.Cost].append(total_cost)
-    df_results = SimulationResults(pd.DataFrame.from_dict(simulation_results))
+    solar_panel_power_it_kw = np.array(list(solar_panel_power_it_kw), dtype=np.float64)
+    num_batteries_it = np.array(list(num_batteries_it), dtype=np.float64)
+    solar_panel_power_kw, num_batteries = np.meshgrid(solar_panel_power_it_kw, num_batteries_it, indexing='ij')
+    solar_panel_power_kw, num_batteries = solar_panel_power_kw.ravel(), num_batteries.ravel()
+    levels = np.maximum.outer(get_refinement_levels(len(solar_panel_power_it_kw)),
+                              get_refinement_levels(len(num_batteries_it))).ravel()
+    order = np.argsort(levels, kind='stable')
+    total_simulations = len(solar_panel_power_kw) * params.YEARS_TO_SIMULATE
+    counter = [0]
+    with tqdm(total=total_simulations) as progress:
+        def on_progress(scenario_years: int):
+            counter[0] += scenario_years
+            progress.update(scenario_years)
+            progress_bar.append(counter[0] / total_simulations)
+
+        def on_combination_results(power_kw: np.ndarray, batteries: np.ndarray, cost: np.ndarray):
+            on_results(get_simulation_results(power_kw, batteries, cost))
+
+        total_cost = np.empty(len(solar_panel_power_kw))
+        total_cost[order] = simulate_combinations(demand, normalised_production, simulated_year,
+                                                  solar_panel_power_kw[order], num_batteries[order], strategy, params,
+                                                  on_progress=on_progress, batch_size=batch_size,
+                                                  max_relative_error=max_relative_error, exact=exact,
+                                                  num_workers=num_workers,
+                                                  on_results=on_combination_results if on_results else None)
+    df_results = get_simulation_results(solar_panel_power_kw, num_batteries, total_cost)
     optimal_scenario = df_results.df.loc[df_results.df[df_results.Cost].idxmin()]
     in_bounds = check_reached_edges_of_iterator(solar_panel_power_it_kw=solar_panel_power_it_kw,
                                                 num_batteries_it=num_batteries_it,
                                                 optimal_power=optimal_scenario[df_results.PowerSolar],
                                                 optimal_num_batteries=optimal_scenario[df_results.NumBatteries])
     return df_results, optimal_scenario, in_bounds
+
+
+def get_simulation_results(solar_panel_power_kw: np.ndarray, num_batteries: np.ndarray,
+                           total_cost: np.ndarray) -> SimulationResults:
+    """
+    :param solar_panel_power_kw: np.ndarray solar panel power of every combination in kw
+    :param num_batteries: np.ndarray number of batteries of every combination
+    :param total_cost: np.ndarray lifetime cost of every combination
+    :return: SimulationResults of pd.DataFrame ['PowerSolar', 'NumBatteries', 'Cost']
+    """
+    simulation_results = {SimulationResults.PowerSolar: solar_panel_power_kw,
+                          SimulationResults.NumBatteries: num_batteries,
+                          SimulationResults.Cost: total_cost}
+    return SimulationResults(pd.DataFrame.from_dict(simulation_results))
+
+
+def get_refinement_levels(num_points: int) -> np.ndarray:
+    """
+    Refinement level of every point of a grid: level 0 are the first and last points (and every power of 2 step between
+    them), every next level halves the step, so the points up to a level are an evenly spread coarser grid
+
+    :param num_points: int number of points of the grid
+    :return: np.ndarray level of every point
+    """
+    indexes = np.arange(num_points)
+    levels = np.full(num_points, -1)
+    step, level = 1 << max(0, (num_points - 1).bit_length() - 1), 0  # largest power of 2 up to the last index
+    while step >= 1:
+        levels[(levels < 0) & (indexes % step == 0)] = level
+        step, level = step // 2, level + 1
+    levels[-1:] = 0
+    return levels
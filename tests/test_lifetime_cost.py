@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from hourly_simulation.parameters import get_params
+from hourly_simulation.predict_demand import predict_demand_in_year
+from hourly_simulation.profile_store import load_demand, load_production
+from hourly_simulation.simulation import simulate_electricity_cost_batch
+from hourly_simulation.strategies import use_strategies
+from scenario_evaluator.lifetime_cost import lifetime_cost, MAX_RELATIVE_ERROR
+
+DEMAND_PATH = 'data/simulation_demand_input/consumption_data1.csv'
+PRODUCTION_PATH = 'data/simulation_production_profile/national_solar_production.csv'
+SIMULATED_YEAR = 2030
+# the small grid, solar panel power [kw] and number of batteries as [from, to, points]
+SOLAR_PANEL_POWER_KW = (0, 40000, 3)
+NUM_BATTERIES = (0, 10, 3)
+
+
+@pytest.mark.parametrize('strategy_name', ['Greedy Strategy', 'Selling Strategy'])
+def test_interpolated_lifetime_cost_is_within_max_relative_error(strategy_name):
+    params = get_params()
+    demand = load_demand(DEMAND_PATH)
+    normalised_production = load_production(PRODUCTION_PATH)
+    solar_panel_power_kw, num_batteries = (grid.ravel() for grid in np.meshgrid(np.linspace(*SOLAR_PANEL_POWER_KW),
+                                                                                 np.linspace(*NUM_BATTERIES)))
+    years = int(params.YEARS_TO_SIMULATE)
+    yearly_cost = np.full((years, len(solar_panel_power_kw)), np.nan)
+
+    def cost_in_year(year: int, scenarios: np.ndarray) -> np.ndarray:
+        missing = scenarios[np.isnan(yearly_cost[year, scenarios])]
+        if len(missing) > 0:
+            yearly_cost[year, missing] = simulate_electricity_cost_batch(
+                demand=predict_demand_in_year(demand, params, demand.YearOfDemand + year),
+                normalised_production=normalised_production, params=params,
+                solar_panel_power_kw=solar_panel_power_kw[missing], num_batteries=num_batteries[missing],
+                strategy=use_strategies[strategy_name], simulated_year=SIMULATED_YEAR)
+        return yearly_cost[year, scenarios]
+
+    exact_cost = lifetime_cost(cost_in_year, years, len(solar_panel_power_kw), params.GROWTH_PER_YEAR, exact=True)
+    interpolated_cost = lifetime_cost(cost_in_year, years, len(solar_panel_power_kw), params.GROWTH_PER_YEAR)
+    assert np.all(np.abs(interpolated_cost - exact_cost) <= MAX_RELATIVE_ERROR * np.abs(yearly_cost).sum(axis=0))
+
+
+def test_linear_cost_is_interpolated_from_three_years():
+    demand_scale = 1.028 ** np.arange(25)
+    yearly_cost = np.outer(3 + 2 * demand_scale, [1., -1.])
+    simulated_years = []
+
+    def cost_in_year(year: int, scenarios: np.ndarray) -> np.ndarray:
+        simulated_years.append(year)
+        return yearly_cost[year, scenarios]
+
+    total_cost = lifetime_cost(cost_in_year, len(demand_scale), 2, 1.028)
+    assert np.allclose(total_cost, yearly_cost.sum(axis=0))
+    assert len(simulated_years) == 3
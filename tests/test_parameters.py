@@ -0,0 +1,12 @@
+import pytest
+
+from hourly_simulation.parameters import get_params, get_data_path, PARAMS_PATH
+
+
+def test_parameters_csv_must_match_param_names(tmp_path):
+    with open(get_data_path(PARAMS_PATH)) as params_file:
+        rows = [row for row in params_file.read().splitlines() if not row.startswith('LOAN_LENGTH,')]
+    csv_path = tmp_path / 'parameters.csv'
+    csv_path.write_text('\n'.join(rows + ['NEW_PARAM,1,ratio']) + '\n')
+    with pytest.raises(ValueError, match='missing: LOAN_LENGTH, unknown: NEW_PARAM'):
+        get_params(str(csv_path))
@@ -0,0 +1,41 @@
+import pytest
+
+from df_objects.df_objects import ElectricityUseDf
+
+from hourly_simulation.parameters import get_params
+from hourly_simulation.predict_demand import predict_demand_in_year
+from hourly_simulation.profile_store import load_demand, load_production
+from hourly_simulation.simulation import get_usage_profile, get_solar_production_profile
+from hourly_simulation.strategies import use_strategies
+from tests.sanity_checks import test_simulation as check_simulation
+
+DEMAND_PATH = 'data/simulation_demand_input/consumption_data1.csv'
+PRODUCTION_PATH = 'data/simulation_production_profile/national_solar_production.csv'
+SIMULATED_YEAR = 2025
+# solar panel power [kw] and number of batteries of the checked scenarios
+SCENARIOS = [(6000, 3), (20000, 10), (3000, 0)]
+
+
+@pytest.mark.parametrize('solar_panel_power_kw, num_batteries', SCENARIOS)
+@pytest.mark.parametrize('strategy_name', list(use_strategies))
+def test_strategy_passes_sanity_checks(strategy_name, solar_panel_power_kw, num_batteries):
+    params = get_params()
+    demand = load_demand(DEMAND_PATH)
+    normalised_production = load_production(PRODUCTION_PATH)
+    electricity_use = get_usage_profile(demand, normalised_production, params, solar_panel_power_kw, num_batteries,
+                                        use_strategies[strategy_name], SIMULATED_YEAR)
+    check_simulation(electricity_use, predict_demand_in_year(demand, params, SIMULATED_YEAR),
+                     get_solar_production_profile(normalised_production, solar_panel_power_kw, params), params,
+                     num_batteries)
+
+
+def test_dp_dispatch_uses_batteries_slower_than_a_step():
+    # 0.1% of the capacity an hour, less than a step of the default state of charge grid
+    params = get_params()._replace(CHARGE_POWER=get_params().BATTERY_CAPACITY / 1000)
+    demand = load_demand(DEMAND_PATH)
+    normalised_production = load_production(PRODUCTION_PATH)
+    electricity_use = get_usage_profile(demand, normalised_production, params, 6000, 3,
+                                        use_strategies['DP Dispatch Strategy'], SIMULATED_YEAR)
+    check_simulation(electricity_use, predict_demand_in_year(demand, params, SIMULATED_YEAR),
+                     get_solar_production_profile(normalised_production, 6000, params), params, 3)
+    assert electricity_use.df[[ElectricityUseDf.SolarStored, ElectricityUseDf.GasStored]].to_numpy().sum() > 0